@@ -0,0 +1,74 @@
+import os, sys
+import argparse
+import random
+import time
+from datetime import datetime
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+src_path = os.path.join(root_path, "src")
+sys.path.insert(0, src_path)
+
+from spec import datatypes
+
+# Compares the single-pass timestamp parser with the previous strptime-based
+# implementation, as used by EventValidator (parse, then check for a timezone).
+
+def legacy_parse_timestamp(timestamp: str) -> datetime:
+    for format in datatypes.TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(timestamp, format)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid timestamp format: {timestamp}")
+
+def legacy_timestamp_has_timezone(timestamp: str) -> bool:
+    timestamp_formats = [format for format in datatypes.TIMESTAMP_FORMATS if datatypes.TIMEZONE_FORMAT in format]
+    for format in timestamp_formats:
+        try:
+            datetime.strptime(timestamp, format)
+            return True
+        except ValueError:
+            continue
+    return False
+
+def legacy_validate(timestamp: str) -> bool:
+    legacy_parse_timestamp(timestamp)
+    return legacy_timestamp_has_timezone(timestamp)
+
+def fast_validate(timestamp: str) -> bool:
+    return datatypes.parse_timestamp_details(timestamp).has_timezone
+
+def uncached_validate(timestamp: str) -> bool:
+    return datatypes.parse_timestamp_details.__wrapped__(timestamp).has_timezone
+
+def generate_timestamps(n: int, n_unique: int) -> list[str]:
+    unique = [
+        datatypes.get_current_timestamp(datetime.fromtimestamp(1_700_000_000 + i * 0.37))
+        for i in range(n_unique)
+    ]
+    return [random.choice(unique) for _ in range(n)]
+
+def run(name: str, validate, timestamps: list[str]) -> float:
+    start = time.perf_counter()
+    for timestamp in timestamps:
+        validate(timestamp)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>10}: {len(timestamps) / elapsed:12,.0f} timestamps/sec")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark timestamp validation.")
+    parser.add_argument("--n", type=int, default=200_000, help="Number of timestamps to validate.")
+    parser.add_argument("--unique", type=int, default=20_000, help="Number of distinct timestamps.")
+    args = parser.parse_args()
+
+    random.seed(0)
+    timestamps = generate_timestamps(args.n, args.unique)
+    legacy = run("legacy", legacy_validate, timestamps)
+    uncached = run("uncached", uncached_validate, timestamps)
+    datatypes.parse_timestamp_details.cache_clear()
+    cached = run("cached", fast_validate, timestamps)
+    print(f"Speedup: {legacy / uncached:.1f}x uncached, {legacy / cached:.1f}x cached")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os, sys
+import argparse
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+src_path = os.path.join(root_path, "src")
+sys.path.insert(0, src_path)
+
+from database.config import PS2DataConfig
+from database.writer.db_writer_factory import SQLIOFactory
+from spec.codestate import BLANK_CODESTATE_ID
+from spec.enums import EventType, MainTableColumns as Cols
+from spec.spec_definition import PS2Versions
+
+# Measures API-style requests/sec against SQLite: each request opens a writer
+# (as the create_writer dependency does) and logs a small batch of events.
+
+MODES = {
+    "unpooled": {
+        "use_connection_pool": False,
+    },
+    "pooled": {
+        "use_connection_pool": True,
+        "reuse_io_objects": True,
+        "sqlite_pragmas": {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000},
+    },
+}
+
+def create_factory(spec, directory: str, mode_options: dict) -> SQLIOFactory:
+    data_config = PS2DataConfig(
+        root_path=directory,
+        sqlalchemy_url=f"sqlite:///{os.path.join(directory, 'Benchmark.db')}",
+        optimize_codestate_ids=True,
+        metadata={"Version": "1.0", "CodeStateRepresentation": "Table"},
+        **mode_options,
+    )
+    data_config.validate_metadata(spec)
+    return SQLIOFactory(spec, data_config)
+
+def create_events(request_index: int, events_per_request: int) -> list[dict]:
+    return [{
+        Cols.EventType: EventType.SessionStart,
+        Cols.EventID: f"{request_index}_{i}",
+        Cols.CodeStateID: BLANK_CODESTATE_ID,
+        Cols.SubjectID: f"subject_{request_index % 50}",
+        Cols.ToolInstances: "benchmark",
+        Cols.SessionID: f"session_{request_index}",
+    } for i in range(events_per_request)]
+
+def run_request(factory: SQLIOFactory, request_index: int, events_per_request: int) -> None:
+    with factory.create_writer() as writer:
+        result = writer.add_events_with_codestates(create_events(request_index, events_per_request), {})
+        if not result.success:
+            raise RuntimeError(result.errors)
+
+def benchmark(spec, mode: str, n_requests: int, n_threads: int, events_per_request: int) -> float:
+    directory = tempfile.mkdtemp(prefix=f"ps2_bench_{mode}_")
+    try:
+        factory = create_factory(spec, directory, MODES[mode])
+        with factory.create_writer() as writer:
+            writer.initialize_database()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            futures = [executor.submit(run_request, factory, i, events_per_request) for i in range(n_requests)]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+        factory.engine.dispose()
+        return n_requests / elapsed
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SQLIOFactory writers with and without pooling.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--events-per-request", type=int, default=5)
+    args = parser.parse_args()
+
+    spec = PS2Versions.load_default()
+    for mode in MODES:
+        requests_per_second = benchmark(spec, mode, args.requests, args.threads, args.events_per_request)
+        print(f"{mode:>10}: {requests_per_second:,.0f} requests/sec")
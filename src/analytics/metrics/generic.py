@@ -1,6 +1,6 @@
 
-from pandas import DataFrame
-from analytics.metrics.metric import Metric
+from pandas import DataFrame, Series
+from analytics.metrics.metric import Metric, group_by
 from spec.enums import MainTableColumns as Cols
 
 CORRECT_SCORE = 1
@@ -13,6 +13,9 @@ class LogCount(Metric):
     def calculate(self, logs: DataFrame) -> int:
         return len(logs)
 
+    def calculate_grouped(self, logs: DataFrame, grouping_cols: list[str]) -> Series:
+        return logs.groupby(grouping_cols, observed=True).size()
+
 class NumberOfIncorrectAttempts(Metric):
     """
     A metric that counts the number of incorrect attempts.
@@ -21,6 +24,9 @@ class NumberOfIncorrectAttempts(Metric):
     def calculate(self, logs: DataFrame) -> int:
         return (logs[Cols.Score] < CORRECT_SCORE).sum()
 
+    def calculate_grouped(self, logs: DataFrame, grouping_cols: list[str]) -> Series:
+        return group_by(logs[Cols.Score] < CORRECT_SCORE, logs, grouping_cols).sum()
+
 class NumberOfCorrectAttempts(Metric):
     """
     A metric that counts the number of correct attempts.
@@ -29,6 +35,9 @@ class NumberOfCorrectAttempts(Metric):
     def calculate(self, logs: DataFrame) -> int:
         return (logs[Cols.Score] >= CORRECT_SCORE).sum()
 
+    def calculate_grouped(self, logs: DataFrame, grouping_cols: list[str]) -> Series:
+        return group_by(logs[Cols.Score] >= CORRECT_SCORE, logs, grouping_cols).sum()
+
 class MeanScore(Metric):
     """
     A metric that calculates the mean score.
@@ -37,6 +46,9 @@ class MeanScore(Metric):
     def calculate(self, logs: DataFrame) -> float:
         return logs[Cols.Score].mean()
 
+    def calculate_grouped(self, logs: DataFrame, grouping_cols: list[str]) -> Series:
+        return group_by(logs[Cols.Score], logs, grouping_cols).mean()
+
 class MaxScore(Metric):
     """
     A metric that calculates the maximum score.
@@ -45,10 +57,16 @@ class MaxScore(Metric):
     def calculate(self, logs: DataFrame) -> float:
         return logs[Cols.Score].max()
 
+    def calculate_grouped(self, logs: DataFrame, grouping_cols: list[str]) -> Series:
+        return group_by(logs[Cols.Score], logs, grouping_cols).max()
+
 class EverCorrect(Metric):
     """
     A metric that checks if there was ever a correct attempt.
     """
 
     def calculate(self, logs: DataFrame) -> bool:
-        return (logs[Cols.Score] >= CORRECT_SCORE).any()
\ No newline at end of file
+        return (logs[Cols.Score] >= CORRECT_SCORE).any()
+
+    def calculate_grouped(self, logs: DataFrame, grouping_cols: list[str]) -> Series:
+        return group_by(logs[Cols.Score] >= CORRECT_SCORE, logs, grouping_cols).any()
@@ -0,0 +1,199 @@
+
+from datetime import datetime
+import json
+import os
+from typing import Optional
+
+import pandas as pd
+from pandas import DataFrame
+
+from analytics.metrics.metric import MetricCalculator
+from analytics.ps2_dataset import PS2Dataset
+from database.reader.filters import ColumnFilter, FilterOp
+from database.reader.ps2_reader import concat_chunks
+from spec.enums import MainTableColumns as Cols
+
+
+class IncrementalMetricCalculator:
+    """
+    Keeps the results of a MetricCalculator up to date as events are added to a dataset.
+    Results are saved in state_dir along with a high-water mark of the events they include,
+    and each update only recalculates the groups that have received events since then.
+
+    The high-water mark is the maximum value of watermark_col (e.g. ServerTimestamp or Order),
+    so events must be added with non-decreasing values in that column. Events with a value
+    equal to the mark are new unless their EventID was already included, so events added
+    with the same value as the last one are not missed. If watermark_col
+    is None, the number of rows is used instead, which requires an append-only main table
+    that is always read in the same order (e.g. a CSV file).
+    """
+
+    RESULTS_FILE = "results.pkl"
+    STATE_FILE = "state.json"
+
+    def __init__(self, calculator: MetricCalculator, state_dir: str,
+                 watermark_col: Optional[str] = Cols.ServerTimestamp, chunksize: int = 100_000):
+        self.calculator = calculator
+        self.state_dir = state_dir
+        self.watermark_col = watermark_col
+        self.chunksize = chunksize
+
+    @property
+    def results_path(self) -> str:
+        return os.path.join(self.state_dir, self.RESULTS_FILE)
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.state_dir, self.STATE_FILE)
+
+    def _get_configuration(self) -> dict[str, any]:
+        """
+        Describes the calculation, so saved results are only reused for the same one.
+        """
+        return {
+            "grouping_cols": [str(col) for col in self.calculator.grouping_cols],
+            "metrics": [metric.name for metric in self.calculator.metrics],
+            "watermark_col": None if self.watermark_col is None else str(self.watermark_col),
+        }
+
+    def load_results(self) -> Optional[DataFrame]:
+        """
+        Returns the saved results, or None if there are none for this calculation.
+        """
+        state = self._load_state()
+        if state is None:
+            return None
+        return pd.read_pickle(self.results_path)
+
+    def _load_state(self) -> Optional[dict[str, any]]:
+        if not os.path.exists(self.state_path) or not os.path.exists(self.results_path):
+            return None
+        with open(self.state_path, "r") as file:
+            state = json.load(file)
+        if state.get("configuration") != self._get_configuration():
+            print("Warning: Saved metric results are for a different calculation, so all metrics will be recalculated.")
+            return None
+        return state
+
+    def reset(self) -> None:
+        """
+        Deletes the saved results, so the next update recalculates all metrics.
+        """
+        for path in (self.results_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def update(self, dataset: PS2Dataset) -> DataFrame:
+        """
+        Updates the results with events added since the last update (or calculates
+        them for all events, the first time) and returns them.
+        """
+        state = self._load_state()
+        if state is None:
+            main_table = self._read_rows(dataset)
+            results = self.calculator.apply(main_table)
+            self._save(results, self._get_watermark(main_table, 0), self._get_watermark_event_ids(main_table))
+            return results
+
+        results = pd.read_pickle(self.results_path)
+        watermark_event_ids = state.get("watermark_event_ids", [])
+        new_events, n_rows = self._read_new_events(dataset, state["watermark"], watermark_event_ids)
+        if len(new_events) == 0:
+            return results
+
+        updated_groups = new_events[self.calculator.grouping_cols].drop_duplicates()
+        group_rows = self._read_groups(dataset, updated_groups)
+        updated_results = self.calculator.apply(group_rows)
+        results = pd.concat([
+            results[~results.index.isin(updated_results.index)],
+            updated_results,
+        ]).sort_index()
+        watermark = self._get_watermark(new_events, n_rows)
+        if watermark is None:
+            # Keep the old mark if the new events have no values for the watermark column
+            self._save(results, state["watermark"], watermark_event_ids)
+        elif watermark == state["watermark"]:
+            self._save(results, watermark, watermark_event_ids + self._get_watermark_event_ids(new_events))
+        else:
+            self._save(results, watermark, self._get_watermark_event_ids(new_events))
+        return results
+
+    def _read_rows(self, dataset: PS2Dataset, filters: list[ColumnFilter] = None) -> DataFrame:
+        return concat_chunks(list(dataset.iter_main_table(self.chunksize, filters=filters)))
+
+    def _read_new_events(self, dataset: PS2Dataset, watermark: any, watermark_event_ids: list[str]) -> tuple[DataFrame, int]:
+        """
+        Reads the events added after the watermark, and the total number of rows, if counted.
+        :param watermark_event_ids: The EventIDs of the events at the watermark that are
+        already included in the results.
+        """
+        if self.watermark_col is not None:
+            if watermark is None:
+                # No events had a value for the watermark column, so all events are new
+                return self._read_rows(dataset), 0
+            if isinstance(watermark, dict):
+                watermark = pd.Timestamp(watermark["timestamp"]).to_pydatetime()
+            rows = self._read_rows(dataset, [ColumnFilter(self.watermark_col, FilterOp.GreaterEqual, watermark)])
+            if len(rows) == 0 or Cols.EventID not in rows.columns:
+                return rows, 0
+            # Events at the watermark may have been added since, so only skip those already seen
+            seen = (rows[self.watermark_col] == watermark) & rows[Cols.EventID].astype(str).isin(watermark_event_ids)
+            return rows[~seen.to_numpy()], 0
+
+        new_chunks = []
+        n_rows = 0
+        for chunk in dataset.iter_main_table(self.chunksize):
+            if n_rows + len(chunk) > watermark:
+                new_chunks.append(chunk.iloc[max(watermark - n_rows, 0):])
+            n_rows += len(chunk)
+        if n_rows < watermark:
+            raise ValueError(f"The main table has fewer rows ({n_rows}) than when metrics were last calculated ({watermark}). Call reset to recalculate them.")
+        return concat_chunks(new_chunks) if len(new_chunks) > 0 else DataFrame(), n_rows
+
+    def _read_groups(self, dataset: PS2Dataset, groups: DataFrame) -> DataFrame:
+        """
+        Reads all events in the given groups. Only the first grouping column can be
+        pushed down to the reader, so the remaining columns are matched afterwards.
+        """
+        grouping_cols = self.calculator.grouping_cols
+        first_col = grouping_cols[0]
+        rows = self._read_rows(dataset, [ColumnFilter.equals(first_col, list(groups[first_col].unique()))])
+        if len(grouping_cols) == 1:
+            return rows
+        in_groups = pd.MultiIndex.from_frame(rows[grouping_cols]).isin(pd.MultiIndex.from_frame(groups))
+        return rows[in_groups]
+
+    def _get_watermark(self, events: DataFrame, n_rows: int) -> any:
+        if self.watermark_col is None:
+            return n_rows if n_rows > 0 else len(events)
+        if self.watermark_col not in events.columns:
+            return None
+        watermark = events[self.watermark_col].max()
+        if pd.isna(watermark):
+            return None
+        if isinstance(watermark, datetime):
+            # Saved as a dict, so it's parsed back into a timestamp rather than compared as a string
+            return {"timestamp": pd.Timestamp(watermark).isoformat()}
+        return watermark.item() if hasattr(watermark, "item") else watermark
+
+    def _get_watermark_event_ids(self, events: DataFrame) -> list[str]:
+        """
+        Gets the EventIDs of the events with the maximum value of the watermark column.
+        """
+        if self.watermark_col is None or self.watermark_col not in events.columns or Cols.EventID not in events.columns:
+            return []
+        values = events[self.watermark_col]
+        if values.isna().all():
+            return []
+        return [str(event_id) for event_id in events.loc[values == values.max(), Cols.EventID]]
+
+    def _save(self, results: DataFrame, watermark: any, watermark_event_ids: list[str]) -> None:
+        os.makedirs(self.state_dir, exist_ok=True)
+        results.to_pickle(self.results_path)
+        state = {
+            "configuration": self._get_configuration(),
+            "watermark": watermark,
+            "watermark_event_ids": watermark_event_ids,
+        }
+        with open(self.state_path, "w") as file:
+            json.dump(state, file, indent=2)
@@ -1,7 +1,13 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Optional
-from pandas import DataFrame
-from pandas.api.typing import DataFrameGroupBy
+from concurrent.futures import ProcessPoolExecutor
+import os
+import tempfile
+from typing import Callable, Optional, Union
+import pandas as pd
+from pandas import DataFrame, Series
+from pandas.api.typing import DataFrameGroupBy, SeriesGroupBy
+
+from database.parquet_table_manager import import_pyarrow
 
 
 class Metric(ABC):
@@ -16,6 +22,17 @@ class Metric(ABC):
         """
         pass
 
+    def calculate_grouped(self, df: DataFrame, grouping_cols: list[str]) -> Optional[Union[Series, DataFrame]]:
+        """
+        Optionally, calculate the metric for every group at once, using vectorized
+        operations (see group_by), rather than calling calculate on each group.
+        Must return the same values as calculate, indexed by group: a Series for metrics
+        that return a single value, or a DataFrame with one column per key for metrics
+        that return a dict. Returns None if not implemented, in which case calculate
+        is called on each group.
+        """
+        return None
+
     def __str__(self):
         return self.name
 
@@ -28,6 +45,23 @@ class LambdaMetric(Metric):
         return self.function(df)
 
 
+def group_by(values: Union[Series, DataFrame], df: DataFrame, grouping_cols: list[str]) -> Union[SeriesGroupBy, DataFrameGroupBy]:
+    """
+    Group values computed from df (e.g. a mask of its rows) by df's grouping columns,
+    so they can be aggregated with the same group index as df.groupby(grouping_cols).
+    """
+    return values.groupby([df[col] for col in grouping_cols], observed=True)
+
+def get_group_shards(df: DataFrame, grouping_cols: list[str], n_shards: int) -> Series:
+    """
+    Assign each row to one of n_shards by hashing its grouping columns, so every group
+    falls entirely within one shard.
+    """
+    # Hash string values, since inferred dtypes can differ between chunks
+    keys = df[grouping_cols].astype(str)
+    return pd.util.hash_pandas_object(keys, index=False) % n_shards
+
+
 class MetricCalculator:
     def __init__(self, grouping_cols: list[str], metrics: list[Metric]):
         self.grouping_cols = grouping_cols
@@ -37,19 +71,109 @@ class MetricCalculator:
         """
         Apply the metrics to a single group and return a dictionary of results.
         """
+        return self._apply_metrics_to_group(group, self.metrics)
+
+    @staticmethod
+    def _apply_metrics_to_group(group: DataFrame, metrics: list[Metric]) -> dict[str, any]:
         result = {}
-        for metric in self.metrics:
+        for metric in metrics:
             metric_result = metric.calculate(group)
-            if isinstance(metric_result, dict):
+            # Metrics with multiple values may return them as a dict or Series
+            if isinstance(metric_result, (dict, Series)):
                 for key, value in metric_result.items():
                     result[key] = value
             else:
                 result[metric.name] = metric_result
         return result
 
-    def apply(self, df: DataFrame) -> DataFrame:
+    def apply(self, df: DataFrame, processes: int = 1) -> DataFrame:
+        """
+        Apply the metrics to the DataFrame and return a new DataFrame with the results,
+        with one row per group and one column per metric value.
+        Metrics that implement calculate_grouped are calculated for all groups at once,
+        and only the remaining metrics are applied to each group separately. Groups passed
+        to calculate do not include the grouping columns.
+        :param processes: If > 1, groups are split into shards, which are calculated in parallel
+        by worker processes (see apply_parallel).
+        """
+        if processes > 1:
+            return self.apply_parallel(df, processes)
+        grouped = df.groupby(self.grouping_cols, observed=True)
+        group_index = grouped.size().index
+
+        grouped_results = {}
+        for metric in self.metrics:
+            metric_result = metric.calculate_grouped(df, self.grouping_cols)
+            if metric_result is not None:
+                grouped_results[metric] = metric_result
+
+        fallback_metrics = [metric for metric in self.metrics if metric not in grouped_results]
+        fallback_columns = {}
+        if len(fallback_metrics) > 0 and len(group_index) > 0:
+            # Keep track of which metric produced each column, so columns stay in metric order
+            group_results = grouped.apply(lambda group: {
+                (index, key): value
+                for index, metric in enumerate(fallback_metrics)
+                for key, value in self._apply_metrics_to_group(group, [metric]).items()
+            }, include_groups=False)
+            fallback_table = DataFrame(list(group_results), index=group_results.index)
+            for index, key in fallback_table.columns:
+                fallback_columns.setdefault(fallback_metrics[index], []).append((key, fallback_table[(index, key)]))
+
+        columns = {}
+        for metric in self.metrics:
+            if metric in grouped_results:
+                metric_result = grouped_results[metric]
+                if isinstance(metric_result, DataFrame):
+                    for key in metric_result.columns:
+                        columns[key] = metric_result[key].reindex(group_index)
+                else:
+                    columns[metric.name] = metric_result.reindex(group_index)
+            else:
+                for key, values in fallback_columns.get(metric, []):
+                    columns[key] = values
+        return DataFrame(columns, index=group_index)
+
+    def apply_parallel(self, df: DataFrame, processes: Optional[int] = None, shards_per_process: int = 4) -> DataFrame:
         """
-        Apply the metrics to the DataFrame and return a new DataFrame with the results.
+        Apply the metrics in parallel, for metrics that are slow to calculate per group.
+        Groups are sharded by hashing the grouping columns, and each shard is written to an
+        Arrow IPC file which workers memory-map, rather than pickling DataFrames to them.
+        Results are combined in group order, so they match apply.
+        Requires pyarrow. On platforms that spawn rather than fork processes, the metrics
+        must be picklable (e.g. no LambdaMetrics using lambdas).
         """
-        grouped = df.groupby(self.grouping_cols)
-        return grouped.apply(lambda x: self.apply_to_group(x))
\ No newline at end of file
+        pa = import_pyarrow("Parallel metric calculation")
+        processes = processes or os.cpu_count() or 1
+        if len(df) == 0:
+            return self.apply(df)
+
+        n_shards = processes * shards_per_process
+        shards = get_group_shards(df, self.grouping_cols, n_shards)
+        with tempfile.TemporaryDirectory(prefix="ps2_metrics_") as temp_dir:
+            shard_paths = []
+            for shard, shard_rows in df.groupby(shards.to_numpy(), sort=True):
+                path = os.path.join(temp_dir, f"shard_{shard}.arrow")
+                table = pa.Table.from_pandas(shard_rows, preserve_index=False)
+                with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+                shard_paths.append(path)
+
+            with ProcessPoolExecutor(max_workers=min(processes, len(shard_paths)),
+                                     initializer=_init_metric_worker, initargs=(self,)) as executor:
+                results = list(executor.map(_apply_to_shard, shard_paths))
+        return pd.concat(results).sort_index()
+
+
+# Set in each worker process, so the metrics are only sent once per worker
+_worker_calculator: MetricCalculator = None
+
+def _init_metric_worker(calculator: MetricCalculator) -> None:
+    global _worker_calculator
+    _worker_calculator = calculator
+
+def _apply_to_shard(path: str) -> DataFrame:
+    pa = import_pyarrow("Parallel metric calculation")
+    with pa.memory_map(path, "r") as source:
+        shard = pa.ipc.open_file(source).read_all().to_pandas()
+    return _worker_calculator.apply(shard)
@@ -1,12 +1,12 @@
 
 from typing import Final
 from pandas import DataFrame, Series
-from analytics.metrics.metric import LambdaMetric
+from analytics.metrics.metric import Metric, group_by
 from spec.enums import MainTableColumns as Cols
 import numpy as np
 
 
-class TimeMetrics:
+class TimeMetrics(Metric):
 
     ACTIVE_TIME: Final[str] = "ActiveTime"
     """
@@ -52,12 +52,17 @@ class TimeMetrics:
 
 
     def __init__(self, idle_gap, break_gap, is_data_already_time_sorted, time_col: str = Cols.ClientTimestamp):
+        super().__init__()
         self.idle_gap = idle_gap
         self.break_gap = break_gap
         self.time_col = time_col
         self.sort_first = not is_data_already_time_sorted
 
-    def calculate(self, rows: DataFrame) -> dict[str, any]:
+    def calculate(self, rows: DataFrame) -> Series:
+        """
+        Calculate the time metrics for a single group. This is the reference implementation
+        for calculate_grouped, which should be used to calculate metrics for many groups.
+        """
         if self.sort_first:
             rows = rows.sort_values(by=[self.time_col])
 
@@ -112,6 +117,59 @@ class TimeMetrics:
         }
         return Series(time_metrics)
 
+    def calculate_grouped(self, ungrouped_rows: DataFrame, grouping_cols: list[str]) -> DataFrame:
+        """
+        Calculate the time metrics for all groups at once: rows are sorted once, and deltas,
+        first correct attempts and sums are computed with grouped operations rather than per group.
+        """
+        # Sort stably, so rows with equal times keep their order within each group
+        sort_cols = grouping_cols + [self.time_col] if self.sort_first else grouping_cols
+        rows = ungrouped_rows.sort_values(by=sort_cols, kind="stable")
+        rows = rows.dropna(subset=grouping_cols).reset_index(drop=True)
+        grouped = rows.groupby(grouping_cols, observed=True)
+        position = grouped.cumcount()
+        group_size = grouped[self.time_col].transform("size")
+
+        if Cols.Score in rows.columns:
+            correct_position = position.where(rows[Cols.Score] >= 1)
+        else:
+            correct_position = Series(np.nan, index=rows.index)
+        first_correct_position = group_by(correct_position, rows, grouping_cols).transform("min")
+        has_correct = first_correct_position.notna()
+        until_correct = ~has_correct | (position <= first_correct_position)
+        # The first attempt after the first correct attempt has no delta, as in calculate
+        after_correct = has_correct & (position > first_correct_position + 1)
+
+        delta_seconds = grouped[self.time_col].diff().dt.total_seconds()
+        negative_deltas = until_correct & (delta_seconds < 0)
+        if negative_deltas.any():
+            print("Warning: Negative time deltas found. This may indicate incorrect timestamps or data sorting issues.")
+        is_break = until_correct & (delta_seconds > self.break_gap)
+        non_break = until_correct & ~negative_deltas & (delta_seconds <= self.break_gap)
+        is_idle = non_break & (delta_seconds > self.idle_gap)
+        is_active_after_correct = after_correct & (delta_seconds <= self.break_gap) & (delta_seconds <= self.idle_gap)
+
+        def sum_by_group(values: Series) -> Series:
+            return group_by(values, rows, grouping_cols).sum()
+
+        def time_at(mask: Series) -> Series:
+            selected = rows[mask]
+            return Series(selected[self.time_col].to_numpy(), index=selected.set_index(grouping_cols).index)
+
+        total_time = sum_by_group(delta_seconds.where(non_break, 0))
+        idle_time = sum_by_group(delta_seconds.where(is_idle, 0))
+        group_index = total_time.index
+        return DataFrame({
+            self.ACTIVE_TIME: total_time - idle_time,
+            self.IDLE_TIME: idle_time,
+            self.TOTAL_TIME: total_time,
+            self.ACTIVE_TIME_AFTER_CORRECT: sum_by_group(delta_seconds.where(is_active_after_correct, 0)),
+            self.N_BREAKS: sum_by_group(is_break),
+            self.START_TIME: time_at(position == 0).reindex(group_index),
+            self.FIRST_CORRECT_TIME: time_at(position == first_correct_position).reindex(group_index),
+            self.END_TIME: time_at(position == group_size - 1).reindex(group_index),
+        }, index=group_index)
+
     @staticmethod
     def get_all_diffs(ungrouped_rows: DataFrame, time_col: str, grouping_cols: list[str]) -> DataFrame:
         """
@@ -122,7 +180,7 @@ class TimeMetrics:
         parameters for the TimeMetrics class.
         """
         df = ungrouped_rows.sort_values(by=grouping_cols + [time_col])[grouping_cols]
-        df["DeltaSeconds"] = ungrouped_rows.groupby(grouping_cols)[time_col].diff().apply(lambda x: x.total_seconds())
+        df["DeltaSeconds"] = ungrouped_rows.groupby(grouping_cols, observed=True)[time_col].diff().apply(lambda x: x.total_seconds())
 
         return df
 
@@ -146,7 +204,7 @@ class TimeMetrics:
         if not grouping_cols:
             raise ValueError("Grouping columns must be provided for testing.")
 
-        grouped = ungrouped_rows.groupby(grouping_cols)
+        grouped = ungrouped_rows.groupby(grouping_cols, observed=True)
 
         results = []
 
@@ -4,9 +4,22 @@
 # and provide convenience methods.
 
 from abc import ABC, abstractmethod
-from pandas import DataFrame
+from dataclasses import dataclass, replace
+from datetime import timedelta
+import hashlib
+import json
+import os
+from typing import Iterator, Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
 from pandas.api.types import is_datetime64_any_dtype as is_datetime
+from analytics.metrics.metric import MetricCalculator, get_group_shards
+from sqlalchemy import make_url
 from database.config import PS2DataConfig
+from database.parquet_table_manager import import_pyarrow
+from database.reader.filters import ColumnFilter, FilterOp, Filters, apply_filters, normalize_filters
+from database.reader.ps2_reader import concat_chunks
 from database.writer.db_writer_factory import IOFactory
 from spec.enums import MainTableColumns as Cols, MetadataProperties as MetadataProps, EventOrderScope
 from spec.spec_definition import ProgSnap2Spec
@@ -27,14 +40,32 @@ class Preprocessor(ABC):
         """
         pass
 
+    def get_cache_key(self) -> str:
+        """
+        Describes the preprocessor and its configuration, so cached tables are only
+        reused if they were preprocessed the same way. Subclasses with configuration
+        that isn't stored in attributes should override this.
+        """
+        attributes = sorted((name, repr(value)) for name, value in vars(self).items())
+        return f"{type(self).__module__}.{type(self).__qualname__}{attributes}"
+
 
 
 
 class PS2Dataset:
 
-    def __init__(self, spec: ProgSnap2Spec, data_config: PS2DataConfig):
+    # Increment if the format of cached tables changes
+    CACHE_VERSION = 1
+
+    def __init__(self, spec: ProgSnap2Spec, data_config: PS2DataConfig, cache_dir: Optional[str] = None):
+        """
+        :param cache_dir: If given, the preprocessed main table is cached in this directory,
+        as a Feather file keyed by the source data and preprocessors, and loaded from there
+        (memory-mapped) while neither changes. Requires pyarrow.
+        """
         self.spec = spec
         self.data_config = data_config
+        self.cache_dir = cache_dir
         self.factory = IOFactory.create_factory(data_config)
         self._main_table: DataFrame = None
         self._metadata_table: DataFrame = None
@@ -45,20 +76,20 @@ class PS2Dataset:
 
         self.get_metadata_table()
 
-    def get_metadata_table(self) -> DataFrame:
+    def get_metadata_table(self, copy: Optional[bool] = None) -> DataFrame:
         """
         Returns the metadata table as a DataFrame.
+        :param copy: Whether to return a copy of the cached table; see get_main_table.
         """
-        if self._metadata_table is not None:
-            return self._metadata_table.copy()
-        try:
-            with self.factory.create_reader() as reader:
-                self._metadata_table = reader.get_metadata_table()
-        except FileNotFoundError:
-            # If the metadata table is not found, create an empty one
-            self._metadata_table = DataFrame()
-            print("Warning: Metadata table not found, creating an empty metadata table.")
-        return self._metadata_table.copy()
+        if self._metadata_table is None:
+            try:
+                with self.factory.create_reader() as reader:
+                    self._metadata_table = reader.get_metadata_table()
+            except FileNotFoundError:
+                # If the metadata table is not found, create an empty one
+                self._metadata_table = DataFrame()
+                print("Warning: Metadata table not found, creating an empty metadata table.")
+        return self._copy_cached_table(self._metadata_table, copy)
 
     def get_metadata_property(self, property_name: str) -> any:
         """
@@ -74,17 +105,287 @@ class PS2Dataset:
             return property.default_value
         raise ValueError(f"Metadata property '{property_name}' not found in the dataset.")
 
-    def get_main_table(self) -> DataFrame:
+    def get_main_table(self, copy: Optional[bool] = None) -> DataFrame:
+        """
+        Returns the main table as a DataFrame. The table is loaded once and cached.
+        :param copy: Whether to return a copy of the cached table. If True, a full copy
+        is always made. If False, the returned DataFrame shares data with the cache, so
+        it must not be modified in place. By default, the data is only shared if pandas'
+        copy-on-write mode is enabled (pd.set_option("mode.copy_on_write", True)), in which
+        case modifying the result copies only what is modified, and the cache is never changed.
+        """
+        if self._main_table is None:
+            cache_path = self._get_cache_path()
+            if cache_path is not None and os.path.exists(cache_path):
+                self._main_table = self._read_cached_table(cache_path)
+            else:
+                with self.factory.create_reader() as reader:
+                    self._main_table = reader.get_main_table()
+                for preprocessor in self.main_table_preprocessors:
+                    self._main_table = preprocessor.apply(self, self._main_table)
+                if cache_path is not None:
+                    self._write_cached_table(self._main_table, cache_path)
+        return self._copy_cached_table(self._main_table, copy)
+
+    def _get_cache_path(self) -> Optional[str]:
+        """
+        Returns the path of the cached main table for the current source data
+        and preprocessors, or None if caching is disabled or not possible.
+        """
+        if self.cache_dir is None:
+            return None
+        source_fingerprint = self._get_source_fingerprint()
+        if source_fingerprint is None:
+            print("Warning: The main table can only be cached for file-based datasets (CSV, Parquet or SQLite) whose files exist.")
+            return None
+        cache_key = json.dumps({
+            "version": self.CACHE_VERSION,
+            "source": source_fingerprint,
+            "data_config": self.data_config.model_dump_json(),
+            # Preprocessors depend on the metadata, e.g. for the event ordering
+            "metadata": self._metadata_table.to_json(),
+            "preprocessors": [preprocessor.get_cache_key() for preprocessor in self.main_table_preprocessors],
+        }, default=str)
+        digest = hashlib.sha256(cache_key.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"MainTable-{digest}.feather")
+
+    def _get_source_fingerprint(self) -> Optional[list[tuple[str, int, int]]]:
+        """
+        Returns the path, size and modification time of each file holding the main table,
+        or None if they can't be found.
+        """
+        config = self.data_config
+        if config.is_csv_config:
+            paths = [config.main_table_path]
+        elif config.is_parquet_config:
+            paths = sorted(
+                os.path.join(directory, file)
+                for directory, _, files in os.walk(config.main_table_parquet_path)
+                for file in files
+            )
+        else:
+            url = make_url(config.sqlalchemy_url)
+            if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+                return None
+            # Relative paths are resolved against the working directory, as SQLAlchemy does
+            database_path = os.path.abspath(url.database)
+            if not os.path.exists(database_path):
+                return None
+            # Uncheckpointed writes are in the write-ahead log
+            paths = [path for path in (database_path, database_path + "-wal") if os.path.exists(path)]
+        fingerprint = []
+        for path in paths:
+            stat = os.stat(path)
+            fingerprint.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+        return fingerprint
+
+    @staticmethod
+    def _read_cached_table(cache_path: str) -> DataFrame:
+        pa = import_pyarrow("Caching the main table")
+        return pa.feather.read_table(cache_path, memory_map=True).to_pandas()
+
+    @staticmethod
+    def _write_cached_table(table: DataFrame, cache_path: str) -> None:
+        pa = import_pyarrow("Caching the main table")
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            # Uncompressed, so the file can be memory-mapped when read
+            pa.feather.write_feather(table, temp_path, compression="uncompressed")
+            os.replace(temp_path, cache_path)
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            print(f"Warning: Could not cache the main table: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def clear_cache(self) -> None:
         """
-        Returns the main table as a DataFrame.
+        Deletes the cached main table for the current source data and preprocessors.
+        """
+        cache_path = self._get_cache_path()
+        if cache_path is not None and os.path.exists(cache_path):
+            os.remove(cache_path)
+
+    @staticmethod
+    def _copy_cached_table(table: DataFrame, copy: Optional[bool]) -> DataFrame:
+        if copy is None:
+            copy = not pd.options.mode.copy_on_write
+        # A shallow copy, so callers can still add or replace columns without changing the cache
+        return table.copy(deep=copy)
+
+    def memory_usage(self) -> dict[str, int]:
+        """
+        Returns the number of bytes held by each of the dataset's cached tables
+        (0 if not loaded), including the contents of string columns, plus the total.
+        """
+        usage = {
+            "main_table": self._get_memory_usage(self._main_table),
+            "metadata_table": self._get_memory_usage(self._metadata_table),
+        }
+        usage["total"] = sum(usage.values())
+        return usage
+
+    @staticmethod
+    def _get_memory_usage(table: Optional[DataFrame]) -> int:
+        if table is None:
+            return 0
+        return int(table.memory_usage(index=True, deep=True).sum())
+
+    def query(self) -> "MainTableQuery":
+        """
+        Starts a lazy query of the main table, e.g.
+        dataset.query().where(EventType="Run.Program").select([Cols.SubjectID, Cols.Score]).to_pandas().
+        Filters and columns are pushed down to the reader, so only matching rows and
+        selected columns are read.
+        """
+        return MainTableQuery(self)
+
+    def iter_main_table(self, chunksize: int = 100_000, columns: Optional[list[str]] = None, filters: Filters = None) -> Iterator[DataFrame]:
+        """
+        Yields the main table in preprocessed chunks of at most chunksize rows, without
+        loading the full table. Note that sorting only orders events within each chunk.
+        :param columns: If given, only these columns are read.
+        :param filters: Only rows matching all filters are returned, e.g. {"EventType": "Run.Program"}.
         """
-        if self._main_table is not None:
-            return self._main_table.copy()
         with self.factory.create_reader() as reader:
-            self._main_table = reader.get_main_table()
-        for preprocessor in self.main_table_preprocessors:
-            self._main_table = preprocessor.apply(self, self._main_table)
-        return self._main_table.copy()
+            for chunk in reader.iter_main_table(chunksize, columns=columns, filters=filters):
+                for preprocessor in self.main_table_preprocessors:
+                    chunk = preprocessor.apply(self, chunk)
+                yield chunk
+
+    def calculate_metrics_chunked(self, calculator: MetricCalculator, chunksize: int = 100_000, n_partitions: int = 1,
+                                  columns: Optional[list[str]] = None, filters: Filters = None) -> DataFrame:
+        """
+        Calculates metrics without loading the full main table. Rows are assigned to one of
+        n_partitions by hashing the calculator's grouping columns, so every group falls entirely
+        within one partition, and the table is streamed once per partition, holding only that
+        partition in memory. Use more partitions for larger datasets, and pass columns to read
+        only what the metrics need.
+        :return: The combined metric results, as returned by calculator.apply.
+        """
+        if n_partitions < 1:
+            raise ValueError("n_partitions must be at least 1")
+        if columns is not None:
+            columns = list(columns) + [col for col in calculator.grouping_cols if col not in columns]
+
+        results = []
+        for partition in range(n_partitions):
+            partition_chunks = []
+            with self.factory.create_reader() as reader:
+                for chunk in reader.iter_main_table(chunksize, columns=columns, filters=filters):
+                    if n_partitions > 1:
+                        chunk = chunk[get_group_shards(chunk, calculator.grouping_cols, n_partitions) == partition]
+                    partition_chunks.append(chunk)
+            if len(partition_chunks) == 0:
+                continue
+            partition_table = concat_chunks(partition_chunks)
+            del partition_chunks
+            for preprocessor in self.main_table_preprocessors:
+                partition_table = preprocessor.apply(self, partition_table)
+            results.append(calculator.apply(partition_table))
+
+        if len(results) == 0:
+            return DataFrame()
+        return pd.concat(results).sort_index()
+
+
+@dataclass(frozen=True)
+class MainTableQuery:
+    """
+    A lazy query of a dataset's main table. Each method returns a new query, and nothing
+    is read until the results are requested with to_pandas or iter_chunks.
+    The filters are pushed down to the reader where possible: to SQL WHERE clauses,
+    Parquet filter expressions, or filters on each chunk of a CSV file.
+    Filters always compare against preprocessed values, as in get_main_table, whether
+    or not the main table is already loaded. For example, timestamps are compared
+    after their timezone columns are applied.
+    """
+    dataset: PS2Dataset
+    filters: tuple[ColumnFilter, ...] = ()
+    columns: Optional[tuple[str, ...]] = None
+
+    def where(self, *filters: ColumnFilter, **values: any) -> "MainTableQuery":
+        """
+        Only include rows matching all of the given filters, and where each column
+        passed as a keyword equals the value (or any of the values, if a collection is given).
+        """
+        new_filters = list(filters) + normalize_filters(values)
+        return replace(self, filters=self.filters + tuple(new_filters))
+
+    def between(self, start: any = None, end: any = None, column: str = Cols.ClientTimestamp) -> "MainTableQuery":
+        """
+        Only include rows where start <= column < end. Either bound can be omitted.
+        Datetime bounds are compared with parsed timestamps, with naive values treated as UTC.
+        """
+        return self.where(*ColumnFilter.between(column, start, end))
+
+    def select(self, columns: list[str]) -> "MainTableQuery":
+        """
+        Only include the given columns.
+        """
+        return replace(self, columns=tuple(columns))
+
+    def iter_chunks(self, chunksize: int = 100_000) -> Iterator[DataFrame]:
+        """
+        Yields the results in preprocessed chunks of at most chunksize rows.
+        """
+        read_columns, read_filters, exact_filters = self._get_read_plan()
+        for chunk in self.dataset.iter_main_table(chunksize, columns=read_columns, filters=read_filters):
+            chunk = apply_filters(chunk, exact_filters)
+            if self.columns is not None:
+                chunk = chunk[list(self.columns)]
+            if len(chunk) > 0:
+                yield chunk
+
+    def to_pandas(self, chunksize: int = 100_000) -> DataFrame:
+        """
+        Reads the results into a DataFrame. If the dataset's main table is already
+        loaded, it is filtered in memory instead.
+        """
+        columns = None if self.columns is None else list(self.columns)
+        cached_table = self.dataset._main_table
+        if cached_table is not None:
+            result = apply_filters(cached_table, list(self.filters))
+            return result.copy() if columns is None else result[columns].copy()
+
+        read_columns, read_filters, exact_filters = self._get_read_plan()
+        with self.dataset.factory.create_reader() as reader:
+            chunks = list(reader.iter_main_table(chunksize, columns=read_columns, filters=read_filters))
+        if len(chunks) == 0:
+            return DataFrame(columns=columns)
+        result = concat_chunks(chunks)
+        # Preprocess the whole result at once, so it is sorted across chunks
+        for preprocessor in self.dataset.main_table_preprocessors:
+            result = preprocessor.apply(self.dataset, result)
+        result = apply_filters(result, exact_filters)
+        return result if columns is None else result[columns]
+
+    def _get_read_plan(self) -> tuple[Optional[list[str]], list[ColumnFilter], list[ColumnFilter]]:
+        """
+        Get the columns and filters to pass to the reader, which compares raw values, and
+        the filters to apply after preprocessing. The TimePreprocessor can move timestamps
+        by up to a day when applying timezone columns. So time filters on those columns are
+        widened for the reader and applied exactly afterwards. Every column is then read,
+        so the timezone columns are available.
+        """
+        columns = None if self.columns is None else list(self.columns)
+        read_filters = []
+        exact_filters = []
+        for column_filter in self.filters:
+            if not column_filter.is_time_filter or column_filter.column not in TimePreprocessor.TIMEZONE_COLUMNS:
+                read_filters.append(column_filter)
+                continue
+            exact_filters.append(column_filter)
+            columns = None
+            if column_filter.op in (FilterOp.GreaterEqual, FilterOp.Greater):
+                read_filters.append(replace(column_filter, op=FilterOp.GreaterEqual, value=column_filter.value - MAX_TIMEZONE_OFFSET))
+            elif column_filter.op in (FilterOp.LessEqual, FilterOp.Less):
+                read_filters.append(replace(column_filter, op=FilterOp.LessEqual, value=column_filter.value + MAX_TIMEZONE_OFFSET))
+        return columns, read_filters, exact_filters
+
+
+# The largest difference between a timestamp with and without its timezone offset
+MAX_TIMEZONE_OFFSET = timedelta(hours=24)
 
 
 class SortPreprocessor(Preprocessor):
@@ -103,58 +404,147 @@ class SortPreprocessor(Preprocessor):
             main_table.sort_values(by=[Cols.Order], inplace=True)
         elif order_scope == EventOrderScope.Restricted:
             # If restricted ordered, sort first by grouping columns, then by order
-            order_columns = self.get_metadata_property(MetadataProps.EventOrderScopeColumns)
+            order_columns = dataset.get_metadata_property(MetadataProps.EventOrderScopeColumns)
             if order_columns is None or len(order_columns) == 0:
                 raise Exception('EventOrderScope is restricted but no EventOrderScopeColumns given')
             columns = order_columns.split(';')
             columns.append('Order')
             # The result is that _within_ these groups, events are ordered
-            self.main_table.sort_values(by=columns, inplace=True)
+            main_table.sort_values(by=columns, inplace=True)
         return main_table
 
 class TimePreprocessor(Preprocessor):
     """
     Preprocessor that converts time columns to datetime format.
+    If any values have a timezone offset, the column is converted to UTC;
+    values without an offset are then assumed to already be in UTC.
+    Values that cannot be parsed become NaT.
     """
 
+    # Number of values used to decide which format to try first
+    SAMPLE_SIZE = 1000
+    TIMEZONE_OFFSET_PATTERN = datatypes.TIMEZONE_OFFSET_PATTERN
+    # The timezone column applied to each time column
+    TIMEZONE_COLUMNS = {
+        Cols.ClientTimestamp: "ClientTimezone",
+        Cols.ServerTimestamp: "ServerTimezone",
+    }
+
     def apply(self, dataset: PS2Dataset, main_table: DataFrame) -> DataFrame:
-        self._convert_time_columm(main_table, Cols.ClientTimestamp, "ClientTimezone")
-        self._convert_time_columm(main_table, Cols.ServerTimestamp, "ServerTimezone")
+        for time_column_name, timezone_column_name in self.TIMEZONE_COLUMNS.items():
+            self._convert_time_columm(main_table, time_column_name, timezone_column_name)
         return main_table
 
     def _convert_time_columm(self, main_table: DataFrame, time_column_name: str, timezone_column_name: str) -> None:
         if not time_column_name in main_table.columns:
             return
 
-
         if is_datetime(main_table[time_column_name]):
             # If the column is already in datetime format, no conversion needed
             return
 
-        timestamp_strings = main_table[time_column_name]
+        timestamp_strings = main_table[time_column_name].astype("string")
 
         if timezone_column_name in main_table.columns:
-            timezone_strings = list(main_table[timezone_column_name])
-            failed_timezone_message = None
-            for i in range(len(timezone_strings)):
-                if not datatypes.is_valid_timezone_offset(timestamp_strings[i]):
-                    failed_timezone_message = f"Warning: Invalid timezone offset '{timezone_strings[i]}' for '{time_column_name}' value '{timestamp_strings[i]}'. Skipping future warnings."
-                    timezone_strings[i] = ''
-            if failed_timezone_message:
-                print(failed_timezone_message)
-
-            timestamp_strings = timestamp_strings.str.cat(timezone_strings, sep='')
-
-        converted = []
-        for i in range(len(timestamp_strings)):
-            try:
-                converted.append(datatypes.parse_timestamp(timestamp_strings[i]))
-            except ValueError as e:
-                print(f"Warning: Could not parse '{time_column_name}' value '{timestamp_strings[i]}': {e}")
-                print("Column will use string values instead.")
+            timestamp_strings = self._add_timezones(timestamp_strings, main_table[timezone_column_name], time_column_name)
+
+        converted = self._parse_timestamps(timestamp_strings)
+
+        failed = converted.isna() & timestamp_strings.notna()
+        if failed.any():
+            examples = ", ".join(f"'{value}'" for value in timestamp_strings[failed].unique()[:3])
+            print(f"Warning: Could not parse {failed.sum()} '{time_column_name}' values (e.g. {examples}). These will be NaT.")
+
+        main_table[time_column_name] = converted
+
+    def _add_timezones(self, timestamp_strings: Series, timezones: Series, time_column_name: str) -> Series:
+        timezone_strings = timezones.astype("string").fillna("")
+        invalid = (timezone_strings != "") & ~timezone_strings.str.fullmatch(self.TIMEZONE_OFFSET_PATTERN).fillna(False)
+        if invalid.any():
+            example = timezone_strings[invalid].iloc[0]
+            print(f"Warning: {invalid.sum()} invalid timezone offsets (e.g. '{example}') for '{time_column_name}' will be ignored.")
+            timezone_strings = timezone_strings.mask(invalid, "")
+        # Don't add a second offset to timestamps that already have one
+        has_offset = timestamp_strings.str.contains(self.TIMEZONE_OFFSET_PATTERN + "$", regex=True).fillna(False)
+        return timestamp_strings.mask(~has_offset, timestamp_strings + timezone_strings)
+
+    def _parse_timestamps(self, timestamp_strings: Series) -> Series:
+        """
+        Parse the timestamps without per-value Python calls: offsets are stripped and
+        converted separately, and the remaining local times are parsed one format at a
+        time (most common in a sample first), each applied only to values not yet parsed.
+        """
+        index = timestamp_strings.index
+        # Work on a fresh index, so results can be assigned by label even if the original has duplicates
+        timestamp_strings = timestamp_strings.reset_index(drop=True).astype(self._get_string_dtype())
+        formats = self._order_formats(timestamp_strings)
+        local_strings, offset_minutes = self._split_offsets(timestamp_strings)
+
+        local_times = pd.Series(pd.NaT, index=local_strings.index, dtype="datetime64[ns]")
+        remaining = local_strings.notna()
+        for format in formats:
+            if not remaining.any():
                 break
+            parsed = pd.to_datetime(local_strings[remaining], format=format, errors="coerce")
+            parsed = parsed[parsed.notna()]
+            local_times[parsed.index] = parsed
+            remaining[parsed.index] = False
+
+        has_offset = offset_minutes.notna() & local_times.notna()
+        if not has_offset.any():
+            return local_times.set_axis(index)
+        if (local_times.notna() & ~has_offset).any():
+            print("Warning: Some timestamps have a timezone offset and others do not. Timestamps without an offset are assumed to be UTC.")
+        utc_times = local_times - pd.to_timedelta(offset_minutes.fillna(0), unit="m")
+        return utc_times.dt.tz_localize("UTC").set_axis(index)
+
+    def _split_offsets(self, timestamp_strings: Series) -> tuple[Series, Series]:
+        """
+        Split timestamps into their local time and their timezone offset in minutes (NaN if none).
+        """
+        local_strings = timestamp_strings.str.replace(self.TIMEZONE_OFFSET_PATTERN + "$", "", regex=True)
+        offset_lengths = timestamp_strings.str.len() - local_strings.str.len()
+        offset_minutes = pd.Series(np.nan, index=timestamp_strings.index)
+        for length in offset_lengths[offset_lengths > 0].unique():
+            has_length = offset_lengths == length
+            # There are few distinct offsets, so only convert each one once
+            offsets = timestamp_strings[has_length].str[-length:].astype("category")
+            offset_minutes[has_length] = offsets.map(self._get_offset_minutes).astype(float)
+        return local_strings, offset_minutes
 
-        # print(f"Converted {len(converted)} values for '{time_column_name}' column.")
+    @staticmethod
+    def _get_offset_minutes(offset: str) -> int:
+        if offset == "Z":
+            return 0
+        sign = -1 if offset[0] == "-" else 1
+        return sign * (int(offset[1:3]) * 60 + int(offset[-2:]))
 
-        if len(converted) == len(timestamp_strings):
-            main_table[time_column_name] = converted
+    @staticmethod
+    def _get_string_dtype() -> str:
+        # Arrow-backed strings make the regex and slicing operations much faster
+        try:
+            import pyarrow
+            return "string[pyarrow]"
+        except ImportError:
+            return "string"
+
+    def _order_formats(self, timestamp_strings: Series) -> list[str]:
+        """
+        Order the formats (without timezones, which are parsed separately) by how
+        often they occur in a sample, so most values are parsed by the first format.
+        """
+        with_fraction = datatypes.BASE_TIMESTAMP_FORMAT + datatypes.FRACTIONAL_SECONDS_FORMAT
+        without_fraction = datatypes.BASE_TIMESTAMP_FORMAT
+        n_with_fraction = 0
+        n_without_fraction = 0
+        for timestamp in timestamp_strings.dropna().iloc[:self.SAMPLE_SIZE]:
+            try:
+                if datatypes.parse_timestamp_details(timestamp).has_fraction:
+                    n_with_fraction += 1
+                else:
+                    n_without_fraction += 1
+            except ValueError:
+                continue
+        if n_with_fraction > n_without_fraction:
+            return [with_fraction, without_fraction]
+        return [without_fraction, with_fraction]
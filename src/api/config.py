@@ -13,11 +13,25 @@ class CORSConfig(BaseModel):
     allow_methods: list[str] = ["*"]
     allow_headers: list[str] = ["*"]
 
+class WriteBehindConfig(BaseModel):
+    enabled: bool = False
+    """If true, accepted batches are written to a local journal and
+    inserted into the database by a background worker, rather than
+    before responding to the client."""
+    journal_path: str = "write_behind_journal.db"
+    """Path to the SQLite journal file, relative to the database root_path."""
+    flush_interval_seconds: float = 1.0
+    """Maximum time a batch waits in the journal before being written."""
+    flush_max_events: int = 5000
+    """Number of queued events that triggers an early flush. Also the
+    approximate maximum number of events written in one transaction."""
+
 class PS2APIConfig(BaseModel):
     database_config: PS2DataConfig
 
     add_server_timestamps: bool = True
     cors_config: CORSConfig = CORSConfig()
+    write_behind: WriteBehindConfig = WriteBehindConfig()
 
     @classmethod
     def from_yaml(cls, yaml_path: str, ps2_spec: ProgSnap2Spec) -> "PS2APIConfig":
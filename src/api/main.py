@@ -1,14 +1,16 @@
 # server/main.py
+from contextlib import asynccontextmanager
 from enum import Enum
 import os
-from fastapi import Depends, FastAPI, Request
+from fastapi import Depends, FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Type
+from typing import List, Optional, Type
 
 from fastapi.responses import JSONResponse, PlainTextResponse
 
 from api.config import PS2APIConfig
 from api.models import TempCodeStateEntry
+from api.write_behind import FlushResult, QueueDepth, ReplayResult, WriteBehindQueue
 from database.writer.sql_writer import SQLWriter
 from api.events import DataModelGenerator
 from database.writer.db_writer import DBWriter, LogResult
@@ -28,20 +30,35 @@ AnyAdditionalColumns = data_model_gen.AnyAdditionalColumns
 
 api_config = PS2APIConfig.from_yaml(os.path.join(src_dir, "api/api_config.yaml"), spec)
 
-db_writer_factory: SQLIOFactory = IOFactory.create_factory(api_config.database_config, spec=spec)
+db_writer_factory: SQLIOFactory = IOFactory.create_factory(api_config.database_config, ps2_spec=spec)
 
 with db_writer_factory.create_writer() as writer:
     # Create the tables in the database
     writer.initialize_database()
 
+write_behind_queue: WriteBehindQueue = None
+if api_config.write_behind.enabled:
+    write_behind_queue = WriteBehindQueue(api_config.write_behind, db_writer_factory)
+
 # For use in Depends
 def create_writer():
+    if write_behind_queue is not None:
+        # Batches are written by the write-behind worker instead
+        yield None
+        return
     with db_writer_factory.create_writer() as writer:
         yield writer
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if write_behind_queue is not None:
+        write_behind_queue.start()
+    yield
+    if write_behind_queue is not None:
+        write_behind_queue.close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 cors_config = api_config.cors_config
 
@@ -78,14 +95,46 @@ def add_events_with_code_states(events: List[MainTableEvent], code_states: List[
 
     Note: TempCodeState.code_state_id is a temporary ID that will be remapped when logging
     the events. It is used to map multiple events to the same code state in this request.
+
+    If write-behind is enabled, the events are queued and the result only reflects validation.
     """
     events = [event.model_dump(exclude_none=True) for event in events]
     if api_config.add_server_timestamps:
-        writer.add_server_timestamps(events)
+        SQLWriter.add_server_timestamps(events)
 
     code_states = {code_state.temp_codestate_id: code_state for code_state in code_states}
+    if write_behind_queue is not None:
+        return write_behind_queue.append(events, code_states)
     return writer.add_events_with_codestates(events, code_states)
 
+@app.post("/flush", operation_id="flush", response_model=FlushResult)
+def flush() -> FlushResult:
+    """
+    Write all queued events to the database. Does nothing if write-behind is disabled.
+    """
+    if write_behind_queue is None:
+        return FlushResult()
+    return write_behind_queue.flush()
+
+@app.post("/replay_failed_batches", operation_id="replayFailedBatches", response_model=ReplayResult)
+def replay_failed_batches(batch_ids: Optional[List[int]] = Query(None)) -> ReplayResult:
+    """
+    Queue failed write-behind batches (all of them, or those with the given IDs) to be written again.
+    Does nothing if write-behind is disabled.
+    """
+    if write_behind_queue is None:
+        return ReplayResult()
+    return ReplayResult(batches_replayed=write_behind_queue.replay_failed_batches(batch_ids))
+
+@app.get("/queue_depth", operation_id="getQueueDepth", response_model=QueueDepth)
+def get_queue_depth() -> QueueDepth:
+    """
+    Get the number of batches and events waiting to be written to the database.
+    """
+    if write_behind_queue is None:
+        return QueueDepth()
+    return write_behind_queue.depth()
+
 @app.get("/generate_api_helper", operation_id="generateAPIHelper", response_class=PlainTextResponse)
 def generate_api_helper() -> str:
     return generate_ts_methods(spec)
\ No newline at end of file
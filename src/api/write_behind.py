@@ -0,0 +1,281 @@
+
+from enum import Enum
+import json
+import os
+import sqlite3
+import threading
+from typing import Optional
+from pydantic import BaseModel
+
+from api.config import WriteBehindConfig
+from database.writer.db_writer import LogResult
+from database.writer.db_writer_factory import IOFactory
+from spec.codestate import CodeStateEntry
+from spec.event_validator import EventValidator
+from spec.enums import MainTableColumns as Cols
+
+
+class QueueDepth(BaseModel):
+    batches: int = 0
+    events: int = 0
+    failed_batches: int = 0
+
+class FlushResult(BaseModel):
+    batches_written: int = 0
+    events_written: int = 0
+    batches_failed: int = 0
+    batches_deferred: int = 0
+    """Batches left in the journal because the database was unavailable."""
+
+class ReplayResult(BaseModel):
+    batches_replayed: int = 0
+
+
+def _json_default(value):
+    # Enums generated for event columns are not str subclasses
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value)} to the write-behind journal")
+
+
+class WriteBehindQueue:
+    """
+    A durable queue between the API and the database. Accepted batches of events
+    and codestates are appended to a local SQLite journal, and a background worker
+    drains them into the database writer in large groups. Batches that the writer
+    rejects are moved to a FailedBatches table, so they are never silently lost, and
+    can be queued again with replay_failed_batches. Batches that fail because the
+    database is unavailable (e.g. locked or restarting) stay queued and are retried.
+    Delivery is at-least-once: a crash between writing a group and removing it
+    from the journal means the group is written again on restart.
+    """
+
+    def __init__(self, config: WriteBehindConfig, factory: IOFactory):
+        self.config = config
+        self.factory = factory
+        self.event_validator = EventValidator(factory.ps2_spec)
+
+        journal_path = config.journal_path
+        if not os.path.isabs(journal_path):
+            journal_path = os.path.join(factory.db_config.root_path, journal_path)
+        os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+        self.journal_path = journal_path
+
+        # Autocommit mode; each append is its own durable transaction
+        self._journal = sqlite3.connect(journal_path, check_same_thread=False, isolation_level=None)
+        self._journal.execute("PRAGMA journal_mode=WAL")
+        self._journal.execute("PRAGMA synchronous=FULL")
+        self._journal.execute(
+            "CREATE TABLE IF NOT EXISTS Batches "
+            "(BatchID INTEGER PRIMARY KEY AUTOINCREMENT, EventCount INTEGER NOT NULL, Payload TEXT NOT NULL)"
+        )
+        self._journal.execute(
+            "CREATE TABLE IF NOT EXISTS FailedBatches "
+            "(BatchID INTEGER PRIMARY KEY, Payload TEXT NOT NULL, Errors TEXT NOT NULL)"
+        )
+        self._journal_lock = threading.Lock()
+        # Only one flush (worker or /flush endpoint) may drain the journal at a time
+        self._flush_lock = threading.Lock()
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def append(self, events: list[dict[str, any]], codestates: dict[str, CodeStateEntry]) -> LogResult:
+        """
+        Validate a batch and append it to the journal. The returned result only
+        reflects validation; database errors are recorded when the batch is flushed.
+        """
+        result = LogResult(True)
+        for errors in self.event_validator.validate_batch(events).values():
+            result.warnings.extend([str(warning) for warning in errors])
+
+        payload = json.dumps({
+            "events": events,
+            "code_states": {codestate_id: codestate.model_dump(exclude_none=True) for codestate_id, codestate in codestates.items()},
+        }, default=_json_default)
+
+        with self._journal_lock:
+            self._journal.execute(
+                "INSERT INTO Batches (EventCount, Payload) VALUES (?, ?)",
+                (len(events), payload),
+            )
+
+        if self.depth().events >= self.config.flush_max_events:
+            self._wake.set()
+        return result
+
+    def depth(self) -> QueueDepth:
+        with self._journal_lock:
+            batches, events = self._journal.execute(
+                "SELECT COUNT(*), COALESCE(SUM(EventCount), 0) FROM Batches"
+            ).fetchone()
+            failed_batches, = self._journal.execute("SELECT COUNT(*) FROM FailedBatches").fetchone()
+        return QueueDepth(batches=batches, events=events, failed_batches=failed_batches)
+
+    def flush(self) -> FlushResult:
+        """
+        Write every batch queued at the time of the call to the database.
+        """
+        flush_result = FlushResult()
+        with self._flush_lock:
+            with self._journal_lock:
+                last_batch_id, = self._journal.execute("SELECT COALESCE(MAX(BatchID), 0) FROM Batches").fetchone()
+            while True:
+                batches = self._read_group(last_batch_id)
+                if len(batches) == 0:
+                    break
+                if not self._write_group(batches, flush_result):
+                    # Later batches would fail the same way, so wait for the next flush
+                    break
+        return flush_result
+
+    def _read_group(self, last_batch_id: int) -> list[tuple[int, int, str]]:
+        """
+        Read the oldest queued batches, up to flush_max_events events (but at least one batch).
+        """
+        with self._journal_lock:
+            cursor = self._journal.execute(
+                "SELECT BatchID, EventCount, Payload FROM Batches WHERE BatchID <= ? ORDER BY BatchID",
+                (last_batch_id,),
+            )
+            group = []
+            n_events = 0
+            for batch in cursor:
+                if len(group) > 0 and n_events + batch[1] > self.config.flush_max_events:
+                    break
+                group.append(batch)
+                n_events += batch[1]
+            cursor.close()
+        return group
+
+    def _merge_batches(self, batches: list[tuple[int, int, str]]) -> tuple[list[dict[str, any]], dict[str, CodeStateEntry]]:
+        """
+        Combine several journaled batches into one list of events and one codestate map.
+        Temporary CodeStateIDs are only unique within a request, so they are namespaced
+        by BatchID when they will be regenerated anyway.
+        """
+        namespace_ids = self.factory.db_config.optimize_codestate_ids
+        events = []
+        codestates = {}
+        for batch_id, _, payload in batches:
+            data = json.loads(payload)
+            batch_codestates = data["code_states"]
+            for event in data["events"]:
+                codestate_id = event.get(Cols.CodeStateID)
+                if namespace_ids and codestate_id in batch_codestates:
+                    event[Cols.CodeStateID] = f"{batch_id}:{codestate_id}"
+                events.append(event)
+            for codestate_id, codestate in batch_codestates.items():
+                if namespace_ids:
+                    codestate_id = f"{batch_id}:{codestate_id}"
+                codestates[codestate_id] = CodeStateEntry.model_validate(codestate)
+        return events, codestates
+
+    def _write_group(self, batches: list[tuple[int, int, str]], flush_result: FlushResult) -> bool:
+        """
+        Write a group of batches, isolating any that fail because of their data.
+        Returns False if the database was unavailable, in which case the remaining
+        batches are left in the journal to be retried.
+        """
+        events, codestates = self._merge_batches(batches)
+        with self.factory.create_writer() as writer:
+            result = writer.add_events_with_codestates(events, codestates)
+
+        if result.success:
+            self._delete_batches([batch[0] for batch in batches])
+            flush_result.batches_written += len(batches)
+            flush_result.events_written += len(events)
+        elif result.retryable:
+            print(f"Warning: Writing {len(batches)} write-behind batches failed and will be retried: {result.errors}")
+            flush_result.batches_deferred += len(batches)
+            return False
+        elif len(batches) > 1:
+            # Retry one at a time so a single bad batch does not block the others
+            for index, batch in enumerate(batches):
+                if not self._write_group([batch], flush_result):
+                    flush_result.batches_deferred += len(batches) - index - 1
+                    return False
+        else:
+            batch_id, _, payload = batches[0]
+            print(f"Warning: Write-behind batch {batch_id} failed and was moved to FailedBatches: {result.errors}")
+            with self._journal_lock:
+                self._journal.execute("BEGIN")
+                self._journal.execute(
+                    "INSERT OR REPLACE INTO FailedBatches (BatchID, Payload, Errors) VALUES (?, ?, ?)",
+                    (batch_id, payload, json.dumps(result.errors)),
+                )
+                self._journal.execute("DELETE FROM Batches WHERE BatchID = ?", (batch_id,))
+                self._journal.execute("COMMIT")
+            flush_result.batches_failed += 1
+        return True
+
+    def replay_failed_batches(self, batch_ids: Optional[list[int]] = None) -> int:
+        """
+        Move failed batches (all of them, or those with the given IDs) back into the
+        queue, e.g. once the cause of their errors is fixed, so they are written on the
+        next flush. Batches keep their IDs, so they are written in their original order.
+        Returns the number of batches queued again.
+        """
+        with self._journal_lock:
+            query = "SELECT BatchID, Payload FROM FailedBatches"
+            params = []
+            if batch_ids is not None:
+                if len(batch_ids) == 0:
+                    return 0
+                query += f" WHERE BatchID IN ({', '.join('?' for _ in batch_ids)})"
+                params = list(batch_ids)
+            failed_batches = self._journal.execute(query, params).fetchall()
+            self._journal.execute("BEGIN")
+            for batch_id, payload in failed_batches:
+                self._journal.execute(
+                    "INSERT INTO Batches (BatchID, EventCount, Payload) VALUES (?, ?, ?)",
+                    (batch_id, len(json.loads(payload)["events"]), payload),
+                )
+                self._journal.execute("DELETE FROM FailedBatches WHERE BatchID = ?", (batch_id,))
+            self._journal.execute("COMMIT")
+        if len(failed_batches) > 0:
+            self._wake.set()
+        return len(failed_batches)
+
+    def _delete_batches(self, batch_ids: list[int]) -> None:
+        with self._journal_lock:
+            self._journal.execute("BEGIN")
+            self._journal.executemany("DELETE FROM Batches WHERE BatchID = ?", [(batch_id,) for batch_id in batch_ids])
+            self._journal.execute("COMMIT")
+
+    def start(self) -> None:
+        """
+        Start the background worker, which flushes the journal every flush_interval_seconds,
+        or sooner if flush_max_events are queued.
+        """
+        if self._worker is not None:
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="ps2-write-behind", daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background worker and write any remaining batches.
+        """
+        if self._worker is not None:
+            self._stop.set()
+            self._wake.set()
+            self._worker.join()
+            self._worker = None
+        self.flush()
+
+    def close(self) -> None:
+        self.stop()
+        self._journal.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.config.flush_interval_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Batches stay in the journal and will be retried on the next flush
+                print(f"Error flushing write-behind journal: {e}")
@@ -0,0 +1,97 @@
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+from typing import Iterable
+
+
+@dataclass
+class CodeStateIDCacheStats:
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+
+class CodeStateIDCache:
+    """
+    A bounded, thread-safe LRU set of CodeStateIDs that are known to be stored.
+    IDs are namespaced by storage location (e.g. a database URL or directory), so
+    writers for different datasets can share one cache. Since CodeStateIDs are
+    content hashes, a cached ID never needs to be invalidated unless the
+    underlying storage is deleted or replaced, in which case clear_namespace()
+    should be called for it.
+    """
+
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self._ids: OrderedDict[tuple[str, str], None] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def contains(self, namespace: str, codestate_id: str) -> bool:
+        """
+        Check whether an ID is known to be stored, counting the lookup as a hit or miss.
+        """
+        key = (namespace, codestate_id)
+        with self._lock:
+            if key in self._ids:
+                self._ids.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, namespace: str, codestate_id: str) -> None:
+        self.add_all(namespace, [codestate_id])
+
+    def add_all(self, namespace: str, codestate_ids: Iterable[str]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for codestate_id in codestate_ids:
+                key = (namespace, codestate_id)
+                self._ids[key] = None
+                self._ids.move_to_end(key)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def resize(self, max_size: int) -> None:
+        with self._lock:
+            self.max_size = max_size
+            while len(self._ids) > max(max_size, 0):
+                self._ids.popitem(last=False)
+
+    def clear_namespace(self, namespace: str) -> None:
+        """
+        Forget all IDs in one namespace, e.g. after its storage is recreated.
+        """
+        with self._lock:
+            for key in [key for key in self._ids if key[0] == namespace]:
+                del self._ids[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> CodeStateIDCacheStats:
+        with self._lock:
+            return CodeStateIDCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                size=len(self._ids),
+                max_size=self.max_size,
+            )
+
+
+shared_codestate_id_cache = CodeStateIDCache()
+"""The cache shared by all CodeStateWriters in this process that opt in to it
+(see PS2DataConfig.share_codestate_id_cache)."""
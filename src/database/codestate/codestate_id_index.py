@@ -0,0 +1,162 @@
+
+import csv
+import json
+import os
+from typing import Callable, Iterable, Optional
+
+from spec.enums import CodeStatesTableColumns as Cols
+
+
+class CodeStateIDIndex:
+    """
+    A sidecar index of the CodeStateIDs stored in a CodeStates CSV file, so that
+    writers can find existing IDs without parsing every Code value in the table.
+    The index is two files next to the CSV:
+    * <csv>.ids: one CodeStateID per line, appended to as CodeStates are written.
+    * <csv>.ids.json: the size, modification time and final bytes of the CSV when
+      the index was last updated, used to detect changes made without updating the index.
+    """
+
+    INDEX_SUFFIX = ".ids"
+    STATE_SUFFIX = ".ids.json"
+    # Number of bytes before the indexed size checked to confirm the CSV was only appended to
+    TAIL_BYTES = 64
+
+    def __init__(self, csv_path: str, on_invalidate: Optional[Callable[[], None]] = None):
+        """
+        :param on_invalidate: Called when the CSV is found to have been deleted or
+        rewritten, so IDs it previously contained may no longer be stored.
+        """
+        self.csv_path = csv_path
+        self.index_path = csv_path + self.INDEX_SUFFIX
+        self.state_path = csv_path + self.STATE_SUFFIX
+        self.on_invalidate = on_invalidate
+        # Whether the index files are behind the CSV, because they were not updated on load
+        self._stale = False
+
+    def load(self, persist: bool = True) -> set[str]:
+        """
+        Load the IDs in the CSV file, using the index when it is up to date.
+        If the CSV has only been appended to, just the new rows are scanned;
+        otherwise the index is rebuilt from the full CSV.
+        :param persist: Whether to update the index files to match the CSV. Readers
+        should pass False, so reading a dataset never writes to it.
+        """
+        if not os.path.exists(self.csv_path):
+            if os.path.exists(self.index_path):
+                self._invalidate()
+                if persist:
+                    self._remove()
+                else:
+                    self._stale = True
+            return set()
+
+        state = self._read_state()
+        stat = os.stat(self.csv_path)
+        if state is None or not os.path.exists(self.index_path):
+            return self.rebuild(persist)
+
+        indexed_size = state["csv_size"]
+        if stat.st_size == indexed_size and stat.st_mtime_ns == state["csv_mtime_ns"]:
+            return self._read_index()
+        if stat.st_size <= indexed_size or self._read_tail(indexed_size) != state["csv_tail"]:
+            # Rewritten or truncated, so indexed rows may no longer exist
+            return self.rebuild(persist)
+
+        # Rows were appended without updating the index
+        codestate_ids = self._read_index()
+        new_ids = self._scan_csv(offset=indexed_size)
+        if persist:
+            self.append(new_ids)
+        else:
+            self._stale = True
+        codestate_ids.update(new_ids)
+        return codestate_ids
+
+    def rebuild(self, persist: bool = True) -> set[str]:
+        self._invalidate()
+        codestate_ids = self._scan_csv()
+        if persist:
+            self._write_index(codestate_ids, 'w')
+        else:
+            self._stale = True
+        return codestate_ids
+
+    def append(self, codestate_ids: Iterable[str]) -> None:
+        """
+        Record IDs that have been written to the CSV. Should be called after
+        the rows are written, so the recorded CSV size includes them.
+        """
+        if self._stale:
+            # Appending would record the CSV's size without the rows the index is missing
+            self._write_index(self._scan_csv(), 'w')
+        else:
+            self._write_index(codestate_ids, 'a')
+
+    def _write_index(self, codestate_ids: Iterable[str], mode: str) -> None:
+        try:
+            with open(self.index_path, mode, encoding='utf-8') as index_file:
+                index_file.writelines(f"{codestate_id}\n" for codestate_id in codestate_ids)
+            self._write_state()
+            self._stale = False
+        except OSError as e:
+            # e.g. a read-only directory. The index is rebuilt once it can be written.
+            print(f"Warning: Could not update the CodeState index at '{self.index_path}': {e}")
+            self._stale = True
+
+    def _read_index(self) -> set[str]:
+        with open(self.index_path, 'r', encoding='utf-8') as index_file:
+            return {line.rstrip("\n") for line in index_file if line != "\n"}
+
+    def _scan_csv(self, offset: int = 0) -> set[str]:
+        codestate_ids = set()
+        with open(self.csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+            header = next(csv.reader(csvfile), None)
+            if header is None:
+                return codestate_ids
+            if offset > 0:
+                csvfile.seek(offset)
+            reader = csv.DictReader(csvfile, fieldnames=header)
+            for row in reader:
+                codestate_ids.add(row[Cols.CodeStateID])
+        return codestate_ids
+
+    def _read_state(self) -> Optional[dict]:
+        if not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as state_file:
+                state = json.load(state_file)
+        except ValueError:
+            return None
+        if not all(key in state for key in ("csv_size", "csv_mtime_ns", "csv_tail")):
+            return None
+        return state
+
+    def _read_tail(self, size: int) -> str:
+        with open(self.csv_path, 'rb') as csvfile:
+            start = max(size - self.TAIL_BYTES, 0)
+            csvfile.seek(start)
+            return csvfile.read(size - start).hex()
+
+    def _write_state(self) -> None:
+        stat = os.stat(self.csv_path)
+        state = {
+            "csv_size": stat.st_size,
+            "csv_mtime_ns": stat.st_mtime_ns,
+            "csv_tail": self._read_tail(stat.st_size),
+        }
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file)
+        # Replace atomically so a crash never leaves a partially written state
+        os.replace(temp_path, self.state_path)
+
+    def _invalidate(self) -> None:
+        if self.on_invalidate is not None:
+            self.on_invalidate()
+
+    def _remove(self) -> None:
+        for path in (self.index_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -1,8 +1,9 @@
 
 from abc import ABC, abstractmethod
 import hashlib
-from typing import Optional
+from typing import Iterable, Optional
 
+from database.codestate.codestate_id_cache import CodeStateIDCache
 from spec.codestate import CodeStateEntry, CodeStateSectionEntry
 
 
@@ -41,6 +42,68 @@ class ContextualCodeStateEntry(CodeStateEntry):
 
 class CodeStateWriter(ABC):
 
+    id_cache: Optional[CodeStateIDCache] = None
+    """Cache of CodeStateIDs known to be stored, consulted before checking storage.
+    If None, storage is always checked."""
+
+    def get_cache_namespace(self) -> Optional[str]:
+        """
+        An identifier for where this writer stores CodeStates, used to namespace
+        cached IDs. Writers that return None do not use the cache.
+        """
+        return None
+
+    def is_known_codestate_id(self, codestate_id: str) -> bool:
+        """
+        Check the ID cache for a CodeState that has already been stored.
+        """
+        namespace = self.get_cache_namespace()
+        if self.id_cache is None or namespace is None:
+            return False
+        return self.id_cache.contains(namespace, codestate_id)
+
+    def remember_codestate_ids(self, codestate_ids: Iterable[str]) -> None:
+        """
+        Record that CodeStates have been durably stored.
+        """
+        namespace = self.get_cache_namespace()
+        if self.id_cache is None or namespace is None:
+            return
+        self.id_cache.add_all(namespace, codestate_ids)
+
+    def forget_codestate_ids(self) -> None:
+        """
+        Clear the cached IDs for this writer's storage, e.g. after it is recreated.
+        """
+        namespace = self.get_cache_namespace()
+        if self.id_cache is None or namespace is None:
+            return
+        self.id_cache.clear_namespace(namespace)
+
+    def on_commit(self) -> None:
+        """
+        Called after the caller commits the transaction CodeStates were written in.
+        """
+        pass
+
+    def on_rollback(self) -> None:
+        """
+        Called after the caller rolls back the transaction CodeStates were written in.
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Write any buffered CodeStates and release open resources.
+        """
+        pass
+
+    def get_stored_codestate_ids(self) -> Optional[set[str]]:
+        """
+        Get the IDs of all stored CodeStates, or None if they can't be listed for this format.
+        """
+        return None
+
     def get_codestate_id_from_hash(self, codestate: ContextualCodeStateEntry) -> str:
         if codestate.is_blank:
             raise ValueError("Cannot generate ID for a blank CodeState. ID should be ''.")
@@ -86,3 +149,18 @@ class CodeStateWriter(ABC):
         where the ID must correspond to the commit hash.
         """
 
+    def add_codestates_bulk(self, codestates: dict[str, CodeStateEntry]) -> None:
+        """
+        Add several CodeStates, keyed by the ID to use for each. Subclasses can
+        override this to check and write many CodeStates in one storage operation.
+        """
+        for codestate_id, codestate in codestates.items():
+            self.add_codestate_with_id(codestate, codestate_id)
+
+    def add_codestates_and_get_ids(self, codestates: dict[str, CodeStateEntry]) -> dict[str, str]:
+        """
+        Add several CodeStates and return a map from each provided key
+        (e.g. a temporary CodeStateID) to the ID of the stored CodeState.
+        """
+        return {key: self.add_codestate_and_get_id(codestate) for key, codestate in codestates.items()}
+
@@ -14,11 +14,20 @@ class DirectoryCodeStateWriter(CodeStateWriter):
         self.add_codestate_with_id(codestate, codestate_id)
         return codestate_id
 
+    def get_cache_namespace(self) -> str:
+        return os.path.abspath(self.root)
+
     def add_codestate_with_id(self, codestate: ContextualCodeStateEntry, codestate_id: str):
         grouping_id = codestate.grouping_id or ''
+        # The same CodeState is stored separately for each grouping ID
+        cache_id = os.path.join(grouping_id, codestate_id)
+        if self.is_known_codestate_id(cache_id):
+            return
+
         directory = os.path.join(self.root, grouping_id, codestate_id)
         if os.path.exists(directory):
             # Directory already exists, no need to add it again
+            self.remember_codestate_ids([cache_id])
             return
 
         os.makedirs(directory, exist_ok=True)
@@ -26,3 +35,4 @@ class DirectoryCodeStateWriter(CodeStateWriter):
             file_path = os.path.join(directory, section.CodeStateSection or self._get_default_codestate_section())
             with open(file_path, 'w') as f:
                 f.write(section.Code)
+        self.remember_codestate_ids([cache_id])
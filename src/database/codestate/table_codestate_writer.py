@@ -1,30 +1,73 @@
 import csv
-from sqlalchemy import insert
+from sqlalchemy import insert, select
+from database.codestate.codestate_id_index import CodeStateIDIndex
 from database.codestate.codestate_writer import ContextualCodeStateEntry, CodeStateWriter
-from database.config import PS2DataConfig
+from spec.codestate import CodeStateSectionEntry
+from database.config import FsyncPolicy, PS2DataConfig
 from database.sql_context import IOContext, SQLContext
 from spec.enums import CodeStatesTableColumns as Cols
 import os
 
 class CSVTableCodeStateWriter(CodeStateWriter):
-
-    def __init__(self, data_config: PS2DataConfig):
+    """
+    Appends CodeStates to a CSV table. Rows are buffered and written through one
+    file handle that stays open until the writer is closed, so it should be used
+    as a context manager (or closed explicitly) to make sure all rows are written.
+    """
+
+    def __init__(self, data_config: PS2DataConfig, read_only: bool = False):
+        """
+        :param read_only: If true, e.g. for readers, the CodeStates index is
+        only read, and never created or updated.
+        """
         super().__init__()
         self.config = data_config
-        self.written_codestate_ids = set()
-
-        self.initialize_codestate_ids()
+        self.read_only = read_only
+        self._written_codestate_ids: set[str] = None
+        self.index = None
+        if data_config.use_codestates_index:
+            self.index = CodeStateIDIndex(data_config.codestates_table_path, on_invalidate=self.forget_codestate_ids)
+
+        self._csvfile = None
+        self._csv_writer: csv.DictWriter = None
+        self._buffered_rows: list[dict[str, str]] = []
+        # IDs of the buffered rows, in order (a dict, for constant-time lookups)
+        self._buffered_ids: dict[str, None] = {}
+
+    def __enter__(self) -> "CSVTableCodeStateWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def written_codestate_ids(self) -> set[str]:
+        # Only read the CodeStates file if the ID cache cannot answer a lookup
+        if self._written_codestate_ids is None:
+            self._written_codestate_ids = set()
+            self.initialize_codestate_ids()
+        return self._written_codestate_ids
+
+    def get_cache_namespace(self) -> str:
+        return os.path.abspath(self.config.codestates_table_path)
+
+    def get_stored_codestate_ids(self) -> set[str]:
+        return set(self.written_codestate_ids)
 
     def initialize_codestate_ids(self):
+        if self.index is not None:
+            self._written_codestate_ids = self.index.load(persist=not self.read_only)
+            return
+
         file_path = self.config.codestates_table_path
         if not os.path.exists(file_path):
             return
 
-        with open(file_path, 'r', newline='') as csvfile:
+        with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
             reader = csv.DictReader(csvfile)
             for row in reader:
                 codestate_id = row[Cols.CodeStateID]
-                self.written_codestate_ids.add(codestate_id)
+                self._written_codestate_ids.add(codestate_id)
 
     def add_codestate_and_get_id(self, codestate: ContextualCodeStateEntry) -> str:
         codestate_id = self.get_codestate_id_from_hash(codestate)
@@ -32,47 +75,121 @@ class CSVTableCodeStateWriter(CodeStateWriter):
         return codestate_id
 
     def add_codestate_with_id(self, codestate: ContextualCodeStateEntry, codestate_id: str):
-        file_path = self.config.codestates_table_path
+        if self.is_known_codestate_id(codestate_id):
+            return
 
         if codestate_id in self.written_codestate_ids:
             # If the codestate ID has already been written, skip adding it again
+            if codestate_id not in self._buffered_ids:
+                self.remember_codestate_ids([codestate_id])
             return
 
-        self.written_codestate_ids.add(codestate_id)
-
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        # Write the code state to a CSV file
-        with open(file_path, 'a', newline='') as csvfile:
-            add_section = self.config.codestates_have_sections
-
-            fieldnames = [Cols.CodeStateID, Cols.Code]
+        add_section = self.config.codestates_have_sections
+        rows = []
+        for section in codestate.sections:
+            dict = {
+                Cols.CodeStateID: codestate_id,
+                Cols.Code: section.Code,
+            }
             if add_section:
-                fieldnames.append(Cols.CodeStateSection)
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                dict[Cols.CodeStateSection] = section.CodeStateSection
+            elif section.CodeStateSection:
+                raise ValueError("CodeStateSection should be None; this dataset does not support sections.")
+            rows.append(dict)
 
-            # Check if the file is empty to write the header
-            if csvfile.tell() == 0:
-                writer.writeheader()
+        self.written_codestate_ids.add(codestate_id)
+        self._buffered_rows.extend(rows)
+        self._buffered_ids[codestate_id] = None
 
-            for section in codestate.sections:
-                dict = {
-                    Cols.CodeStateID: codestate_id,
-                    Cols.Code: section.Code,
-                }
-                if add_section:
-                    dict[Cols.CodeStateSection] = section.CodeStateSection
-                elif section.CodeStateSection:
-                    raise ValueError("CodeStateSection should be None; this dataset does not support sections.")
+        if len(self._buffered_rows) >= self.config.codestates_buffer_rows:
+            self.flush()
 
-                writer.writerow(dict)
+    def _open(self) -> None:
+        file_path = self.config.codestates_table_path
+        # Ensure the directory exists
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self._csvfile = open(file_path, 'a', newline='', encoding='utf-8')
+
+        fieldnames = [Cols.CodeStateID, Cols.Code]
+        if self.config.codestates_have_sections:
+            fieldnames.append(Cols.CodeStateSection)
+        self._csv_writer = csv.DictWriter(self._csvfile, fieldnames=fieldnames)
+
+        # Check if the file is empty to write the header
+        if self._csvfile.tell() == 0:
+            self._csv_writer.writeheader()
+
+    def flush(self) -> None:
+        """
+        Append all buffered rows to the CSV file.
+        """
+        if len(self._buffered_rows) == 0:
+            return
+        if self._csvfile is None:
+            self._open()
+
+        self._csv_writer.writerows(self._buffered_rows)
+        self._csvfile.flush()
+        if self.config.codestates_fsync == FsyncPolicy.OnFlush:
+            os.fsync(self._csvfile.fileno())
+
+        if self.index is not None:
+            self.index.append(self._buffered_ids)
+        self.remember_codestate_ids(self._buffered_ids)
+        self._buffered_rows = []
+        self._buffered_ids = {}
+
+    def on_commit(self) -> None:
+        self.flush()
+
+    def on_rollback(self) -> None:
+        # Drop rows that have not been written yet
+        if self._written_codestate_ids is not None:
+            self._written_codestate_ids.difference_update(self._buffered_ids)
+        self._buffered_rows = []
+        self._buffered_ids = {}
+
+    def close(self) -> None:
+        self.flush()
+        if self._csvfile is None:
+            return
+        if self.config.codestates_fsync != FsyncPolicy.Never:
+            os.fsync(self._csvfile.fileno())
+        self._csvfile.close()
+        self._csvfile = None
+        self._csv_writer = None
 
 class SQLTableCodeStateWriter(CodeStateWriter):
 
+    # Keep IN clauses well under the bound parameter limits of common databases
+    MAX_IDS_PER_QUERY = 500
+
     def __init__(self, context: SQLContext):
         super().__init__()
-        self.conn = context.conn
+        self.context = context
         self.table = context.table_manager.codestates_table
+        # IDs written or found in the current transaction, which are only
+        # cached once the caller commits
+        self._pending_codestate_ids: set[str] = set()
+
+    @property
+    def conn(self):
+        # Read from the context, since pooled contexts are reused with new connections
+        return self.context.conn
+
+    def get_cache_namespace(self) -> str:
+        return self.context.table_manager.codestates_cache_namespace
+
+    def get_stored_codestate_ids(self) -> set[str]:
+        id_column = self.table.c[Cols.CodeStateID]
+        return set(self.conn.execute(select(id_column).distinct()).scalars())
+
+    def on_commit(self) -> None:
+        self.remember_codestate_ids(self._pending_codestate_ids)
+        self._pending_codestate_ids = set()
+
+    def on_rollback(self) -> None:
+        self._pending_codestate_ids = set()
 
     def add_codestate_and_get_id(self, codestate: ContextualCodeStateEntry) -> str:
         codestate_id = self.get_codestate_id_from_hash(codestate)
@@ -80,31 +197,59 @@ class SQLTableCodeStateWriter(CodeStateWriter):
         return codestate_id
 
     def add_codestate_with_id(self, codestate: ContextualCodeStateEntry, codestate_id: str):
-        # Execute as a transaction to ensure atomicity
-        with self.conn.begin():
-            # Check if the code state already exists in the database
-            select_statement = self.table.select().where(
-                self.table.c.CodeStateID == codestate_id
-            )
-            result = self.conn.execute(select_statement).fetchone()
-            if result:
-                # TODO: It might be good to check that the stored code state matches
-                # the one we are trying to add
-                return
+        self.add_codestates_bulk({codestate_id: codestate})
+
+    def add_codestates_and_get_ids(self, codestates: dict[str, ContextualCodeStateEntry]) -> dict[str, str]:
+        ids = {key: self.get_codestate_id_from_hash(codestate) for key, codestate in codestates.items()}
+        self.add_codestates_bulk({ids[key]: codestate for key, codestate in codestates.items()})
+        return ids
+
+    def add_codestates_bulk(self, codestates: dict[str, ContextualCodeStateEntry]) -> None:
+        """
+        Add any CodeStates whose IDs are not already stored, using one query to find
+        existing IDs and one multi-row insert for all new sections. This runs in the
+        caller's transaction and does not commit, so CodeStates are only stored if
+        the events that reference them are.
+        """
+        unknown_ids = [
+            codestate_id for codestate_id in codestates
+            if codestate_id not in self._pending_codestate_ids and not self.is_known_codestate_id(codestate_id)
+        ]
+        if len(unknown_ids) == 0:
+            return
 
-            dict = {
-                Cols.CodeStateID: codestate_id,
-                Cols.Code: section.Code,
-            }
-            if self.context.data_config.codestates_have_sections:
-                dict[Cols.CodeStateSection] = section.CodeStateSection
-            elif section.CodeStateSection:
-                raise ValueError("CodeStateSection should be None; this dataset does not support sections.")
+        existing_ids = self._get_existing_ids(unknown_ids)
 
-            # Add the code state to the CodeStates table using a structured query
+        rows = []
+        for codestate_id in unknown_ids:
+            codestate = codestates[codestate_id]
+            self._pending_codestate_ids.add(codestate_id)
+            if codestate_id in existing_ids:
+                # TODO: It might be good to check that the stored code state matches
+                # the one we are trying to add
+                continue
             for section in codestate.sections:
-                statement = self.table.insert().values(**dict)
-                self.conn.execute(statement)
-
-
-
+                rows.append(self._create_row(codestate_id, section))
+
+        if len(rows) > 0:
+            self.conn.execute(self.table.insert(), rows)
+
+    def _get_existing_ids(self, codestate_ids: list[str]) -> set[str]:
+        existing_ids = set()
+        id_column = self.table.c[Cols.CodeStateID]
+        for start in range(0, len(codestate_ids), self.MAX_IDS_PER_QUERY):
+            chunk = codestate_ids[start:start + self.MAX_IDS_PER_QUERY]
+            statement = select(id_column).where(id_column.in_(chunk)).distinct()
+            existing_ids.update(self.conn.execute(statement).scalars())
+        return existing_ids
+
+    def _create_row(self, codestate_id: str, section: CodeStateSectionEntry) -> dict[str, str]:
+        row = {
+            Cols.CodeStateID: codestate_id,
+            Cols.Code: section.Code,
+        }
+        if self.context.data_config.codestates_have_sections:
+            row[Cols.CodeStateSection] = section.CodeStateSection
+        elif section.CodeStateSection:
+            raise ValueError("CodeStateSection should be None; this dataset does not support sections.")
+        return row
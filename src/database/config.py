@@ -1,5 +1,6 @@
 
 
+from enum import Enum
 import os
 from typing import Optional
 from pydantic import BaseModel, create_model, model_validator
@@ -7,6 +8,21 @@ import yaml
 
 from spec.spec_definition import Metadata, ProgSnap2Spec
 
+class FsyncPolicy(str, Enum):
+    Never = "Never"
+    """Leave flushing to disk to the operating system."""
+    OnFlush = "OnFlush"
+    """Sync after every batch of rows is written."""
+    OnClose = "OnClose"
+    """Sync once, when the writer is closed."""
+
+class IndexConfig(BaseModel):
+    """An index on the main table of a SQL dataset."""
+    columns: list[str]
+    unique: bool = False
+    name: Optional[str] = None
+    """Defaults to a name derived from the columns."""
+
 def create_metadata_values_model(metadata_spec: Metadata) -> type[BaseModel]:
     fields = {}
     for property in metadata_spec.properties:
@@ -39,6 +55,27 @@ class PS2DataConfig(BaseModel):
     """Relative path to the main table CSV file."""
     codestates_table_relative_path: str = "CodeStates.csv"
     """Relative path to the CodeStates table CSV file."""
+    use_codestates_index: bool = True
+    """If true, a sidecar index of CodeStateIDs is kept next to the
+    CodeStates CSV file, so writers do not need to read the whole file."""
+    codestates_buffer_rows: int = 1000
+    """Number of CodeState rows buffered in memory before being appended
+    to the CodeStates CSV file. Buffered rows are also written on commit and close."""
+    codestates_fsync: FsyncPolicy = FsyncPolicy.OnClose
+    """When to force CodeState rows written to the CSV file onto disk."""
+    share_codestate_id_cache: bool = False
+    """If true, CodeState writers remember stored CodeStateIDs in a cache shared
+    by all writers in this process, and skip checking storage for them. The cache
+    is cleared when the database is initialized or imported into by this process,
+    so it should not be used if other processes can delete stored CodeStates."""
+    csv_engine: Optional[str] = None
+    """The pandas parser engine used to read CSV tables, e.g. "c" or "pyarrow"
+    (faster, but requires pyarrow). Uses the pandas default if not set.
+    Chunked reads always use the "c" engine, since pyarrow does not support them."""
+    csv_parse_timestamps: bool = False
+    """If true, Timestamp columns in the main table are parsed to datetimes when
+    read, with values converted to UTC (and values without an offset treated as UTC).
+    Otherwise they are kept as strings, so local times can be recovered."""
 
     # Config for SQL/SQLite format
     sqlalchemy_url: str = None
@@ -46,6 +83,55 @@ class PS2DataConfig(BaseModel):
     path_str_length: int = 2048
     echo: bool = False
 
+    # Connection pooling for SQL/SQLite format
+    use_connection_pool: bool = True
+    """If false, a new database connection is opened for every reader/writer."""
+    pool_size: Optional[int] = None
+    """Number of connections kept open by the pool. Uses the SQLAlchemy default if not set."""
+    max_overflow: Optional[int] = None
+    """Number of connections allowed beyond pool_size. Uses the SQLAlchemy default if not set."""
+    pool_pre_ping: bool = False
+    """If true, connections are tested for liveness before being used."""
+    pool_recycle: Optional[int] = None
+    """Number of seconds after which a pooled connection is replaced."""
+    sqlite_pragmas: dict[str, str | int] = {}
+    """PRAGMA statements applied to each new SQLite connection,
+    e.g. {journal_mode: WAL, synchronous: NORMAL, busy_timeout: 5000}."""
+    reuse_io_objects: bool = False
+    """If true, readers and writers (with their contexts and CodeState writers)
+    are kept after use and reused by later context managers, so per-request
+    setup only needs to check out a connection."""
+
+    # Indexes for SQL/SQLite format
+    main_table_indexes: Optional[list[IndexConfig]] = None
+    """Indexes created on the main table. If not set, the main table is indexed on
+    EventID (unique), (SubjectID, ProblemID, ServerTimestamp), CodeStateID and EventType.
+    Set to [] to create no indexes."""
+    defer_main_table_indexes: bool = False
+    """If true, main table indexes are not created with the tables, which makes bulk
+    imports faster. Create them after loading the data with SQLWriter.create_indexes."""
+
+    # Config for Parquet format
+    main_table_parquet_dir: str = None
+    """Relative path to the directory holding the main table as a Parquet dataset.
+    CodeStates use the same storage as CSV datasets."""
+    parquet_partition_cols: list[str] = []
+    """Main table columns used to partition the Parquet dataset into
+    subdirectories, e.g. [TermID, AssignmentID, ProblemID]."""
+    parquet_compression: str = "snappy"
+    """Compression codec for Parquet files, e.g. snappy, zstd or none."""
+
+    # Config for reading with DuckDB
+    use_duckdb: bool = False
+    """If true, CSV and SQLite datasets are read through an in-process DuckDB
+    connection, which scans the files directly. Requires duckdb.
+    Writing still uses the dataset's own format, where supported."""
+    duckdb_threads: Optional[int] = None
+    """Number of threads DuckDB uses for queries. Uses all cores if not set."""
+    duckdb_memory_limit: Optional[str] = None
+    """Memory limit for DuckDB queries, e.g. "4GB", beyond which it spills to disk.
+    Uses the DuckDB default if not set."""
+
     @property
     def is_sql_config(self) -> bool:
         return self.sqlalchemy_url is not None
@@ -54,6 +140,10 @@ class PS2DataConfig(BaseModel):
     def is_csv_config(self) -> bool:
         return self.main_table_file is not None
 
+    @property
+    def is_parquet_config(self) -> bool:
+        return self.main_table_parquet_dir is not None
+
     @property
     def codestates_table_path(self) -> str:
         return os.path.join(self.root_path, self.codestates_table_relative_path)
@@ -64,12 +154,19 @@ class PS2DataConfig(BaseModel):
             return os.path.join(self.root_path, self.main_table_file)
         raise ValueError("Main table path is only available for CSV configurations.")
 
+    @property
+    def main_table_parquet_path(self) -> str:
+        if self.is_parquet_config:
+            return os.path.join(self.root_path, self.main_table_parquet_dir)
+        raise ValueError("Main table Parquet path is only available for Parquet configurations.")
+
     @model_validator(mode="after")
     def validate_has_path_or_url(cls, values):
-        if not values.main_table_file and not values.sqlalchemy_url:
-            raise ValueError("Either main_table_file or sqlalchemy_url must be provided.")
-        if values.main_table_file and values.sqlalchemy_url:
-            raise ValueError("Only one of main_table_file or sqlalchemy_url can be provided.")
+        n_backends = sum(1 for value in (values.main_table_file, values.sqlalchemy_url, values.main_table_parquet_dir) if value)
+        if n_backends == 0:
+            raise ValueError("One of main_table_file, sqlalchemy_url or main_table_parquet_dir must be provided.")
+        if n_backends > 1:
+            raise ValueError("Only one of main_table_file, sqlalchemy_url or main_table_parquet_dir can be provided.")
         return values
 
     @property
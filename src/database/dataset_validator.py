@@ -0,0 +1,203 @@
+
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import json
+import os
+from typing import Optional
+
+from pandas import DataFrame
+import yaml
+
+from database.config import PS2DataConfig
+from database.writer.db_writer_factory import IOFactory
+from spec.codestate import BLANK_CODESTATE_ID
+from spec.datatypes import PS2Datatype
+from spec.enums import MainTableColumns as Cols
+from spec.event_validator import DataFrameCheck, ErrorType, EventValidator, ValidationError
+from spec.spec_definition import PS2Versions, ProgSnap2Spec
+
+# Custom enum values (e.g. new EventTypes) are allowed if they start with this prefix
+CUSTOM_ENUM_PREFIX = "X-"
+
+@dataclass
+class ErrorSummary:
+    count: int = 0
+    example_rows: list[int] = field(default_factory=list)
+
+@dataclass
+class DatasetValidationReport:
+    """
+    Errors found in a dataset, aggregated by error, with the first few rows each occurred in.
+    Rows are numbered by position in the main table, starting at 0.
+    """
+    max_examples: int = 5
+    n_rows: int = 0
+    errors: dict[str, ErrorSummary] = field(default_factory=dict)
+    warnings: list[str] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        return len(self.errors) == 0
+
+    def add_check(self, check: DataFrameCheck, start_row: int) -> None:
+        mask, error = check
+        count = int(mask.sum())
+        if count == 0:
+            return
+        summary = self.errors.setdefault(str(error), ErrorSummary())
+        summary.count += count
+        n_examples = self.max_examples - len(summary.example_rows)
+        if n_examples > 0:
+            summary.example_rows.extend(int(row) + start_row for row in mask.nonzero()[0][:n_examples])
+
+    def merge(self, other: "DatasetValidationReport") -> None:
+        """
+        Add the results of a later part of the dataset.
+        """
+        self.n_rows += other.n_rows
+        for message, other_summary in other.errors.items():
+            summary = self.errors.setdefault(message, ErrorSummary())
+            summary.count += other_summary.count
+            n_examples = self.max_examples - len(summary.example_rows)
+            summary.example_rows.extend(other_summary.example_rows[:max(n_examples, 0)])
+        self.warnings.extend(other.warnings)
+
+    def to_dict(self) -> dict:
+        return {
+            "n_rows": self.n_rows,
+            "is_valid": self.is_valid,
+            "errors": {
+                message: {"count": summary.count, "example_rows": summary.example_rows}
+                for message, summary in self.errors.items()
+            },
+            "warnings": self.warnings,
+        }
+
+    def __str__(self):
+        lines = [f"Validated {self.n_rows} rows: {'no errors' if self.is_valid else f'{len(self.errors)} kinds of error'}."]
+        for warning in self.warnings:
+            lines.append(f"Warning: {warning}")
+        for message, summary in sorted(self.errors.items(), key=lambda item: -item[1].count):
+            rows = ", ".join(str(row) for row in summary.example_rows)
+            lines.append(f"{summary.count:>10}  {message} (e.g. rows {rows})")
+        return "\n".join(lines)
+
+
+class DatasetValidator:
+    """
+    Runs vectorized checks over chunks of a main table: everything checked by
+    EventValidator, plus enum membership and (if given) that every CodeStateID exists.
+    """
+
+    def __init__(self, spec: ProgSnap2Spec, codestate_ids: Optional[set[str]] = None, max_examples: int = 5):
+        self.spec = spec
+        self.event_validator = EventValidator(spec)
+        self.codestate_ids = codestate_ids
+        self.max_examples = max_examples
+        enum_values = {enum_type.name: [value.name for value in enum_type.values] for enum_type in spec.enum_types}
+        # EventTypes are already checked by the EventValidator
+        self.enum_columns = {
+            column.name: enum_values[column.name] for column in spec.main_table.columns
+            if column.datatype == PS2Datatype.Enum and column.name != Cols.EventType and column.name in enum_values
+        }
+
+    def validate_chunk(self, chunk: DataFrame, start_row: int) -> DatasetValidationReport:
+        chunk = chunk.reset_index(drop=True)
+        if Cols.CodeStateID in chunk.columns:
+            # Blank CodeStateIDs are stored as empty strings, which are read as missing
+            chunk[Cols.CodeStateID] = chunk[Cols.CodeStateID].fillna(BLANK_CODESTATE_ID)
+
+        report = DatasetValidationReport(max_examples=self.max_examples, n_rows=len(chunk))
+        for check in self.event_validator.check_dataframe(chunk):
+            report.add_check(check, start_row)
+        for check in self._check_enums(chunk):
+            report.add_check(check, start_row)
+        if self.codestate_ids is not None and Cols.CodeStateID in chunk.columns:
+            codestate_ids = chunk[Cols.CodeStateID]
+            missing = ~codestate_ids.isin(self.codestate_ids) & (codestate_ids != BLANK_CODESTATE_ID)
+            report.add_check((missing.to_numpy(), ValidationError(column=Cols.CodeStateID, type=ErrorType.MissingCodeState)), start_row)
+        return report
+
+    def _check_enums(self, chunk: DataFrame) -> list[DataFrameCheck]:
+        checks = []
+        for column, values in self.enum_columns.items():
+            if column not in chunk.columns:
+                continue
+            column_values = chunk[column].astype("string")
+            invalid = column_values.notna() & ~column_values.isin(values) & ~column_values.str.startswith(CUSTOM_ENUM_PREFIX)
+            checks.append((invalid.to_numpy(dtype=bool), ValidationError(column=column, type=ErrorType.InvalidEnumValue)))
+        return checks
+
+
+# Set in each worker process, so the spec and CodeStateIDs are only sent once per worker
+_worker_validator: DatasetValidator = None
+
+def _init_worker(spec: ProgSnap2Spec, codestate_ids: Optional[set[str]], max_examples: int) -> None:
+    global _worker_validator
+    _worker_validator = DatasetValidator(spec, codestate_ids, max_examples)
+
+def _validate_chunk(chunk: DataFrame, start_row: int) -> DatasetValidationReport:
+    return _worker_validator.validate_chunk(chunk, start_row)
+
+def validate_dataset(data_config: PS2DataConfig, spec: ProgSnap2Spec, chunksize: int = 100_000,
+                     processes: int = 1, max_examples: int = 5) -> DatasetValidationReport:
+    """
+    Validate a dataset's main table, streaming it in chunks so it never needs to fit in memory.
+    With processes > 1, chunks are validated in parallel by worker processes.
+    """
+    factory = IOFactory.create_factory(data_config, spec)
+    report = DatasetValidationReport(max_examples=max_examples)
+
+    with factory.create_reader() as reader:
+        codestate_ids = reader.codestate_io.get_stored_codestate_ids()
+        if codestate_ids is None:
+            report.warnings.append("CodeStateIDs were not checked, since the CodeStates can't be listed for this CodeStateRepresentation.")
+        chunks = reader.iter_main_table(chunksize, typed=False)
+
+        if processes <= 1:
+            validator = DatasetValidator(spec, codestate_ids, max_examples)
+            start_row = 0
+            for chunk in chunks:
+                report.merge(validator.validate_chunk(chunk, start_row))
+                start_row += len(chunk)
+            return report
+
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(spec, codestate_ids, max_examples)) as executor:
+            # Results are merged in order, and only a few chunks are in flight to bound memory use
+            pending = deque()
+            start_row = 0
+            for chunk in chunks:
+                pending.append(executor.submit(_validate_chunk, chunk, start_row))
+                start_row += len(chunk)
+                if len(pending) >= processes * 2:
+                    report.merge(pending.popleft().result())
+            while pending:
+                report.merge(pending.popleft().result())
+    return report
+
+def load_spec_for_config(config_path: str) -> ProgSnap2Spec:
+    with open(config_path, "r") as file:
+        data = yaml.safe_load(file)
+    version = (data.get("metadata") or {}).get("Version")
+    if version is None:
+        print("Warning: No PS2 version specified in metadata, using default version.")
+        return PS2Versions.load_default()
+    return PS2Versions.load_from_string(str(version))
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="ps2-validate", description="Validate a ProgSnap2 dataset.")
+    parser.add_argument("config", help="Path to the dataset's PS2DataConfig YAML file.")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Number of rows validated at a time.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    parser.add_argument("--max-examples", type=int, default=5, help="Number of example rows reported for each error.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args(argv)
+
+    spec = load_spec_for_config(args.config)
+    data_config = PS2DataConfig.from_yaml(args.config, spec)
+    report = validate_dataset(data_config, spec, args.chunksize, args.processes, args.max_examples)
+    print(json.dumps(report.to_dict(), indent=2) if args.json else report)
+    return 0 if report.is_valid else 1
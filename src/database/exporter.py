@@ -0,0 +1,205 @@
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from dataclasses import dataclass, field
+import gzip
+import os
+import time
+from typing import Optional, TextIO
+
+from sqlalchemy import MetaData, Table, inspect, select
+
+from database.config import PS2DataConfig
+from database.dataset_validator import load_spec_for_config
+from database.writer.db_writer_factory import SQLIOFactory
+from spec.enums import CoreTables
+from spec.spec_definition import ProgSnap2Spec
+
+def import_zstandard():
+    """
+    Import zstandard, which is only needed to write zstd-compressed CSV files.
+    """
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("Writing zstd-compressed CSV files requires zstandard. Install it with `pip install progsnap2[zstd]`.") from e
+    return zstandard
+
+# File suffix added for each supported compression
+COMPRESSION_SUFFIXES = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+@dataclass
+class TableExportStats:
+    path: str
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class ExportReport:
+    tables: dict[str, TableExportStats] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def total_rows(self) -> int:
+        return sum(stats.rows for stats in self.tables.values())
+
+    def __str__(self):
+        lines = [f"Exported {self.total_rows:,} rows in {self.seconds:.1f}s."]
+        for table_name, stats in self.tables.items():
+            lines.append(f"  {table_name}: {stats.rows:,} rows to {stats.path} in {stats.seconds:.1f}s ({stats.rows_per_second:,.0f} rows/s)")
+        return "\n".join(lines)
+
+
+class CSVExporter:
+    """
+    Exports a SQL dataset to the ProgSnap2 CSV layout: the main table, Metadata.csv,
+    a LinkTables directory and the CodeStates table, at the paths given by a CSV config.
+    Each table is read in chunks with a server-side cursor (where the driver supports one)
+    and written as it is read, so memory use is bounded by the chunk size. Tables are
+    exported in parallel by a pool of threads, each with its own connection.
+    Files are written to a temporary path and moved into place once complete.
+
+    With compression, Metadata.csv and the link tables get the compression's suffix
+    (e.g. Metadata.csv.gz), which the CSV reader looks for. The main table and CodeStates
+    table are written to the config's main_table_file and codestates_table_relative_path
+    unchanged, so these must already have the suffix (e.g. MainTable.csv.gz), and the same
+    config can be used to read the exported dataset. Compressed CodeStates tables can be
+    read, but not appended to by a CodeState writer.
+    """
+
+    _LINK_TABLES_DIR = "LinkTables"
+
+    def __init__(self, source_config: PS2DataConfig, target_config: PS2DataConfig, spec: ProgSnap2Spec,
+                 chunksize: int = 100_000, compression: Optional[str] = None, max_workers: int = 4):
+        if not source_config.is_sql_config:
+            raise ValueError("The source dataset must be a SQL dataset.")
+        if not target_config.is_csv_config:
+            raise ValueError("The target dataset must be a CSV dataset.")
+        if compression is not None and compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unsupported compression: {compression}. Use one of {', '.join(COMPRESSION_SUFFIXES)}.")
+        if compression == "zstd":
+            import_zstandard()
+        suffix = COMPRESSION_SUFFIXES.get(compression)
+        if suffix is not None:
+            configured_paths = {
+                "main_table_file": target_config.main_table_file,
+                "codestates_table_relative_path": target_config.codestates_table_relative_path,
+            }
+            for option, path in configured_paths.items():
+                if not path.endswith(suffix):
+                    raise ValueError(f"With {compression} compression, {option} must end with {suffix} (e.g. {path}{suffix}), so the dataset can be read with the same config.")
+        self.source_config = source_config
+        self.target_config = target_config
+        self.spec = spec
+        self.chunksize = chunksize
+        self.compression = compression
+        self.max_workers = max_workers
+        self.source_factory = SQLIOFactory(spec, source_config)
+
+    def get_table_paths(self) -> dict[str, str]:
+        """
+        Get the path each table in the database is exported to.
+        """
+        root_path = self.target_config.root_path
+        table_manager = self.source_factory.table_manager
+        with self.source_factory.engine.connect() as conn:
+            table_names = set(inspect(conn).get_table_names())
+
+        # Tables with fixed names get the compression's suffix; configured paths already have it
+        suffix = COMPRESSION_SUFFIXES.get(self.compression, "")
+        paths = {}
+        if CoreTables.MainTable in table_names:
+            paths[str(CoreTables.MainTable)] = self.target_config.main_table_path
+        if CoreTables.Metadata in table_names:
+            paths[str(CoreTables.Metadata)] = os.path.join(root_path, f"Metadata.csv{suffix}")
+        for table_name in sorted(table_manager.link_tables):
+            if table_name in table_names:
+                paths[table_name] = os.path.join(root_path, self._LINK_TABLES_DIR, f"{table_name}.csv{suffix}")
+        if table_manager.has_codestates_table() and CoreTables.CodeStates in table_names:
+            paths[str(CoreTables.CodeStates)] = self.target_config.codestates_table_path
+        return paths
+
+    def run(self) -> ExportReport:
+        """
+        Export every table and return a report of the rows exported and the time taken.
+        """
+        report = ExportReport()
+        start = time.perf_counter()
+        table_paths = self.get_table_paths()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(table_paths)))) as executor:
+            futures = {
+                table_name: executor.submit(self._export_table, table_name, path)
+                for table_name, path in table_paths.items()
+            }
+            for table_name, future in futures.items():
+                report.tables[table_name] = future.result()
+        report.seconds = time.perf_counter() - start
+        return report
+
+    def _open(self, path: str) -> TextIO:
+        if self.compression == "gzip":
+            return gzip.open(path, "wt", newline="", encoding="utf-8")
+        if self.compression == "zstd":
+            return import_zstandard().open(path, "wt", newline="", encoding="utf-8")
+        return open(path, "w", newline="", encoding="utf-8")
+
+    def _export_table(self, table_name: str, path: str) -> TableExportStats:
+        stats = TableExportStats(path=path)
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with self.source_factory.engine.connect() as conn:
+                # Reflect the table, so columns that are in the database but not the spec are kept
+                table = Table(table_name, MetaData(), autoload_with=conn)
+                stream = conn.execution_options(stream_results=True, max_row_buffer=self.chunksize)
+                result = stream.execute(select(table))
+                with self._open(temp_path) as file:
+                    writer = csv.writer(file)
+                    writer.writerow(result.keys())
+                    for rows in result.partitions(self.chunksize):
+                        writer.writerows(rows)
+                        stats.rows += len(rows)
+                        stats.seconds = time.perf_counter() - start
+                        print(f"{table_name}: {stats.rows:,} rows ({stats.rows_per_second:,.0f} rows/s)")
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+
+def export_sql_to_csv(source_config: PS2DataConfig, target_config: PS2DataConfig, spec: ProgSnap2Spec,
+                      chunksize: int = 100_000, compression: Optional[str] = None, max_workers: int = 4) -> ExportReport:
+    """
+    Export a SQL dataset to the ProgSnap2 CSV layout (see CSVExporter).
+    """
+    exporter = CSVExporter(source_config, target_config, spec, chunksize, compression, max_workers)
+    return exporter.run()
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="ps2-export", description="Export a SQL ProgSnap2 dataset to CSV files.")
+    parser.add_argument("source", help="Path to the SQL dataset's PS2DataConfig YAML file.")
+    parser.add_argument("target", help="Path to the CSV dataset's PS2DataConfig YAML file.")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Number of rows read and written at a time.")
+    parser.add_argument("--compression", choices=sorted(COMPRESSION_SUFFIXES), help="Compress the CSV files.")
+    parser.add_argument("--threads", type=int, default=4, help="Number of tables exported at once.")
+    args = parser.parse_args(argv)
+
+    spec = load_spec_for_config(args.source)
+    source_config = PS2DataConfig.from_yaml(args.source, spec)
+    target_config = PS2DataConfig.from_yaml(args.target, spec)
+    report = export_sql_to_csv(source_config, target_config, spec, args.chunksize, args.compression, args.threads)
+    print(report)
+    return 0
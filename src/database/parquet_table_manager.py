@@ -0,0 +1,113 @@
+
+import os
+
+from database.config import PS2DataConfig
+from spec.datatypes import PS2Datatype
+from spec.enums import CoreTables
+from spec.spec_definition import ProgSnap2Spec
+from spec.spec_definition import Column as SpecColumn
+
+def import_pyarrow(feature: str = "Parquet datasets"):
+    """
+    Import pyarrow, which is only needed for Parquet datasets and other optional features.
+    """
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.feather
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(f"{feature} require pyarrow. Install it with `pip install progsnap2[parquet]`.") from e
+    return pyarrow
+
+
+class ParquetTableManager:
+    """
+    Defines the Arrow schemas and file locations for a dataset stored as Parquet.
+    The main table is a (possibly partitioned) Parquet dataset directory, while
+    the metadata and link tables are single Parquet files in the root directory.
+    """
+
+    _LINK_TABLES_DIR = "LinkTables"
+
+    def __init__(self, spec: ProgSnap2Spec, db_config: PS2DataConfig):
+        self.pa = import_pyarrow()
+        self.spec = spec
+        self.db_config = db_config
+        self.metadata_values = db_config.metadata
+
+        main_table_fields = []
+        for col in spec.main_table.columns:
+            field = self.define_field(col)
+            # Partition values are stored in directory names, so can't be dictionary encoded
+            if col.name in db_config.parquet_partition_cols and self.pa.types.is_dictionary(field.type):
+                field = field.with_type(field.type.value_type)
+            main_table_fields.append(field)
+        self.main_table_schema = self.pa.schema(main_table_fields)
+        for column in db_config.parquet_partition_cols:
+            if column not in self.main_table_schema.names:
+                raise ValueError(f"Partition column {column} is not a main table column.")
+
+        self.metadata_table_schema = self.pa.schema([
+            self.pa.field("Property", self.pa.string(), nullable=False),
+            # Value has various datatypes, so we'll store all al strings
+            self.pa.field("Value", self.pa.string()),
+        ])
+
+    def map_datatype(self, datatype: PS2Datatype):
+        """
+        Maps ProgSnap2 datatypes to Arrow types.
+        """
+        if datatype == PS2Datatype.Enum:
+            # Enums have few distinct values, so are dictionary encoded (and read as categoricals)
+            return self.pa.dictionary(self.pa.int32(), self.pa.string())
+        # Timestamps are kept as strings, since each may have its own (or no) timezone offset
+        type_map = {
+            str: self.pa.string(),
+            int: self.pa.int64(),
+            float: self.pa.float64(),
+            bool: self.pa.bool_(),
+        }
+        if datatype.python_type not in type_map:
+            raise ValueError(f"Unconvertible datatype: {datatype.python_type}")
+        return type_map[datatype.python_type]
+
+    def define_field(self, column_spec: SpecColumn):
+        # Required columns are validated when events are written, so every field is nullable
+        return self.pa.field(column_spec.name, self.map_datatype(column_spec.datatype))
+
+    @property
+    def main_table_path(self) -> str:
+        return self.db_config.main_table_parquet_path
+
+    @property
+    def metadata_table_path(self) -> str:
+        return os.path.join(self.db_config.root_path, f"{CoreTables.Metadata.value}.parquet")
+
+    @property
+    def link_tables_dir(self) -> str:
+        return os.path.join(self.db_config.root_path, self._LINK_TABLES_DIR)
+
+    def get_link_table_path(self, table_name: str) -> str:
+        return os.path.join(self.link_tables_dir, f"{table_name}.parquet")
+
+    def get_partitioning(self):
+        partition_cols = self.db_config.parquet_partition_cols
+        if len(partition_cols) == 0:
+            return None
+        fields = [self.main_table_schema.field(column) for column in partition_cols]
+        return self.pa.dataset.partitioning(self.pa.schema(fields), flavor="hive")
+
+    def open_main_table(self):
+        """
+        Open the main table as a pyarrow Dataset, which reads files lazily.
+        """
+        if not os.path.exists(self.main_table_path):
+            raise FileNotFoundError(f"No Parquet dataset found at '{self.main_table_path}'.")
+        return self.pa.dataset.dataset(
+            self.main_table_path,
+            schema=self.main_table_schema,
+            format="parquet",
+            partitioning=self.get_partitioning(),
+        )
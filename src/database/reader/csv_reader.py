@@ -1,14 +1,37 @@
+from typing import Iterator, Optional
 
 import pandas as pd
 from pandas import DataFrame
+from database.reader.filters import Filters, apply_filters, get_columns_to_read, normalize_filters
 from database.reader.ps2_reader import PS2Reader
 from spec.codestate import CodeStateEntry
+from spec.datatypes import PS2Datatype
+from spec.enums import MainTableColumns as Cols
 import os
 
+# Pandas dtypes used to read each ProgSnap2 datatype, so pandas does not need to infer them
+_DTYPE_MAP = {
+    # IDs and enums repeat across many rows, so categoricals use much less memory than strings
+    PS2Datatype.ID: "category",
+    PS2Datatype.Enum: "category",
+    PS2Datatype.URL: str,
+    PS2Datatype.RelativePath: str,
+    PS2Datatype.SourceLocation: str,
+    PS2Datatype.String: str,
+    # Nullable types, since most columns are optional
+    PS2Datatype.Integer: "Int64",
+    PS2Datatype.Real: "float64",
+    PS2Datatype.Boolean: "boolean",
+    # Parsed after reading, if enabled
+    PS2Datatype.Timestamp: str,
+}
+
 
 class CSVReader(PS2Reader):
 
     _LINK_TABLES_DIR = "LinkTables"
+    # Tables with fixed names (link tables and metadata) may be compressed, e.g. by the CSV exporter
+    _TABLE_SUFFIXES = (".csv", ".csv.gz", ".csv.zst")
 
     @property
     def data_config(self):
@@ -19,23 +42,85 @@ class CSVReader(PS2Reader):
             raise FileNotFoundError(f"No CSV file found at '{path}'.")
         return pd.read_csv(path)
 
+    def get_main_table_dtypes(self) -> dict[str, any]:
+        """
+        Get the dtypes of the main table columns, based on their datatypes in the spec.
+        Columns that are not in the spec are inferred by pandas.
+        """
+        dtypes = {column.name: _DTYPE_MAP[column.datatype] for column in self.context.ps2_spec.main_table.columns}
+        # Every EventID is unique, so a categorical would only add overhead
+        dtypes[Cols.EventID] = str
+        return dtypes
+
+    def _parse_timestamps(self, main_table: DataFrame) -> DataFrame:
+        if not self.data_config.csv_parse_timestamps:
+            return main_table
+        for column in self.context.ps2_spec.main_table.columns:
+            if column.datatype != PS2Datatype.Timestamp or column.name not in main_table.columns:
+                continue
+            values = main_table[column.name]
+            parsed = pd.to_datetime(values, format="ISO8601", utc=True, errors="coerce")
+            n_invalid = (parsed.isna() & values.notna()).sum()
+            if n_invalid > 0:
+                print(f"Warning: {n_invalid} '{column.name}' values could not be parsed and will be NaT.")
+            main_table[column.name] = parsed
+        return main_table
+
     def get_main_table(self) -> DataFrame:
         path = os.path.join(self.data_config.main_table_path)
-        return self._get_table(path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No CSV file found at '{path}'.")
+        main_table = pd.read_csv(path, dtype=self.get_main_table_dtypes(), engine=self.data_config.csv_engine)
+        return self._parse_timestamps(main_table)
+
+    def iter_main_table(self, chunksize: int, columns: Optional[list[str]] = None, filters: Filters = None, typed: bool = True) -> Iterator[DataFrame]:
+        path = self.data_config.main_table_path
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No CSV file found at '{path}'.")
+        filters = normalize_filters(filters)
+        # CSVs can't be filtered before parsing, but reading only the needed columns
+        # avoids parsing the rest of each row
+        usecols = get_columns_to_read(columns, filters)
+        dtype = self.get_main_table_dtypes() if typed else str
+        with pd.read_csv(path, chunksize=chunksize, usecols=usecols, dtype=dtype) as chunks:
+            for chunk in chunks:
+                if typed:
+                    chunk = self._parse_timestamps(chunk)
+                chunk = apply_filters(chunk, filters)
+                if columns is not None:
+                    chunk = chunk[columns]
+                if len(chunk) > 0:
+                    yield chunk
 
     def add_codestate(self, codestate_id: str, subject_id: str, project_id: str) -> CodeStateEntry:
         pass
 
+    def _find_table_path(self, base_path: str) -> str:
+        """
+        Get the path of the (possibly compressed) CSV file for a table, given its path without a suffix.
+        """
+        for suffix in self._TABLE_SUFFIXES:
+            if os.path.exists(base_path + suffix):
+                return base_path + suffix
+        return base_path + ".csv"
+
+    def get_link_table_path(self, table_name: str) -> str:
+        return self._find_table_path(os.path.join(self.data_config.root_path, self._LINK_TABLES_DIR, table_name))
+
     def get_link_table(self, table_name) -> DataFrame:
-        path = os.path.join(self.data_config.root_path, self._LINK_TABLES_DIR, f"{table_name}.csv")
-        return self._get_table(path)
+        return self._get_table(self.get_link_table_path(table_name))
 
     def get_metadata_table(self) -> DataFrame:
-        path = os.path.join(self.context.data_config.root_path, "Metadata.csv")
+        path = self._find_table_path(os.path.join(self.context.data_config.root_path, "Metadata"))
         return self._get_table(path)
 
     def get_link_table_names(self) -> list[str]:
         path = os.path.join(self.context.data_config.root_path, self._LINK_TABLES_DIR)
         if not os.path.exists(path):
             return []
-        return [f[:-4] for f in os.listdir(path) if f.endswith('.csv')]
\ No newline at end of file
+        table_names = []
+        for file in os.listdir(path):
+            suffix = next((suffix for suffix in self._TABLE_SUFFIXES if file.endswith(suffix)), None)
+            if suffix is not None and file[:-len(suffix)] not in table_names:
+                table_names.append(file[:-len(suffix)])
+        return table_names
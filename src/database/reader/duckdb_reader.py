@@ -0,0 +1,226 @@
+import os
+from typing import Iterator, Optional
+
+from pandas import DataFrame
+from sqlalchemy import make_url
+
+from database.codestate.codestate_writer import CodeStateWriter
+from database.parquet_table_manager import import_pyarrow
+from database.reader.filters import ColumnFilter, FilterOp, Filters, apply_filters, get_columns_to_read, normalize_filters
+from database.reader.ps2_reader import PS2Reader
+from database.sql_context import DuckDBContext
+from spec.codestate import CodeStateEntry
+from spec.datatypes import PS2Datatype
+from spec.enums import CoreTables
+
+def import_duckdb():
+    """
+    Import duckdb, which is only needed for the DuckDB reader.
+    """
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError("Reading datasets with DuckDB requires duckdb. Install it with `pip install progsnap2[duckdb]`.") from e
+    return duckdb
+
+# DuckDB types used to read each ProgSnap2 datatype from CSV files, so types are not inferred
+_DUCKDB_TYPE_MAP = {
+    PS2Datatype.Integer: "BIGINT",
+    PS2Datatype.Real: "DOUBLE",
+    PS2Datatype.Boolean: "BOOLEAN",
+    # Timestamps are kept as strings, since each may have its own (or no) timezone offset
+}
+
+_SQL_OPERATORS = {
+    FilterOp.Equal: "=",
+    FilterOp.GreaterEqual: ">=",
+    FilterOp.Greater: ">",
+    FilterOp.LessEqual: "<=",
+    FilterOp.Less: "<",
+}
+
+def quote_identifier(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+def quote_string(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class DuckDBReader(PS2Reader):
+    """
+    Reads a CSV or SQLite dataset through an in-process DuckDB connection, where the main
+    table, metadata, link tables and CodeStates are attached as views, so queries scan the
+    files directly (in parallel) rather than loading them into pandas first.
+    Use sql and sql_arrow to run queries against the views, e.g.
+    reader.sql('SELECT SubjectID, COUNT(*) FROM MainTable GROUP BY SubjectID').
+    """
+
+    _LINK_TABLES_DIR = "LinkTables"
+    _SQLITE_SCHEMA = "ps2"
+
+    def __init__(self, context: DuckDBContext, codestate_io: CodeStateWriter):
+        super().__init__(context, codestate_io)
+
+    @property
+    def conn(self):
+        return self.context.conn
+
+    @property
+    def data_config(self):
+        return self.context.data_config
+
+    def attach_tables(self) -> None:
+        """
+        Create views of the dataset's tables on the DuckDB connection.
+        """
+        if self.data_config.is_sql_config:
+            self._attach_sqlite_tables()
+        else:
+            self._attach_csv_tables()
+
+    def _attach_sqlite_tables(self) -> None:
+        url = make_url(self.data_config.sqlalchemy_url)
+        if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+            raise ValueError("The DuckDB reader only supports CSV datasets and SQLite database files.")
+        self.conn.execute("INSTALL sqlite")
+        self.conn.execute("LOAD sqlite")
+        self.conn.execute(f"ATTACH {quote_string(url.database)} AS {self._SQLITE_SCHEMA} (TYPE sqlite, READ_ONLY)")
+        table_names = [row[0] for row in self.conn.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_catalog = ?", [self._SQLITE_SCHEMA]
+        ).fetchall()]
+        core_tables = {str(table) for table in CoreTables}
+        for table_name in table_names:
+            self._create_view(table_name, f"SELECT * FROM {self._SQLITE_SCHEMA}.{quote_identifier(table_name)}")
+        self.context.link_table_names = [name for name in table_names if name not in core_tables]
+
+    def _attach_csv_tables(self) -> None:
+        main_table_path = self.data_config.main_table_path
+        if not os.path.exists(main_table_path):
+            raise FileNotFoundError(f"No CSV file found at '{main_table_path}'.")
+        self._create_csv_view(CoreTables.MainTable, main_table_path, self._get_main_table_types(main_table_path))
+        self._create_csv_view(CoreTables.Metadata, os.path.join(self.data_config.root_path, "Metadata.csv"))
+        self._create_csv_view(CoreTables.CodeStates, self.data_config.codestates_table_path)
+
+        link_tables_dir = os.path.join(self.data_config.root_path, self._LINK_TABLES_DIR)
+        link_table_names = []
+        if os.path.exists(link_tables_dir):
+            for file in sorted(os.listdir(link_tables_dir)):
+                if file.endswith(".csv"):
+                    link_table_names.append(file[:-4])
+                    self._create_csv_view(file[:-4], os.path.join(link_tables_dir, file))
+        self.context.link_table_names = link_table_names
+
+    def _get_main_table_types(self, path: str) -> dict[str, str]:
+        """
+        Get the DuckDB types of the main table columns in the file, based on the spec.
+        """
+        # DuckDB reads the header, so compressed (e.g. .csv.gz) files are handled like read_csv
+        header = {row[0] for row in self.conn.execute(
+            f"DESCRIBE SELECT * FROM read_csv({quote_string(path)}, header = true, all_varchar = true)"
+        ).fetchall()}
+        types = {}
+        for column in self.context.ps2_spec.main_table.columns:
+            if column.name in header:
+                types[column.name] = _DUCKDB_TYPE_MAP.get(column.datatype, "VARCHAR")
+        return types
+
+    def _create_csv_view(self, name: str, path: str, types: Optional[dict[str, str]] = None) -> None:
+        if not os.path.exists(path):
+            return
+        options = "header = true"
+        if types:
+            type_list = ", ".join(f"{quote_string(column)}: {quote_string(sql_type)}" for column, sql_type in types.items())
+            options += f", types = {{{type_list}}}"
+        self._create_view(name, f"SELECT * FROM read_csv({quote_string(path)}, {options})")
+
+    def _create_view(self, name: str, query: str) -> None:
+        self.conn.execute(f"CREATE OR REPLACE VIEW {quote_identifier(name)} AS {query}")
+
+    def sql(self, query: str, params: Optional[list] = None) -> DataFrame:
+        """
+        Run a SQL query against the dataset's views and return the result as a DataFrame.
+        """
+        return self.conn.execute(query, params).df()
+
+    def sql_arrow(self, query: str, params: Optional[list] = None):
+        """
+        Run a SQL query against the dataset's views and return the result as a pyarrow Table.
+        """
+        import_pyarrow("Arrow query results")
+        return self.conn.execute(query, params).arrow()
+
+    def _get_table(self, name: str) -> DataFrame:
+        if not self._has_table(name):
+            raise FileNotFoundError(f"No table '{name}' found in the dataset.")
+        return self.sql(f"SELECT * FROM {quote_identifier(name)}")
+
+    def _has_table(self, name: str) -> bool:
+        result = self.conn.execute("SELECT COUNT(*) FROM duckdb_views() WHERE view_name = ?", [str(name)]).fetchone()
+        return result[0] > 0
+
+    def get_main_table(self) -> DataFrame:
+        return self._get_table(CoreTables.MainTable)
+
+    def iter_main_table(self, chunksize: int, columns: Optional[list[str]] = None, filters: Filters = None, typed: bool = True) -> Iterator[DataFrame]:
+        if not self._has_table(CoreTables.MainTable):
+            raise FileNotFoundError(f"No table '{CoreTables.MainTable}' found in the dataset.")
+        pa = import_pyarrow("Chunked DuckDB reads")
+        filters = normalize_filters(filters)
+        pushed_down = [f for f in filters if not f.is_time_filter]
+        remaining = [f for f in filters if f.is_time_filter]
+
+        selected_columns = get_columns_to_read(columns, remaining)
+        if selected_columns is None:
+            selected_columns = [row[0] for row in self.conn.execute(f"DESCRIBE {quote_identifier(CoreTables.MainTable)}").fetchall()]
+        if typed:
+            select_list = ", ".join(quote_identifier(column) for column in selected_columns)
+        else:
+            select_list = ", ".join(f"CAST({quote_identifier(column)} AS VARCHAR) AS {quote_identifier(column)}" for column in selected_columns)
+        query = f"SELECT {select_list} FROM {quote_identifier(CoreTables.MainTable)}"
+        params = []
+        conditions = []
+        for column_filter in pushed_down:
+            condition, filter_params = self._to_sql(column_filter)
+            conditions.append(condition)
+            params.extend(filter_params)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        # Use a separate cursor, so other queries can run while the chunks are consumed
+        cursor = self.conn.cursor()
+        try:
+            batches = cursor.execute(query, params).to_arrow_reader(chunksize)
+            for batch in batches:
+                chunk = apply_filters(pa.Table.from_batches([batch]).to_pandas(), remaining)
+                if columns is not None:
+                    chunk = chunk[columns]
+                if len(chunk) > 0:
+                    yield chunk
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _to_sql(column_filter: ColumnFilter) -> tuple[str, list]:
+        column = quote_identifier(column_filter.column)
+        if column_filter.op == FilterOp.In:
+            values = list(column_filter.value)
+            if len(values) == 0:
+                return "FALSE", []
+            return f"{column} IN ({', '.join('?' for _ in values)})", values
+        if column_filter.op not in _SQL_OPERATORS:
+            raise ValueError(f"Unsupported filter operation: {column_filter.op}")
+        return f"{column} {_SQL_OPERATORS[column_filter.op]} ?", [column_filter.value]
+
+    def add_codestate(self, codestate_id: str, subject_id: str, project_id: str) -> CodeStateEntry:
+        pass
+
+    def get_link_table(self, table_name) -> DataFrame:
+        if table_name not in self.context.link_table_names:
+            raise ValueError(f"Table {table_name} does not exist in the dataset.")
+        return self._get_table(table_name)
+
+    def get_metadata_table(self) -> DataFrame:
+        return self._get_table(CoreTables.Metadata)
+
+    def get_link_table_names(self) -> list[str]:
+        return list(self.context.link_table_names)
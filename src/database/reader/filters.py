@@ -0,0 +1,140 @@
+
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Iterable, Optional, Union
+
+import pandas as pd
+from pandas import DataFrame, Series
+from pandas.api.types import is_datetime64_any_dtype as is_datetime
+from sqlalchemy import ColumnElement, Table
+
+
+class FilterOp(str, Enum):
+    Equal = "=="
+    In = "in"
+    GreaterEqual = ">="
+    Greater = ">"
+    LessEqual = "<="
+    Less = "<"
+
+
+@dataclass(frozen=True)
+class ColumnFilter:
+    """
+    A simple predicate on a single column, which readers can push down to the
+    underlying storage. Comparisons against datetime values are done on parsed
+    timestamps, with naive timestamps treated as UTC.
+    """
+    column: str
+    op: FilterOp
+    value: any
+
+    @classmethod
+    def equals(cls, column: str, value: any) -> "ColumnFilter":
+        """
+        Match rows where the column equals the value, or any of the values if a collection is given.
+        """
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return cls(column, FilterOp.In, tuple(value))
+        return cls(column, FilterOp.Equal, value)
+
+    @classmethod
+    def between(cls, column: str, start: any = None, end: any = None) -> list["ColumnFilter"]:
+        """
+        Match rows where start <= column < end. Either bound can be omitted.
+        """
+        filters = []
+        if start is not None:
+            filters.append(cls(column, FilterOp.GreaterEqual, start))
+        if end is not None:
+            filters.append(cls(column, FilterOp.Less, end))
+        return filters
+
+    @property
+    def is_time_filter(self) -> bool:
+        return isinstance(self.value, datetime)
+
+    def mask(self, df: DataFrame) -> Series:
+        """
+        Get a boolean mask of the rows in the DataFrame that match this filter.
+        """
+        values = df[self.column]
+        value = self.value
+        if self.is_time_filter:
+            values, value = _align_timestamps(values, value)
+
+        if self.op == FilterOp.Equal:
+            return values == value
+        elif self.op == FilterOp.In:
+            return values.isin(value)
+        elif self.op == FilterOp.GreaterEqual:
+            return values >= value
+        elif self.op == FilterOp.Greater:
+            return values > value
+        elif self.op == FilterOp.LessEqual:
+            return values <= value
+        elif self.op == FilterOp.Less:
+            return values < value
+        raise ValueError(f"Unsupported filter operation: {self.op}")
+
+    def can_push_down_to_sql(self) -> bool:
+        # Timestamps are stored as strings with varying offsets, so they can't be compared in SQL
+        return not self.is_time_filter
+
+    def to_sql(self, table: Table) -> ColumnElement:
+        column = table.c[self.column]
+        if self.op == FilterOp.Equal:
+            return column == self.value
+        elif self.op == FilterOp.In:
+            return column.in_(self.value)
+        elif self.op == FilterOp.GreaterEqual:
+            return column >= self.value
+        elif self.op == FilterOp.Greater:
+            return column > self.value
+        elif self.op == FilterOp.LessEqual:
+            return column <= self.value
+        elif self.op == FilterOp.Less:
+            return column < self.value
+        raise ValueError(f"Unsupported filter operation: {self.op}")
+
+
+Filters = Optional[Union[dict[str, any], Iterable[ColumnFilter]]]
+"""Either a list of ColumnFilters, or a dict of column names to values (or collections of values) to match."""
+
+def normalize_filters(filters: Filters) -> list[ColumnFilter]:
+    if filters is None:
+        return []
+    if isinstance(filters, dict):
+        return [ColumnFilter.equals(column, value) for column, value in filters.items()]
+    return list(filters)
+
+def apply_filters(df: DataFrame, filters: list[ColumnFilter]) -> DataFrame:
+    if len(filters) == 0:
+        return df
+    mask = Series(True, index=df.index)
+    for column_filter in filters:
+        mask &= column_filter.mask(df)
+    return df[mask]
+
+def get_columns_to_read(columns: Optional[list[str]], filters: list[ColumnFilter]) -> Optional[list[str]]:
+    """
+    Get the columns needed to return the requested columns and evaluate the filters.
+    """
+    if columns is None:
+        return None
+    needed = list(columns)
+    for column_filter in filters:
+        if column_filter.column not in needed:
+            needed.append(column_filter.column)
+    return needed
+
+def _align_timestamps(values: Series, value: datetime) -> tuple[Series, pd.Timestamp]:
+    value = pd.Timestamp(value)
+    if not is_datetime(values):
+        values = pd.to_datetime(values, format="ISO8601", utc=True, errors="coerce")
+    if values.dt.tz is not None:
+        value = value.tz_localize("UTC") if value.tz is None else value.tz_convert("UTC")
+    elif value.tz is not None:
+        value = value.tz_convert("UTC").tz_localize(None)
+    return values, value
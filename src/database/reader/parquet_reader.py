@@ -0,0 +1,84 @@
+from typing import Iterator, Optional
+import os
+
+import pandas as pd
+from pandas import DataFrame
+
+from database.codestate.codestate_writer import CodeStateWriter
+from database.parquet_table_manager import ParquetTableManager
+from database.reader.filters import ColumnFilter, FilterOp, Filters, apply_filters, get_columns_to_read, normalize_filters
+from database.reader.ps2_reader import PS2Reader
+from database.sql_context import ParquetContext
+from spec.codestate import CodeStateEntry
+
+
+class ParquetReader(PS2Reader):
+
+    def __init__(self, context: ParquetContext, codestate_io: CodeStateWriter):
+        super().__init__(context, codestate_io)
+
+    @property
+    def table_manager(self) -> ParquetTableManager:
+        return self.context.table_manager
+
+    def _get_table(self, path: str) -> DataFrame:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No Parquet file found at '{path}'.")
+        return pd.read_parquet(path)
+
+    def add_codestate(self, codestate_id: str, subject_id: str, project_id: str) -> CodeStateEntry:
+        pass
+
+    def get_main_table(self) -> DataFrame:
+        return self.table_manager.open_main_table().to_table().to_pandas()
+
+    def iter_main_table(self, chunksize: int, columns: Optional[list[str]] = None, filters: Filters = None, typed: bool = True) -> Iterator[DataFrame]:
+        dataset = self.table_manager.open_main_table()
+        filters = normalize_filters(filters)
+        pushed_down = [f for f in filters if not f.is_time_filter]
+        remaining = [f for f in filters if f.is_time_filter]
+
+        # Filters on partition columns skip whole directories, and others use row group statistics
+        expression = None
+        for column_filter in pushed_down:
+            filter_expression = self._to_expression(column_filter)
+            expression = filter_expression if expression is None else expression & filter_expression
+
+        selected_columns = get_columns_to_read(columns, remaining)
+        for batch in dataset.to_batches(columns=selected_columns, filter=expression, batch_size=chunksize):
+            if batch.num_rows == 0:
+                continue
+            chunk = apply_filters(batch.to_pandas(), remaining)
+            if columns is not None:
+                chunk = chunk[columns]
+            if len(chunk) > 0:
+                yield chunk
+
+    def _to_expression(self, column_filter: ColumnFilter):
+        field = self.table_manager.pa.dataset.field(column_filter.column)
+        value = column_filter.value
+        if column_filter.op == FilterOp.Equal:
+            return field == value
+        elif column_filter.op == FilterOp.In:
+            return field.isin(list(value))
+        elif column_filter.op == FilterOp.GreaterEqual:
+            return field >= value
+        elif column_filter.op == FilterOp.Greater:
+            return field > value
+        elif column_filter.op == FilterOp.LessEqual:
+            return field <= value
+        elif column_filter.op == FilterOp.Less:
+            return field < value
+        raise ValueError(f"Unsupported filter operation: {column_filter.op}")
+
+    def get_metadata_table(self) -> DataFrame:
+        return self._get_table(self.table_manager.metadata_table_path)
+
+    def get_link_table(self, table_name) -> DataFrame:
+        return self._get_table(self.table_manager.get_link_table_path(table_name))
+
+    def get_link_table_names(self) -> list[str]:
+        path = self.table_manager.link_tables_dir
+        if not os.path.exists(path):
+            return []
+        return [f[:-len(".parquet")] for f in os.listdir(path) if f.endswith('.parquet')]
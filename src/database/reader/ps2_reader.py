@@ -1,8 +1,12 @@
 from abc import ABC, abstractmethod
+from typing import Iterator, Optional
 
-from pandas import DataFrame
+import pandas as pd
+from pandas import CategoricalDtype, DataFrame
+from pandas.api.types import union_categoricals
 
 from database.codestate.codestate_writer import CodeStateWriter
+from database.reader.filters import Filters
 from database.sql_context import IOContext
 from spec.codestate import CodeStateEntry
 
@@ -16,6 +20,19 @@ class PS2Reader(ABC):
     def get_main_table(self) -> DataFrame:
         pass
 
+    @abstractmethod
+    def iter_main_table(self, chunksize: int, columns: Optional[list[str]] = None, filters: Filters = None, typed: bool = True) -> Iterator[DataFrame]:
+        """
+        Read the main table in chunks of at most chunksize rows, so that the full table never
+        needs to be held in memory. Empty chunks are not yielded.
+        :param columns: If given, only these columns are read and returned.
+        :param filters: Only rows matching all filters are returned. Filters are pushed down
+        to the underlying storage where possible.
+        :param typed: If false, formats without stored types (i.e. CSV) read every value as a
+        string, so that invalid values can be reported instead of failing the read.
+        """
+        pass
+
     @abstractmethod
     def add_codestate(self, codestate_id: str, subject_id: str, project_id: str) -> CodeStateEntry:
         pass
@@ -30,4 +47,20 @@ class PS2Reader(ABC):
 
     @abstractmethod
     def get_link_table_names(self) -> list[str]:
-        pass
\ No newline at end of file
+        pass
+
+
+def concat_chunks(chunks: list[DataFrame]) -> DataFrame:
+    """
+    Concatenate chunks returned by PS2Reader.iter_main_table. Categorical columns are
+    given the union of their categories first, since pandas would otherwise
+    convert them to (much larger) object columns.
+    """
+    if len(chunks) == 0:
+        return DataFrame()
+    for column in chunks[0].columns:
+        if not all(isinstance(chunk[column].dtype, CategoricalDtype) for chunk in chunks):
+            continue
+        categories = union_categoricals([chunk[column] for chunk in chunks], sort_categories=True).categories
+        chunks = [chunk.assign(**{column: chunk[column].cat.set_categories(categories)}) for chunk in chunks]
+    return pd.concat(chunks, ignore_index=True)
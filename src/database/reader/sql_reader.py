@@ -1,10 +1,13 @@
+from typing import Iterator, Optional
+
 from pandas import DataFrame
+from sqlalchemy import Table, select
 from database.codestate.codestate_writer import CodeStateWriter
+from database.reader.filters import Filters, apply_filters, get_columns_to_read, normalize_filters
 from database.reader.ps2_reader import PS2Reader
 from database.sql_context import SQLContext
 
 import pandas as pd
-from pandas import DataFrame
 
 from database.sql_table_manager import SQLTableManager
 from spec.codestate import CodeStateEntry
@@ -19,27 +22,49 @@ class SQLReader(PS2Reader):
     def table_manager(self) -> SQLTableManager:
         return self.context.table_manager
 
-    def _get_table(self, table_name: str) -> DataFrame:
-        pd.read_sql(
-            f"SELECT * FROM {self.table_manager.main_table_name}",
-            self.context.conn,
-        )
+    def _get_table(self, table: Table) -> DataFrame:
+        return pd.read_sql(select(table), self.context.conn)
 
     def add_codestate(self, codestate_id: str, subject_id: str, project_id: str) -> CodeStateEntry:
         # TODO: Now sure how I want to do this yet.
         pass
 
     def get_main_table(self) -> DataFrame:
-        return self._get_table(self.table_manager.main_table_name)
+        return self._get_table(self.table_manager.main_table)
+
+    def iter_main_table(self, chunksize: int, columns: Optional[list[str]] = None, filters: Filters = None, typed: bool = True) -> Iterator[DataFrame]:
+        table = self.table_manager.main_table
+        filters = normalize_filters(filters)
+        pushed_down = [f for f in filters if f.can_push_down_to_sql()]
+        remaining = [f for f in filters if not f.can_push_down_to_sql()]
+
+        selected_columns = get_columns_to_read(columns, remaining)
+        if selected_columns is None:
+            query = select(table)
+        else:
+            query = select(*[table.c[column] for column in selected_columns])
+        for column_filter in pushed_down:
+            query = query.where(column_filter.to_sql(table))
+        # Use a server-side cursor where the driver supports one (e.g. psycopg2), so rows
+        # are fetched as chunks are read, rather than all at once. Set on the statement,
+        # since the connection may be shared.
+        query = query.execution_options(stream_results=True, max_row_buffer=chunksize)
+
+        for chunk in pd.read_sql(query, self.context.conn, chunksize=chunksize):
+            chunk = apply_filters(chunk, remaining)
+            if columns is not None:
+                chunk = chunk[columns]
+            if len(chunk) > 0:
+                yield chunk
 
     def get_metadata_table(self):
-        return self._get_table(self.table_manager.metadata_table_name)
+        return self._get_table(self.table_manager.metadata_table)
 
     def get_link_table(self, table_name):
         if table_name not in self.table_manager.link_tables:
             raise ValueError(f"Table {table_name} does not exist in the database.")
 
-        return self._get_table(table_name)
+        return self._get_table(self.table_manager.link_tables[table_name])
 
     def get_link_table_names(self):
-        return self.table_manager.link_tables.keys()
\ No newline at end of file
+        return self.table_manager.link_tables.keys()
@@ -3,6 +3,7 @@ from dataclasses import dataclass, field
 from sqlalchemy import Connection, MetaData
 
 from database.config import PS2DataConfig
+from database.parquet_table_manager import ParquetTableManager
 from database.sql_table_manager import SQLTableManager
 from spec.event_validator import EventValidator
 from spec.spec_definition import ProgSnap2Spec
@@ -12,12 +13,24 @@ class IOContext:
     data_config: PS2DataConfig
     ps2_spec: ProgSnap2Spec
 
-    event_validator: EventValidator = field(init=False)
+    event_validator: EventValidator = field(default=None, kw_only=True)
+    """Can be shared between contexts, since validation is stateless."""
 
     def __post_init__(self):
-        self.event_validator = EventValidator(self.ps2_spec)
+        if self.event_validator is None:
+            self.event_validator = EventValidator(self.ps2_spec)
 
 @dataclass
 class SQLContext(IOContext):
     conn: Connection
-    table_manager: SQLTableManager
\ No newline at end of file
+    table_manager: SQLTableManager
+
+@dataclass
+class ParquetContext(IOContext):
+    table_manager: ParquetTableManager
+
+@dataclass
+class DuckDBContext(IOContext):
+    conn: any
+    """A DuckDB connection, with the dataset's tables attached as views."""
+    link_table_names: list[str] = field(default_factory=list)
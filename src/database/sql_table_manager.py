@@ -1,11 +1,13 @@
 
-from database.config import PS2DataConfig
+from database.config import IndexConfig, PS2DataConfig
 from spec.enums import CodeStateRepresentation
 from spec.spec_definition import ProgSnap2Spec
 
 from datetime import datetime
+from typing import Optional
 from sqlalchemy import Connection, Index, MetaData, Table, Column as SQLColumn, Integer, String, Float, Enum as SQLEnum, UniqueConstraint, inspect
 from sqlalchemy.dialects.sqlite import DATETIME
+from sqlalchemy.schema import CreateTable
 
 from spec.datatypes import DBStringLength, PS2Datatype
 from spec.spec_definition import ProgSnap2Spec, Property, Requirement, Column as SpecColumn
@@ -16,6 +18,15 @@ from sqlalchemy.dialects.sqlite import DATETIME
 
 
 class SQLTableManager:
+
+    # Indexes for common analytics queries, each created if all its columns are in the spec
+    DEFAULT_MAIN_TABLE_INDEXES = [
+        IndexConfig(columns=[Cols.EventID], unique=True),
+        IndexConfig(columns=[Cols.SubjectID, Cols.ProblemID, Cols.ServerTimestamp]),
+        IndexConfig(columns=[Cols.CodeStateID]),
+        IndexConfig(columns=[Cols.EventType]),
+    ]
+
     def __init__(self, spec: ProgSnap2Spec, db_config: PS2DataConfig):
         self.metadata_values = db_config.metadata
         self.spec = spec
@@ -34,6 +45,15 @@ class SQLTableManager:
         """
         return self.codestates_table is not None
 
+    @property
+    def codestates_cache_namespace(self) -> Optional[str]:
+        """
+        The namespace of this database's CodeStates in a CodeStateIDCache.
+        """
+        if self.codestates_table is None:
+            return None
+        return f"{self.db_config.sqlalchemy_url}#{self.codestates_table.name}"
+
     def have_tables_been_created(self, conn: Connection) -> bool:
         """
         Check if tables have already been created.
@@ -106,7 +126,8 @@ class SQLTableManager:
 
         self.main_table = Table(
             CoreTables.MainTable, metadata,
-            *main_columns
+            *main_columns,
+            *self._define_main_table_indexes(),
         )
 
         id_datatype = self.map_datatype(PS2Datatype.ID)
@@ -144,8 +165,58 @@ class SQLTableManager:
                 *cols_etc
             )
 
-    def create_tables(self, conn: Connection):
-        self._sql_metadata.create_all(conn)
+    def _define_main_table_indexes(self) -> list[Index]:
+        index_configs = self.db_config.main_table_indexes
+        if index_configs is None:
+            column_names = {column.name for column in self.spec.main_table.columns}
+            index_configs = [
+                index_config for index_config in self.DEFAULT_MAIN_TABLE_INDEXES
+                if all(column in column_names for column in index_config.columns)
+            ]
+
+        indexes = []
+        for index_config in index_configs:
+            for column in index_config.columns:
+                if self.spec.main_table.get_column(column) is None:
+                    raise ValueError(f"Index column {column} is not a main table column.")
+            name = index_config.name
+            if name is None:
+                prefix = "ux" if index_config.unique else "ix"
+                name = f"{prefix}_{CoreTables.MainTable}_{'_'.join(str(column) for column in index_config.columns)}"
+            indexes.append(Index(name, *[str(column) for column in index_config.columns], unique=index_config.unique))
+        return indexes
+
+    def create_tables(self, conn: Connection, create_indexes: bool = None):
+        """
+        Create any tables that don't exist yet.
+        :param create_indexes: Whether to create the main table's indexes. Defaults to
+        true unless defer_main_table_indexes is set.
+        """
+        if create_indexes is None:
+            create_indexes = not self.db_config.defer_main_table_indexes
+        if create_indexes:
+            self._sql_metadata.create_all(conn)
+            return
+        for table in self._sql_metadata.sorted_tables:
+            if table is not self.main_table:
+                table.create(conn, checkfirst=True)
+            elif not inspect(conn).has_table(table.name):
+                # Only the CREATE TABLE statement, without the table's indexes
+                conn.execute(CreateTable(table))
+
+    def create_main_table_indexes(self, conn: Connection):
+        """
+        Create any of the main table's indexes that don't exist yet.
+        """
+        for index in self.main_table.indexes:
+            index.create(conn, checkfirst=True)
+
+    def drop_main_table_indexes(self, conn: Connection):
+        """
+        Drop the main table's indexes, e.g. before a bulk import.
+        """
+        for index in self.main_table.indexes:
+            index.drop(conn, checkfirst=True)
 
     def update_tables(self, conn: Connection):
         """
@@ -185,9 +256,11 @@ class SQLTableManager:
                     Please update the database manually."""
                 )
 
-    def update_metadata_values(self, conn: Connection):
+    def update_metadata_values(self, conn: Connection, commit: bool = True):
         """
         Update the metadata values in the database.
+        :param commit: Whether to commit the update, rather than leaving it in the
+        connection's current transaction.
         """
         # Clear existing metadata values
         conn.execute(self.metadata_table.delete())
@@ -200,4 +273,5 @@ class SQLTableManager:
             print(f"Inserting metadata: {property} = {value}")
             conn.execute(self.metadata_table.insert().values(Property=property, Value=value))
 
-        conn.commit()
+        if commit:
+            conn.commit()
@@ -1,13 +1,163 @@
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
+import sqlite3
+
+from sqlalchemy.exc import DisconnectionError, OperationalError
+
+from database.codestate.codestate_writer import CodeStateEntry, CodeStateWriter, ContextualCodeStateEntry
+from database.sql_context import IOContext
+from spec.codestate import BLANK_CODESTATE_ID
+from spec.datatypes import get_current_timestamp
+from spec.enums import MainTableColumns as Cols
+
+EventList = list[dict[str, any]]
+CodeStatesMap = dict[str, CodeStateEntry]
 
 @dataclass
 class LogResult:
     success: bool
     warnings: list[str] = field(default_factory=list)
     errors: list[str] = field(default_factory=list)
+    # True if the write failed because the database was unavailable, rather than
+    # because of the data, so it may succeed if retried later
+    retryable: bool = False
+
+# SQLite reports these as OperationalErrors, along with errors caused by the data (e.g. unknown columns)
+_TRANSIENT_SQLITE_ERRORS = ("locked", "busy", "disk i/o error", "unable to open database")
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Whether a database error is likely caused by the database being unavailable
+    (e.g. locked or restarting), rather than by the data being written.
+    """
+    if isinstance(error, DisconnectionError) or getattr(error, "connection_invalidated", False):
+        return True
+    if not isinstance(error, OperationalError):
+        return False
+    if isinstance(error.orig, sqlite3.OperationalError):
+        message = str(error.orig).lower()
+        return any(text in message for text in _TRANSIENT_SQLITE_ERRORS)
+    return True
 
 
 class DBWriter(ABC):
-    pass
\ No newline at end of file
+    """
+    Base class for writers, which validate events, store their CodeStates and
+    then insert the events. Subclasses implement the storage-specific steps.
+    """
+
+    def __init__(self, context: IOContext, codestate_writer: CodeStateWriter):
+        self.context = context
+        self.codestate_writer: CodeStateWriter = codestate_writer
+
+    @staticmethod
+    def add_server_timestamps(events: EventList) -> None:
+        for event in events:
+            if Cols.ServerTimestamp not in event:
+                event[Cols.ServerTimestamp] = get_current_timestamp()
+
+    def add_events_with_codestates(self, events: EventList, codestates: CodeStatesMap) -> LogResult:
+        result = LogResult(True)
+
+        for errors in self.context.event_validator.validate_batch(events).values():
+            result.warnings.extend([str(warning) for warning in errors])
+
+        # Must come before optimizing!
+        self._contextualize_codestates(events, codestates, result)
+
+        # CodeStates are written in the same transaction as the events
+        try:
+            # TODO: I wonder if we should pass the result to append warnings
+            if self.context.data_config.optimize_codestate_ids:
+                self._optimize_codestate_ids(events, codestates, result)
+            else:
+                self.codestate_writer.add_codestates_bulk(codestates)
+        except Exception as e:
+            self._rollback()
+            result.success = False
+            result.retryable = is_transient_error(e)
+            result.errors.append(f"Error adding CodeStates: {e}")
+            return result
+
+        self._insert_events(events, result)
+
+        if result.success:
+            try:
+                self._commit()
+            except Exception as e:
+                self._rollback()
+                result.success = False
+                result.retryable = is_transient_error(e)
+                result.errors.append(f"Error committing events: {e}")
+
+        return result
+
+    @abstractmethod
+    def _insert_events(self, events: EventList, result: LogResult) -> None:
+        """
+        Insert the events as part of the current transaction. On failure, this should
+        roll back, set result.success to False and add errors to the result.
+        """
+        pass
+
+    @abstractmethod
+    def _commit(self) -> None:
+        pass
+
+    @abstractmethod
+    def _rollback(self) -> None:
+        pass
+
+    @abstractmethod
+    def initialize_database(self, force=False) -> None:
+        pass
+
+    def _contextualize_codestates(self, events: EventList, codestates: CodeStatesMap, result: LogResult) -> None:
+
+        # Figure out which project_id and subject_id to use for each codestate
+        # Usually this will be the same for all events, but in theory multiple projects' events
+        # could be sent in one batch.
+        project_id_map = {}
+        subject_id_map = {}
+        for event in events:
+            if not Cols.CodeStateID in event:
+                continue
+            codestate_id = event[Cols.CodeStateID]
+            if Cols.ProjectID in event:
+                if codestate_id in project_id_map and project_id_map[codestate_id] != event[Cols.ProjectID]:
+                    result.warnings.append(f"CodeStateID {codestate_id} matches multiple ProjectIDs! {project_id_map[codestate_id]} vs {event[Cols.ProjectID]}")
+                project_id_map[codestate_id] = event[Cols.ProjectID]
+            if Cols.SubjectID in event:
+                if codestate_id in subject_id_map and subject_id_map[codestate_id] != event[Cols.SubjectID]:
+                    result.warnings.append(f"CodeStateID {codestate_id} matches multiple SubjectIDs! {subject_id_map[codestate_id]} vs {event[Cols.SubjectID]}")
+                subject_id_map[codestate_id] = event[Cols.SubjectID]
+
+        # Add the needed information to codestates
+        for id, codestate in codestates.items():
+            if not isinstance(codestate, ContextualCodeStateEntry):
+                project_id = project_id_map.get(id)
+                subject_id = subject_id_map.get(id)
+                if self.codestate_writer.requires_project_id() and project_id is None:
+                    result.warnings.append(f"CodeState format requires a ProjectID but none provided for CodeStateID {id}. Using default.")
+                    project_id = self.codestate_writer.get_default_project_id()
+                codestate = ContextualCodeStateEntry.from_codestate_entry(codestate, subject_id, project_id)
+                codestates[id] = codestate
+
+    def _optimize_codestate_ids(self, events: EventList, codestates: CodeStatesMap, result: LogResult) -> None:
+        temp_codestate_id_map = {}
+        non_blank_codestates = {}
+        for temp_id, codestate in codestates.items():
+            if codestate.is_blank:
+                temp_codestate_id_map[temp_id] = BLANK_CODESTATE_ID
+            else:
+                non_blank_codestates[temp_id] = codestate
+        temp_codestate_id_map.update(self.codestate_writer.add_codestates_and_get_ids(non_blank_codestates))
+
+        for event in events:
+            if Cols.CodeStateID in event:
+                if event[Cols.CodeStateID] not in temp_codestate_id_map:
+                    result.warnings.append(f"CodeStateID {event[Cols.CodeStateID]} not found in temp_codestate_id_map.")
+                    continue
+
+                event[Cols.CodeStateID] = temp_codestate_id_map[event[Cols.CodeStateID]]
@@ -1,18 +1,26 @@
 
 from abc import ABC, abstractmethod
 import os
+import threading
+from database.codestate.codestate_id_cache import shared_codestate_id_cache
 from database.codestate.git_codestate_writer import GitCodeStateWriter
 from database.codestate.directory_codestate_writer import DirectoryCodeStateWriter
 from database.codestate.table_codestate_writer import CSVTableCodeStateWriter, SQLTableCodeStateWriter
 
-from sqlalchemy import Connection, create_engine
+from sqlalchemy import Connection, create_engine, event
+from sqlalchemy.pool import NullPool
 from database.config import PS2DataConfig
+from database.parquet_table_manager import ParquetTableManager
 from database.reader.csv_reader import CSVReader
+from database.reader.duckdb_reader import DuckDBReader, import_duckdb
+from database.reader.parquet_reader import ParquetReader
 from database.reader.sql_reader import SQLReader
-from database.sql_context import IOContext
+from database.sql_context import DuckDBContext, IOContext, ParquetContext
 from database.sql_table_manager import SQLTableManager
+from database.writer.parquet_writer import ParquetWriter
 from database.writer.sql_writer import SQLContext, SQLWriter
 from spec.enums import CodeStateRepresentation
+from spec.event_validator import EventValidator
 from spec.spec_definition import PS2Versions, ProgSnap2Spec
 
 # TODO: Rename this file
@@ -21,6 +29,8 @@ class IOFactory(ABC):
     def __init__(self, ps2_spec: ProgSnap2Spec, db_config: PS2DataConfig):
         self.ps2_spec = ps2_spec
         self.db_config = db_config
+        # Shared by all contexts created by this factory
+        self.event_validator = EventValidator(ps2_spec)
 
     @abstractmethod
     def create_writer(self):
@@ -30,20 +40,24 @@ class IOFactory(ABC):
     def create_reader(self):
         pass
 
-    def _create_codestate_writer(self, db_config: PS2DataConfig, context: SQLContext):
+    def _create_codestate_writer(self, db_config: PS2DataConfig, context: SQLContext, read_only: bool = False):
         # TODO: These aren't actually the same enum right now... so need to str convert
         code_state_representation = str(self.db_config.metadata.CodeStateRepresentation)
         if code_state_representation == CodeStateRepresentation.Table:
-            if db_config.is_csv_config:
-                return CSVTableCodeStateWriter(db_config)
+            if db_config.is_sql_config:
+                codestate_writer = SQLTableCodeStateWriter(context)
             else:
-                return SQLTableCodeStateWriter(context)
+                # CSV and Parquet datasets both store CodeStates in a CSV file
+                codestate_writer = CSVTableCodeStateWriter(db_config, read_only)
         elif code_state_representation == CodeStateRepresentation.Directory:
-            raise DirectoryCodeStateWriter(db_config.codestates_dir)
+            codestate_writer = DirectoryCodeStateWriter(db_config.codestates_dir)
         elif code_state_representation == CodeStateRepresentation.Git:
-            raise GitCodeStateWriter(db_config.codestates_dir)
+            codestate_writer = GitCodeStateWriter(db_config.codestates_dir)
         else:
             raise ValueError(f"Invalid code state representation: {code_state_representation}")
+        if db_config.share_codestate_id_cache:
+            codestate_writer.id_cache = shared_codestate_id_cache
+        return codestate_writer
 
     @classmethod
     def create_factory(cls, db_config: PS2DataConfig, ps2_spec = None) -> "IOFactory":
@@ -54,19 +68,49 @@ class IOFactory(ABC):
                 print("Warning: No PS2 version specified in metadata, using default version.")
             else:
                 ps2_spec = PS2Versions.load_from_string(version)
+        if db_config.use_duckdb:
+            return DuckDBIOFactory(ps2_spec, db_config)
         if db_config.is_sql_config:
             return SQLIOFactory(ps2_spec, db_config)
         elif db_config.is_csv_config:
             return CSVIOFactory(ps2_spec, db_config)
+        elif db_config.is_parquet_config:
+            return ParquetIOFactory(ps2_spec, db_config)
         raise ValueError(f"Unsupported database configuration type")
 
 
 class SQLIOFactory(IOFactory):
     def __init__(self, ps2_spec: ProgSnap2Spec, db_config: PS2DataConfig):
         super().__init__(ps2_spec, db_config)
-        self.engine = create_engine(db_config.sqlalchemy_url, echo=db_config.echo)
+        self.engine = create_engine(db_config.sqlalchemy_url, echo=db_config.echo, **self._get_engine_options())
+        if self.engine.dialect.name == "sqlite" and db_config.sqlite_pragmas:
+            event.listen(self.engine, "connect", self._apply_sqlite_pragmas)
         self.table_manager = SQLTableManager(ps2_spec, db_config)
 
+        # Idle readers (True) and writers (False) available for reuse
+        self._idle_io = {True: [], False: []}
+        self._idle_io_lock = threading.Lock()
+
+    def _get_engine_options(self) -> dict:
+        config = self.db_config
+        if not config.use_connection_pool:
+            return {"poolclass": NullPool}
+        options = {"pool_pre_ping": config.pool_pre_ping}
+        # Only override SQLAlchemy's defaults when set, since not all pools accept every option
+        if config.pool_size is not None:
+            options["pool_size"] = config.pool_size
+        if config.max_overflow is not None:
+            options["max_overflow"] = config.max_overflow
+        if config.pool_recycle is not None:
+            options["pool_recycle"] = config.pool_recycle
+        return options
+
+    def _apply_sqlite_pragmas(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in self.db_config.sqlite_pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
     def create_writer(self) -> "SQLIOContextManager":
         # Create the root directory if it doesn't exist
         os.makedirs(self.db_config.root_path, exist_ok=True)
@@ -75,30 +119,65 @@ class SQLIOFactory(IOFactory):
     def create_reader(self):
         return SQLIOContextManager(self, True)
 
+    def _create_io(self, reader: bool, conn: Connection) -> SQLReader | SQLWriter:
+        context = SQLContext(
+            conn=conn,
+            table_manager=self.table_manager,
+            data_config=self.db_config,
+            ps2_spec=self.ps2_spec,
+            event_validator=self.event_validator,
+        )
+        codestate_io = self._create_codestate_writer(self.db_config, context, reader)
+        if reader:
+            return SQLReader(context, codestate_io)
+        else:
+            return SQLWriter(context, codestate_io)
+
+    def _acquire_io(self, reader: bool, conn: Connection) -> SQLReader | SQLWriter:
+        """
+        Get a reader or writer bound to the given connection, reusing an idle one if enabled.
+        """
+        if self.db_config.reuse_io_objects:
+            with self._idle_io_lock:
+                idle = self._idle_io[reader]
+                io = idle.pop() if idle else None
+            if io is not None:
+                io.context.conn = conn
+                return io
+        return self._create_io(reader, conn)
+
+    def _release_io(self, reader: bool, io: SQLReader | SQLWriter, failed: bool = False) -> None:
+        """
+        Return a reader or writer to the idle pool, if enabled. Objects used by a failed
+        request are discarded, since they may be left in an inconsistent state.
+        """
+        if not self.db_config.reuse_io_objects or failed:
+            return
+        # Drop any CodeStates left pending by this request's transaction
+        codestate_io = io.codestate_io if reader else io.codestate_writer
+        codestate_io.on_rollback()
+        io.context.conn = None
+        with self._idle_io_lock:
+            self._idle_io[reader].append(io)
+
 # Use a context manager to handle the connection lifecycle
 class SQLIOContextManager:
     def __init__(self, factory: SQLIOFactory, reader: bool):
         self.factory = factory
         self.conn = None
+        self.io = None
         self.reader = reader
 
     def __enter__(self):
         self.conn = self.factory.engine.connect()
-        context = SQLContext(
-            conn=self.conn,
-            table_manager=self.factory.table_manager,
-            data_config=self.factory.db_config,
-            ps2_spec=self.factory.ps2_spec
-        )
-        codestate_io = self.factory._create_codestate_writer(self.factory.db_config, context)
-        if self.reader:
-            return SQLReader(context, codestate_io)
-        else:
-            return SQLWriter(context, codestate_io)
+        self.io = self.factory._acquire_io(self.reader, self.conn)
+        return self.io
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.conn:
             self.conn.close()
+        if self.io:
+            self.factory._release_io(self.reader, self.io, failed=exc_type is not None)
 
 class CSVIOFactory(IOFactory):
     def __init__(self, ps2_spec: ProgSnap2Spec, db_config: PS2DataConfig):
@@ -114,15 +193,124 @@ class CSVIOContextManager:
 
     def __init__(self, factory: CSVIOFactory):
         self.factory = factory
+        self.reader = None
 
     def __enter__(self):
         context = IOContext(
             data_config=self.factory.db_config,
-            ps2_spec=self.factory.ps2_spec
+            ps2_spec=self.factory.ps2_spec,
+            event_validator=self.factory.event_validator,
+        )
+        codestate_io = self.factory._create_codestate_writer(self.factory.db_config, None, read_only=True)
+        self.reader = CSVReader(context, codestate_io)
+        return self.reader
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.reader is not None:
+            self.reader.codestate_io.close()
+
+class ParquetIOFactory(IOFactory):
+    def __init__(self, ps2_spec: ProgSnap2Spec, db_config: PS2DataConfig):
+        super().__init__(ps2_spec, db_config)
+        self.table_manager = ParquetTableManager(ps2_spec, db_config)
+
+    def create_writer(self) -> "ParquetIOContextManager":
+        os.makedirs(self.db_config.root_path, exist_ok=True)
+        return ParquetIOContextManager(self, False)
+
+    def create_reader(self) -> "ParquetIOContextManager":
+        return ParquetIOContextManager(self, True)
+
+class ParquetIOContextManager:
+
+    def __init__(self, factory: ParquetIOFactory, reader: bool):
+        self.factory = factory
+        self.reader = reader
+        self.codestate_io = None
+
+    def __enter__(self):
+        context = ParquetContext(
+            data_config=self.factory.db_config,
+            ps2_spec=self.factory.ps2_spec,
+            event_validator=self.factory.event_validator,
+            table_manager=self.factory.table_manager,
+        )
+        self.codestate_io = self.factory._create_codestate_writer(self.factory.db_config, context, self.reader)
+        if self.reader:
+            return ParquetReader(context, self.codestate_io)
+        return ParquetWriter(context, self.codestate_io)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.codestate_io is not None:
+            self.codestate_io.close()
+
+class DuckDBIOFactory(IOFactory):
+    """
+    Reads CSV or SQLite datasets with DuckDB. Writers are created by the factory
+    for the dataset's own format.
+    """
+
+    def __init__(self, ps2_spec: ProgSnap2Spec, db_config: PS2DataConfig):
+        super().__init__(ps2_spec, db_config)
+        self.duckdb = import_duckdb()
+        if db_config.is_sql_config:
+            self.storage_factory = SQLIOFactory(ps2_spec, db_config)
+        elif db_config.is_csv_config:
+            self.storage_factory = CSVIOFactory(ps2_spec, db_config)
+        else:
+            raise ValueError("The DuckDB reader only supports CSV and SQLite datasets.")
+
+    def create_writer(self):
+        return self.storage_factory.create_writer()
+
+    def create_reader(self) -> "DuckDBIOContextManager":
+        return DuckDBIOContextManager(self)
+
+    def _connect(self):
+        config = {}
+        if self.db_config.duckdb_threads is not None:
+            config["threads"] = self.db_config.duckdb_threads
+        if self.db_config.duckdb_memory_limit is not None:
+            config["memory_limit"] = self.db_config.duckdb_memory_limit
+        return self.duckdb.connect(":memory:", config=config)
+
+class DuckDBIOContextManager:
+
+    def __init__(self, factory: DuckDBIOFactory):
+        self.factory = factory
+        self.conn = None
+        self.sql_conn = None
+        self.codestate_io = None
+
+    def __enter__(self) -> DuckDBReader:
+        self.conn = self.factory._connect()
+        context = DuckDBContext(
+            data_config=self.factory.db_config,
+            ps2_spec=self.factory.ps2_spec,
+            event_validator=self.factory.event_validator,
+            conn=self.conn,
         )
-        codestate_io = self.factory._create_codestate_writer(self.factory.db_config, None)
-        return CSVReader(context, codestate_io)
+        storage_factory = self.factory.storage_factory
+        codestate_context = None
+        if isinstance(storage_factory, SQLIOFactory):
+            # CodeStates stored in SQL are managed through SQLAlchemy, as with the SQLReader
+            self.sql_conn = storage_factory.engine.connect()
+            codestate_context = SQLContext(
+                conn=self.sql_conn,
+                table_manager=storage_factory.table_manager,
+                data_config=self.factory.db_config,
+                ps2_spec=self.factory.ps2_spec,
+                event_validator=self.factory.event_validator,
+            )
+        self.codestate_io = self.factory._create_codestate_writer(self.factory.db_config, codestate_context, read_only=True)
+        reader = DuckDBReader(context, self.codestate_io)
+        reader.attach_tables()
+        return reader
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        # No explicit cleanup needed for CSVReader
-        pass
\ No newline at end of file
+        if self.codestate_io is not None:
+            self.codestate_io.close()
+        if self.sql_conn is not None:
+            self.sql_conn.close()
+        if self.conn is not None:
+            self.conn.close()
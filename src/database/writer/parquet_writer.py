@@ -0,0 +1,102 @@
+import os
+import uuid
+
+from database.codestate.codestate_writer import CodeStateWriter
+from database.parquet_table_manager import ParquetTableManager
+from database.sql_context import ParquetContext
+from database.writer.db_writer import DBWriter, EventList, LogResult
+from spec.enums import MainTableColumns as Cols
+
+
+class ParquetWriter(DBWriter):
+    """
+    Writes events to a Parquet dataset. Each successful call to add_events_with_codestates
+    writes one new file (per partition), so callers should write events in batches
+    (e.g. using the API's write-behind queue) rather than one at a time.
+    """
+
+    def __init__(self, context: ParquetContext, codestate_writer: CodeStateWriter):
+        super().__init__(context, codestate_writer)
+        self._pending_tables = []
+
+    @property
+    def table_manager(self) -> ParquetTableManager:
+        return self.context.table_manager
+
+    def _insert_events(self, events: EventList, result: LogResult) -> None:
+        """
+        Convert the events to an Arrow table, which is written on commit.
+        """
+        schema = self.table_manager.main_table_schema
+        for index, event in enumerate(events):
+            unknown_columns = [column for column in event if column not in schema.names]
+            if unknown_columns:
+                result.errors.append(f"Error inserting event {index} (EventID={event.get(Cols.EventID)}): unknown columns {unknown_columns}")
+        if len(result.errors) > 0:
+            self._rollback()
+            result.success = False
+            return
+
+        try:
+            self._pending_tables.append(self.table_manager.pa.Table.from_pylist(events, schema=schema))
+        except Exception as e:
+            self._rollback()
+            result.success = False
+            self._attribute_insert_errors(events, result, e)
+
+    def _attribute_insert_errors(self, events: EventList, result: LogResult, batch_error: Exception) -> None:
+        """
+        Convert each event on its own, so errors can be attributed to the event that caused them.
+        """
+        schema = self.table_manager.main_table_schema
+        n_errors = len(result.errors)
+        for index, event in enumerate(events):
+            try:
+                self.table_manager.pa.Table.from_pylist([event], schema=schema)
+            except Exception as e:
+                event_id = event.get(Cols.EventID)
+                result.errors.append(f"Error inserting event {index} (EventID={event_id}): {e}")
+
+        if len(result.errors) == n_errors:
+            result.errors.append(f"Error inserting events: {batch_error}")
+
+    def _commit(self) -> None:
+        if len(self._pending_tables) > 0:
+            table = self.table_manager.pa.concat_tables(self._pending_tables)
+            self._pending_tables = []
+            self._write_main_table(table)
+        self.codestate_writer.on_commit()
+
+    def _rollback(self) -> None:
+        self._pending_tables = []
+        self.codestate_writer.on_rollback()
+
+    def _write_main_table(self, table) -> None:
+        pa = self.table_manager.pa
+        # Unique names, so concurrent writers never overwrite each other's files
+        basename_template = f"part-{uuid.uuid4().hex}-{{i}}.parquet"
+        pa.dataset.write_dataset(
+            table,
+            self.table_manager.main_table_path,
+            format="parquet",
+            partitioning=self.table_manager.get_partitioning(),
+            basename_template=basename_template,
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=pa.dataset.ParquetFileFormat().make_write_options(
+                compression=self.context.data_config.parquet_compression,
+            ),
+        )
+
+    def initialize_database(self, force=False) -> None:
+        # The dataset may have been deleted or recreated since IDs were cached
+        self.codestate_writer.forget_codestate_ids()
+        os.makedirs(self.table_manager.main_table_path, exist_ok=True)
+        if not force and os.path.exists(self.table_manager.metadata_table_path):
+            return
+        pa = self.table_manager.pa
+        metadata_dict = self.table_manager.metadata_values.model_dump()
+        metadata_table = pa.Table.from_pylist(
+            [{"Property": property, "Value": None if value is None else str(value)} for property, value in metadata_dict.items()],
+            schema=self.table_manager.metadata_table_schema,
+        )
+        pa.parquet.write_table(metadata_table, self.table_manager.metadata_table_path)
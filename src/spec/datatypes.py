@@ -1,4 +1,7 @@
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import re
 from typing import Optional
 from enum import Enum
 
@@ -21,30 +24,64 @@ def get_current_timestamp(time = None) -> str:
         time = datetime.now()
     return time.astimezone().strftime(DEFAULT_TIMESTAMP_FORMAT)
 
+TIMEZONE_OFFSET_PATTERN = r"(?:Z|[+-]\d{2}:?\d{2})"
+"""Matches the timezone offsets accepted by TIMEZONE_FORMAT, e.g. Z, +05:00 or -0500."""
+
+LOCAL_TIMESTAMP_PATTERN = r"\d{4}-\d{1,2}-\d{1,2}T\d{1,2}:\d{1,2}:\d{1,2}(?:\.\d{1,6})?"
+"""Matches the timestamps accepted by parse_timestamp, without their timezone offset."""
+
+# Equivalent to TIMESTAMP_FORMATS, matched in a single pass
+_TIMESTAMP_REGEX = re.compile(
+    r"(\d{4})-(\d{1,2})-(\d{1,2})T(\d{1,2}):(\d{1,2}):(\d{1,2})"
+    r"(?:\.(\d{1,6}))?"
+    r"(" + TIMEZONE_OFFSET_PATTERN + r")?"
+)
+
+@dataclass(frozen=True)
+class ParsedTimestamp:
+    value: datetime
+    has_timezone: bool
+    has_fraction: bool
+
+@lru_cache(maxsize=100_000)
+def parse_timestamp_details(timestamp: str) -> ParsedTimestamp:
+    """
+    Parse a timestamp string in one pass, also returning which optional parts it has.
+    Throws an exception if the format is not valid. Results are cached, since
+    the same timestamps are often checked repeatedly (e.g. by validation and then parsing).
+    """
+    match = _TIMESTAMP_REGEX.fullmatch(timestamp)
+    if match is None:
+        raise ValueError(f"Invalid timestamp format: {timestamp}. \
+                     Expected base format {BASE_TIMESTAMP_FORMAT} with optional fractional seconds and/or timezone.")
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    microsecond = int(fraction.ljust(6, "0")) if fraction else 0
+    tzinfo = _get_timezone(offset) if offset else None
+    # Throws a ValueError for out of range values, like strptime
+    value = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond, tzinfo=tzinfo)
+    return ParsedTimestamp(value=value, has_timezone=offset is not None, has_fraction=fraction is not None)
+
+@lru_cache(maxsize=None)
+def _get_timezone(offset: str) -> timezone:
+    if offset == "Z":
+        return timezone.utc
+    sign = -1 if offset[0] == "-" else 1
+    return timezone(sign * timedelta(hours=int(offset[1:3]), minutes=int(offset[-2:])))
+
 def parse_timestamp(timestamp: str) -> datetime:
     """
     Parse a timestamp string. Throws an exception if the format is not valid.
     """
-    for format in TIMESTAMP_FORMATS:
-        try:
-            return datetime.strptime(timestamp, format)
-        except ValueError:
-            continue
-    raise ValueError(f"Invalid timestamp format: {timestamp}. \
-                     Expected base format {BASE_TIMESTAMP_FORMAT} with optional fractional seconds and/or timezone.")
+    return parse_timestamp_details(timestamp).value
 
 def timestamp_has_timezone(timestamp: str) -> bool:
     """
     Check if a timestamp string has a timezone.
     """
-    timestamp_formats = [fomat for fomat in TIMESTAMP_FORMATS if TIMEZONE_FORMAT in fomat]
-    for format in timestamp_formats:
-        try:
-            datetime.strptime(timestamp, format)
-            return True
-        except ValueError:
-            continue
-    return False
+    try:
+        return parse_timestamp_details(timestamp).has_timezone
+    except ValueError:
+        return False
 
 def is_valid_timezone_offset(timezone: str) -> bool:
     """
@@ -1,9 +1,16 @@
 
 from dataclasses import dataclass
 from enum import Enum
-from spec.datatypes import timestamp_has_timezone
+from typing import Callable, Union
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from pandas.api.types import is_bool_dtype, is_integer_dtype, is_numeric_dtype
+
+from spec.datatypes import LOCAL_TIMESTAMP_PATTERN, PS2Datatype, TIMEZONE_OFFSET_PATTERN, parse_timestamp_details
 from api.events import MainTableEventBase
-from spec.spec_definition import ProgSnap2Spec, Requirement
+from spec.spec_definition import Column, ProgSnap2Spec, Requirement
 from spec.enums import MainTableColumns as Cols
 
 class ErrorType(Enum):
@@ -11,6 +18,8 @@ class ErrorType(Enum):
     UnexpectedColumn = "UnexpectedColumn"
     InvalidEventType = "InvalidEventType"
     InvalidValueForDatatype = "InvalidValueForDatatype"
+    InvalidEnumValue = "InvalidEnumValue"
+    MissingCodeState = "MissingCodeState"
 
 @dataclass
 class ValidationError:
@@ -26,68 +35,240 @@ class ValidationError:
             return f"Invalid event type: {self.column}"
         elif self.type == ErrorType.InvalidValueForDatatype:
             return f"Invalid value for datatype: {self.column}"
+        elif self.type == ErrorType.InvalidEnumValue:
+            return f"Invalid enum value: {self.column}"
+        elif self.type == ErrorType.MissingCodeState:
+            return f"CodeStateID not found in CodeStates: {self.column}"
         else:
             return f"Unknown error: {self.column}"
 
+@dataclass(frozen=True)
+class ValidationPlan:
+    """
+    The columns an event of one EventType must and may have.
+    """
+    required_columns: tuple[str, ...]
+    """In spec order, so errors are reported in a consistent order."""
+    required_column_set: frozenset[str]
+    allowed_columns: frozenset[str]
+
+    @classmethod
+    def create(cls, required_columns: list[str], optional_columns: list[str]) -> "ValidationPlan":
+        return cls(
+            required_columns=tuple(required_columns),
+            required_column_set=frozenset(required_columns),
+            allowed_columns=frozenset(required_columns + optional_columns),
+        )
+
+DataFrameCheck = tuple[np.ndarray, ValidationError]
+"""A boolean mask of the rows in a DataFrame with an error."""
+
+BatchErrors = dict[int, list[ValidationError]]
+"""Validation errors for each invalid row, keyed by row position. Valid rows are omitted."""
+
 class EventValidator():
+    """
+    Validates events against the spec. The expected columns for each EventType and the
+    validator for each column are computed once, so validating an event only requires
+    a few set operations and the datatype checks.
+    """
+
+    # TODO: If we add a timezone column, for check that it's not present first
+    TIMEZONE_REQUIRED_COLUMNS = (Cols.ServerTimestamp, Cols.ClientTimestamp)
 
     def __init__(self, spec: ProgSnap2Spec):
         self.spec = spec
 
+        required_column_names = [
+            col.name for col in spec.main_table.columns
+            if col.requirement == Requirement.Required
+        ]
+        optional_column_names = [
+            col.name for col in spec.main_table.columns
+            if col.requirement == Requirement.Optional
+        ]
+        # Used for events with an invalid EventType
+        self._default_plan = ValidationPlan.create(required_column_names, optional_column_names)
+        self._plans: dict[str, ValidationPlan] = {
+            event_type.name: ValidationPlan.create(
+                required_column_names + (event_type.required_columns or []),
+                optional_column_names + (event_type.optional_columns or []),
+            )
+            for event_type in spec.main_table.event_types
+        }
+        self._column_validators: dict[str, Callable[[any], None]] = {
+            col.name: self._create_column_validator(col) for col in spec.main_table.columns
+        }
+
+    def get_plan(self, event_type: str) -> ValidationPlan:
+        """
+        Get the validation plan for an EventType, or None if the EventType is not in the spec.
+        """
+        return self._plans.get(event_type)
+
+    def _create_column_validator(self, column: Column) -> Callable[[any], None]:
+        datatype = column.datatype
+        if datatype != PS2Datatype.Timestamp:
+            return datatype.validate_value
+
+        requires_timezone = column.name in self.TIMEZONE_REQUIRED_COLUMNS
+        def validate_timestamp(value: any) -> None:
+            if not isinstance(value, str):
+                raise ValueError(f"Expected {datatype.python_type}, got {type(value)}")
+            # Cached, since the same timestamp is often validated and then parsed
+            if not parse_timestamp_details(value).has_timezone and requires_timezone:
+                raise ValueError(f"Timestamp {value} has no timezone")
+        return validate_timestamp
+
     def validate_event(self, event: dict[str, any]) -> list[ValidationError]:
         """
         Validate the event against the schema.
         """
         errors = []
 
-        spec = self.spec
-
         # Get all columns that are not None
         # Requires columns can never be None; we use the empty string for some "not present" values
-        provided_columns = [key for key in event.keys() if event[key] is not None]
+        provided_columns = [key for key, value in event.items() if value is not None]
 
         for col in provided_columns:
-            datatype = spec.main_table.get_column(col).datatype
+            validator = self._column_validators.get(col)
+            if validator is None:
+                # Not in the spec, so reported as unexpected below
+                continue
             try:
-                datatype.validate_value(event[col])
-            except ValueError as e:
+                validator(event[col])
+            except ValueError:
                 errors.append(ValidationError(column=col, type=ErrorType.InvalidValueForDatatype))
 
-        for timestamp_col in (Cols.ServerTimestamp, Cols.ClientTimestamp):
-            # TODO: If we add a timezone column, for check that it's not present first
-            if timestamp_col in provided_columns:
-                if not timestamp_has_timezone(event[timestamp_col]):
-                    errors.append(ValidationError(column=timestamp_col, type=ErrorType.InvalidValueForDatatype))
-
-        required_column_names = [
-            col.name for col in spec.main_table.columns
-            if col.requirement == Requirement.Required
-        ]
-        optional_column_names = [
-            col.name for col in spec.main_table.columns
-            if col.requirement == Requirement.Optional
-        ]
-
-        event_type = spec.main_table.get_event_type(event[Cols.EventType])
-        if event_type is None:
-            errors.append(ValidationError(column=event[Cols.EventType], type=ErrorType.InvalidEventType))
-        else:
-            required_column_names.extend(
-                event_type.required_columns or []
-            )
-            optional_column_names.extend(
-                event_type.optional_columns or []
-            )
-
+        event_type = event.get(Cols.EventType)
+        plan = self._plans.get(event_type)
+        if plan is None:
+            errors.append(ValidationError(column=event_type, type=ErrorType.InvalidEventType))
+            plan = self._default_plan
 
         # Check if all required fields are present
-        for col in required_column_names:
-            if col not in provided_columns:
-                errors.append(ValidationError(column=col, type=ErrorType.MissingRequiredColumn))
+        missing_columns = plan.required_column_set.difference(provided_columns)
+        if missing_columns:
+            for col in plan.required_columns:
+                if col in missing_columns:
+                    errors.append(ValidationError(column=col, type=ErrorType.MissingRequiredColumn))
 
-        all_expected_columns = set(required_column_names + optional_column_names)
         for col in provided_columns:
-            if col not in all_expected_columns:
+            if col not in plan.allowed_columns:
                 errors.append(ValidationError(column=col, type=ErrorType.UnexpectedColumn))
 
-        return errors
\ No newline at end of file
+        return errors
+
+    def validate_batch(self, events: Union[list[dict[str, any]], DataFrame]) -> BatchErrors:
+        """
+        Validate a batch of events, given as a list of event dicts or as a DataFrame
+        (e.g. a main table loaded for offline validation), which is validated a column
+        at a time. Missing values (None, or NaN in a DataFrame) are treated as not provided.
+        :return: The errors for each invalid event, keyed by the event's position in the batch.
+        """
+        if isinstance(events, DataFrame):
+            return self._validate_dataframe(events)
+        batch_errors = {}
+        for index, event in enumerate(events):
+            errors = self.validate_event(event)
+            if errors:
+                batch_errors[index] = errors
+        return batch_errors
+
+    def _validate_dataframe(self, df: DataFrame) -> BatchErrors:
+        checks = self.check_dataframe(df)
+        batch_errors: BatchErrors = {}
+        # Errors are added in the same order as validate_event, so each row's errors match
+        for type_order in (ErrorType.InvalidValueForDatatype, ErrorType.InvalidEventType, ErrorType.MissingRequiredColumn, ErrorType.UnexpectedColumn):
+            for mask, error in checks:
+                if error.type != type_order:
+                    continue
+                for row in mask.nonzero()[0]:
+                    batch_errors.setdefault(int(row), []).append(error)
+        return dict(sorted(batch_errors.items()))
+
+    def check_dataframe(self, df: DataFrame) -> list[DataFrameCheck]:
+        """
+        Run each check over a whole DataFrame of events, returning the possible errors
+        with masks of the rows they apply to. Use this instead of validate_batch to
+        aggregate errors over large tables without building a list per row.
+        """
+        checks: list[DataFrameCheck] = []
+        provided = {col: df[col].notna().to_numpy() for col in df.columns}
+
+        for col in df.columns:
+            column = self.spec.main_table.get_column(col)
+            if column is None:
+                continue
+            invalid = provided[col] & ~self._get_valid_value_mask(df[col], column)
+            checks.append((invalid, ValidationError(column=col, type=ErrorType.InvalidValueForDatatype)))
+
+        if Cols.EventType in df.columns:
+            event_types = df[Cols.EventType]
+        else:
+            event_types = Series(None, index=df.index, dtype=object)
+        # There are few distinct EventTypes, so rows are checked together for each one
+        for event_type, rows in event_types.groupby(event_types, dropna=False, observed=True, sort=False).indices.items():
+            event_type = None if pd.isna(event_type) else event_type
+            in_group = _positions_to_mask(rows, len(df))
+            plan = self._plans.get(event_type)
+            if plan is None:
+                checks.append((in_group, ValidationError(column=event_type, type=ErrorType.InvalidEventType)))
+                plan = self._default_plan
+            for col in plan.required_columns:
+                missing = in_group & ~provided[col] if col in provided else in_group
+                checks.append((missing, ValidationError(column=col, type=ErrorType.MissingRequiredColumn)))
+            for col in df.columns:
+                if col not in plan.allowed_columns:
+                    checks.append((in_group & provided[col], ValidationError(column=col, type=ErrorType.UnexpectedColumn)))
+        return checks
+
+    def _get_valid_value_mask(self, values: Series, column: Column) -> np.ndarray:
+        """
+        Get a mask of the values that are valid for the column's datatype (or missing).
+        Values read from a CSV may have been parsed as numbers, so any value is accepted
+        for string columns, and numeric strings are accepted for numeric columns.
+        """
+        datatype = column.datatype
+        if datatype == PS2Datatype.Timestamp:
+            if is_numeric_dtype(values):
+                return values.isna().to_numpy()
+            pattern = LOCAL_TIMESTAMP_PATTERN + TIMEZONE_OFFSET_PATTERN
+            if column.name not in self.TIMEZONE_REQUIRED_COLUMNS:
+                pattern += "?"
+            strings = values.astype("string")
+            valid = strings.str.fullmatch(pattern).fillna(True).to_numpy(dtype=bool)
+            # The pattern only checks the format, so parse each distinct matching value
+            # to check that its fields are in range, as validate_event does
+            matching = valid & strings.notna().to_numpy()
+            matching_values = strings[matching]
+            in_range = {value: _is_valid_timestamp(value) for value in matching_values.unique()}
+            valid[matching] = matching_values.map(in_range).to_numpy(dtype=bool)
+            return valid
+        elif datatype == PS2Datatype.Integer:
+            if is_integer_dtype(values) or is_bool_dtype(values):
+                return np.ones(len(values), dtype=bool)
+            numbers = pd.to_numeric(values, errors="coerce")
+            return (values.isna() | (numbers.notna() & (numbers % 1 == 0))).to_numpy()
+        elif datatype == PS2Datatype.Real:
+            if is_numeric_dtype(values):
+                return np.ones(len(values), dtype=bool)
+            return (values.isna() | pd.to_numeric(values, errors="coerce").notna()).to_numpy()
+        elif datatype == PS2Datatype.Boolean:
+            if is_bool_dtype(values):
+                return np.ones(len(values), dtype=bool)
+            strings = values.astype("string").str.lower()
+            return (values.isna() | strings.isin(["true", "false"])).to_numpy()
+        return np.ones(len(values), dtype=bool)
+
+def _is_valid_timestamp(timestamp: str) -> bool:
+    try:
+        parse_timestamp_details(timestamp)
+        return True
+    except ValueError:
+        return False
+
+def _positions_to_mask(positions: np.ndarray, length: int) -> np.ndarray:
+    mask = np.zeros(length, dtype=bool)
+    mask[positions] = True
+    return mask
@@ -0,0 +1 @@
+print('Hello, Universe!')
\ No newline at end of file
@@ -0,0 +1 @@
+def greet(): pass
\ No newline at end of file
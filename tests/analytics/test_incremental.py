@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+from analytics.metrics.generic import LogCount, MaxScore
+from analytics.metrics.incremental import IncrementalMetricCalculator
+from analytics.metrics.metric import MetricCalculator
+from analytics.ps2_dataset import PS2Dataset
+from spec.enums import MainTableColumns as Cols
+from ..database.conftest import create_temp_csv_config
+
+def create_events(start: int, n_events: int, n_subjects: int) -> pd.DataFrame:
+    ids = range(start, start + n_events)
+    return pd.DataFrame({
+        Cols.EventID: [f"e{i}" for i in ids],
+        Cols.SubjectID: [f"s{i % n_subjects}" for i in ids],
+        Cols.ProblemID: [f"p{i % 3}" for i in ids],
+        Cols.EventType: ["Run.Program"] * n_events,
+        Cols.ServerTimestamp: [f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}+00:00" for i in ids],
+        Cols.Order: list(ids),
+        Cols.Score: [(i % 5) / 4 for i in ids],
+    })
+
+@pytest.mark.parametrize("watermark_col", [Cols.ServerTimestamp, Cols.Order, None])
+def test_incremental_update_matches_full_calculation(tmp_path, config, watermark_col):
+    data_config = create_temp_csv_config(tmp_path, config.spec)
+    calculator = MetricCalculator([Cols.SubjectID, Cols.ProblemID], [LogCount(), MaxScore()])
+    incremental = IncrementalMetricCalculator(calculator, str(tmp_path / "metrics"), watermark_col=watermark_col, chunksize=16)
+
+    create_events(0, 60, n_subjects=10).to_csv(data_config.main_table_path, index=False)
+    initial = incremental.update(PS2Dataset(config.spec, data_config))
+    assert initial[LogCount().name].sum() == 60
+
+    # Only two subjects are active, and one is new
+    new_events = create_events(60, 12, n_subjects=2)
+    new_events[Cols.SubjectID] = new_events[Cols.SubjectID].replace({"s1": "s10"})
+    new_events.to_csv(data_config.main_table_path, mode="a", header=False, index=False)
+    dataset = PS2Dataset(config.spec, data_config)
+
+    updated = incremental.update(dataset)
+
+    expected = calculator.apply(dataset.get_main_table())
+    pd.testing.assert_frame_equal(updated, expected, check_index_type=False, check_categorical=False)
+    pd.testing.assert_frame_equal(incremental.load_results(), updated)
+    # Nothing has changed, so the saved results are returned
+    pd.testing.assert_frame_equal(incremental.update(dataset), updated)
+
+@pytest.mark.parametrize("watermark_col", [Cols.ServerTimestamp, Cols.Order])
+def test_incremental_update_skips_events_at_watermark(tmp_path, config, watermark_col, monkeypatch):
+    data_config = create_temp_csv_config(tmp_path, config.spec)
+    calculator = MetricCalculator([Cols.SubjectID], [LogCount()])
+    incremental = IncrementalMetricCalculator(calculator, str(tmp_path / "metrics"), watermark_col=watermark_col)
+    create_events(0, 10, n_subjects=3).to_csv(data_config.main_table_path, index=False)
+    incremental.update(PS2Dataset(config.spec, data_config))
+
+    applied = []
+    apply = calculator.apply
+    monkeypatch.setattr(calculator, "apply", lambda df: applied.append(df) or apply(df))
+    # No events were added, so nothing is recalculated
+    incremental.update(PS2Dataset(config.spec, data_config))
+    assert applied == []
+
+    # An event with the same watermark value as the last one is still new
+    tied_event = create_events(9, 1, n_subjects=3).assign(**{Cols.EventID: "e9b", Cols.SubjectID: "s0"})
+    tied_event.to_csv(data_config.main_table_path, mode="a", header=False, index=False)
+    results = incremental.update(PS2Dataset(config.spec, data_config))
+    assert len(applied) == 1
+    assert results.loc["s0", LogCount().name] == 5
+
+    incremental.update(PS2Dataset(config.spec, data_config))
+    assert len(applied) == 1
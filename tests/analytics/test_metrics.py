@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from analytics.metrics.generic import EverCorrect, LogCount, MaxScore, MeanScore, NumberOfCorrectAttempts, NumberOfIncorrectAttempts
+from analytics.metrics.metric import LambdaMetric, MetricCalculator
+from spec.enums import MainTableColumns as Cols
+
+def create_scores(n_rows: int = 200) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    scores = rng.choice([0, 0.5, 1, np.nan], n_rows)
+    return pd.DataFrame({
+        Cols.SubjectID: pd.Categorical([f"s{i}" for i in rng.integers(0, 10, n_rows)]),
+        Cols.ProblemID: rng.integers(0, 5, n_rows),
+        Cols.Score: scores,
+    })
+
+def test_vectorized_metrics_match_per_group():
+    df = create_scores()
+    metrics = [LogCount(), NumberOfIncorrectAttempts(), NumberOfCorrectAttempts(), MeanScore(), MaxScore(), EverCorrect()]
+    grouping_cols = [Cols.SubjectID, Cols.ProblemID]
+
+    result = MetricCalculator(grouping_cols, metrics).apply(df)
+
+    expected = df.groupby(grouping_cols, observed=True).apply(
+        lambda group: pd.Series({metric.name: metric.calculate(group) for metric in metrics}))
+    assert list(result.columns) == [metric.name for metric in metrics]
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+def test_mixed_metrics_keep_metric_order():
+    df = create_scores()
+    metrics = [
+        LambdaMetric("FirstScore", lambda group: group[Cols.Score].iloc[0]),
+        LogCount(),
+        LambdaMetric("Range", lambda group: {"MinScore": group[Cols.Score].min(), "MaxScore": group[Cols.Score].max()}),
+    ]
+    calculator = MetricCalculator([Cols.ProblemID], metrics)
+
+    result = calculator.apply(df)
+
+    assert list(result.columns) == ["FirstScore", "LogCount", "MinScore", "MaxScore"]
+    for problem_id, group in df.groupby(Cols.ProblemID):
+        expected = pd.Series(calculator.apply_to_group(group), dtype=float)
+        pd.testing.assert_series_equal(result.loc[problem_id].astype(float), expected, check_names=False)
+
+def test_apply_parallel_matches_apply():
+    df = create_scores()
+    metrics = [LogCount(), MeanScore(), LambdaMetric("LastScore", lambda group: group[Cols.Score].iloc[-1])]
+    calculator = MetricCalculator([Cols.SubjectID, Cols.ProblemID], metrics)
+
+    result = calculator.apply(df, processes=2)
+
+    pd.testing.assert_frame_equal(result, calculator.apply(df))
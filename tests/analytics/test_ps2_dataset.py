@@ -0,0 +1,168 @@
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from analytics.metrics.generic import LogCount
+from analytics.metrics.metric import MetricCalculator
+from analytics.ps2_dataset import PS2Dataset, TimePreprocessor
+from database.config import PS2DataConfig
+from database.writer.db_writer_factory import SQLIOFactory
+from spec.enums import MainTableColumns as Cols
+from spec.spec_definition import ProgSnap2Spec
+from ..database.conftest import create_temp_csv_config
+from ..database.test_event_validator import create_valid_event
+
+def create_dataset(tmp_path, ps2_spec: ProgSnap2Spec) -> PS2Dataset:
+    data_config = create_temp_csv_config(tmp_path, ps2_spec)
+    n_events = 50
+    pd.DataFrame({
+        Cols.EventID: [f"e{i}" for i in range(n_events)],
+        Cols.SubjectID: [f"s{i % 7}" for i in range(n_events)],
+        Cols.ProblemID: [i % 3 for i in range(n_events)],
+        Cols.EventType: ["Run.Program"] * n_events,
+    }).to_csv(data_config.main_table_path, index=False)
+    return PS2Dataset(ps2_spec, data_config)
+
+def test_calculate_metrics_chunked_matches_full_table(tmp_path, config):
+    dataset = create_dataset(tmp_path, config.spec)
+    calculator = MetricCalculator([Cols.SubjectID, Cols.ProblemID], [LogCount()])
+
+    expected = calculator.apply(dataset.get_main_table()).sort_index()
+    for n_partitions in (1, 4):
+        result = dataset.calculate_metrics_chunked(calculator, chunksize=8, n_partitions=n_partitions, columns=[Cols.EventID])
+        pd.testing.assert_frame_equal(result, expected)
+
+def test_iter_main_table_filters(tmp_path, config):
+    dataset = create_dataset(tmp_path, config.spec)
+    chunks = list(dataset.iter_main_table(chunksize=10, filters={Cols.SubjectID: "s0"}))
+    assert sum(len(chunk) for chunk in chunks) == 8
+
+def test_time_preprocessor_mixed_formats():
+    main_table = pd.DataFrame({
+        Cols.ClientTimestamp: [
+            "2024-01-01T00:00:00",
+            "2024-01-01T00:00:00.250",
+            "2024-01-01T05:00:00+05:00",
+            "not a timestamp",
+            None,
+        ],
+        "ClientTimezone": ["+01:00", None, "", "", ""],
+        Cols.ServerTimestamp: ["2024-01-01T00:00:00", "2024-01-01T00:00:01", None, "2024-01-01T00:00:02.5", None],
+    }, index=[0, 0, 1, 1, 2])
+
+    TimePreprocessor().apply(None, main_table)
+
+    client = main_table[Cols.ClientTimestamp]
+    assert str(client.dt.tz) == "UTC"
+    assert list(client.iloc[:3]) == [
+        pd.Timestamp("2023-12-31T23:00:00", tz="UTC"),
+        pd.Timestamp("2024-01-01T00:00:00.250", tz="UTC"),
+        pd.Timestamp("2024-01-01T00:00:00", tz="UTC"),
+    ]
+    assert client.iloc[3:].isna().all(), "Unparseable values should become NaT without aborting"
+
+    server = main_table[Cols.ServerTimestamp]
+    assert server.dt.tz is None, "Columns without offsets should stay naive"
+    assert server.iloc[3] == pd.Timestamp("2024-01-01T00:00:02.5")
+
+def test_get_main_table_copies(tmp_path, config):
+    dataset = create_dataset(tmp_path, config.spec)
+    cached = dataset.get_main_table(copy=False)
+
+    copied = dataset.get_main_table(copy=True)
+    copied.loc[0, Cols.EventID] = "changed"
+    assert cached.loc[0, Cols.EventID] == "e0"
+    assert not np.shares_memory(copied[Cols.EventID].to_numpy(), cached[Cols.EventID].to_numpy())
+
+    with pd.option_context("mode.copy_on_write", True):
+        shared = dataset.get_main_table()
+        assert np.shares_memory(shared[Cols.EventID].to_numpy(), cached[Cols.EventID].to_numpy())
+        shared.loc[0, Cols.EventID] = "changed"
+        assert dataset.get_main_table(copy=False).loc[0, Cols.EventID] == "e0"
+
+    usage = dataset.memory_usage()
+    assert usage["main_table"] > 0
+    assert usage["total"] == usage["main_table"] + usage["metadata_table"]
+
+def test_main_table_cache(tmp_path, config):
+    cache_dir = tmp_path / "cache"
+    dataset = create_dataset(tmp_path, config.spec)
+    data_config = dataset.data_config
+    expected = PS2Dataset(config.spec, data_config, cache_dir=str(cache_dir)).get_main_table()
+    assert len(list(cache_dir.iterdir())) == 1
+
+    cached_dataset = PS2Dataset(config.spec, data_config, cache_dir=str(cache_dir))
+    cached_dataset.factory = None  # The source should not be read again
+    pd.testing.assert_frame_equal(cached_dataset.get_main_table(), expected)
+
+    # Changing the source invalidates the cache
+    main_table = pd.read_csv(data_config.main_table_path)
+    main_table.iloc[:10].to_csv(data_config.main_table_path, index=False)
+    assert len(PS2Dataset(config.spec, data_config, cache_dir=str(cache_dir)).get_main_table()) == 10
+    assert len(list(cache_dir.iterdir())) == 2
+
+def test_main_table_cache_relative_sqlite_path(tmp_path, config, monkeypatch):
+    # SQLAlchemy resolves relative SQLite paths against the working directory, not root_path
+    monkeypatch.chdir(tmp_path)
+    data_config = PS2DataConfig(
+        root_path="./root",
+        sqlalchemy_url="sqlite:///Dataset.db",
+        optimize_codestate_ids=False,
+        metadata={"Version": "1.0", "CodeStateRepresentation": "Table"},
+    )
+    data_config.validate_metadata(config.spec)
+    factory = SQLIOFactory(config.spec, data_config)
+
+    def add_event(event_id: str):
+        event = create_valid_event(config)
+        event[Cols.EventID] = event_id
+        with factory.create_writer() as writer:
+            writer.initialize_database()
+            assert writer.add_events_with_codestates([event], {}).success
+
+    add_event("e0")
+    assert len(PS2Dataset(config.spec, data_config, cache_dir="cache").get_main_table()) == 1
+    add_event("e1")
+    assert len(PS2Dataset(config.spec, data_config, cache_dir="cache").get_main_table()) == 2
+
+def test_query_matches_filtered_main_table(tmp_path, config):
+    dataset = create_dataset(tmp_path, config.spec)
+    main_table = pd.read_csv(dataset.data_config.main_table_path)
+    main_table[Cols.ClientTimestamp] = [f"2024-01-01T00:{i:02d}:00+00:00" for i in range(len(main_table))]
+    main_table.loc[::2, Cols.EventType] = "Submit"
+    main_table.to_csv(dataset.data_config.main_table_path, index=False)
+
+    query = (dataset.query()
+             .where(EventType="Submit", SubjectID=["s0", "s1"])
+             .between(datetime(2024, 1, 1, 0, 10), datetime(2024, 1, 1, 0, 40, tzinfo=timezone.utc))
+             .select([Cols.EventID, Cols.ProblemID]))
+
+    result = query.to_pandas(chunksize=7)
+
+    assert list(result.columns) == [Cols.EventID, Cols.ProblemID]
+    assert list(result[Cols.EventID]) == ["e14", "e22", "e28", "e36"]
+    assert sum(len(chunk) for chunk in query.iter_chunks(chunksize=7)) == 4
+    # Once the main table is loaded, queries are answered from memory
+    dataset.get_main_table()
+    pd.testing.assert_frame_equal(query.to_pandas().reset_index(drop=True), result.reset_index(drop=True), check_categorical=False)
+
+def test_query_between_applies_timezone_columns(tmp_path, config):
+    dataset = create_dataset(tmp_path, config.spec)
+    main_table = pd.read_csv(dataset.data_config.main_table_path)
+    # Local times, so each event is at 00:{i} UTC
+    main_table[Cols.ClientTimestamp] = [f"2024-01-01T02:{i:02d}:00" for i in range(len(main_table))]
+    main_table["ClientTimezone"] = "+02:00"
+    main_table.to_csv(dataset.data_config.main_table_path, index=False)
+
+    query = (dataset.query()
+             .between(datetime(2024, 1, 1, 0, 10, tzinfo=timezone.utc), datetime(2024, 1, 1, 0, 20, tzinfo=timezone.utc))
+             .select([Cols.EventID]))
+    expected = [f"e{i}" for i in range(10, 20)]
+
+    assert list(query.to_pandas()[Cols.EventID]) == expected
+    assert [event_id for chunk in query.iter_chunks(chunksize=7) for event_id in chunk[Cols.EventID]] == expected
+    # The same rows are returned once the main table is loaded
+    dataset.get_main_table()
+    assert list(query.to_pandas()[Cols.EventID]) == expected
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.metrics.metric import MetricCalculator
+from analytics.metrics.time import TimeMetrics
+from spec.enums import MainTableColumns as Cols
+
+GROUPING_COLS = [Cols.SubjectID, Cols.ProblemID]
+
+def create_attempts(n_rows: int = 300) -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    # Unique times, since rows with equal times may be sorted differently per group
+    seconds = rng.permutation(n_rows * 100)[:n_rows]
+    return pd.DataFrame({
+        Cols.SubjectID: pd.Categorical([f"s{i}" for i in rng.integers(0, 8, n_rows)]),
+        Cols.ProblemID: rng.integers(0, 4, n_rows),
+        Cols.ClientTimestamp: pd.Timestamp("2024-01-01", tz="UTC") + pd.to_timedelta(seconds, unit="s"),
+        Cols.Score: rng.choice([0, 0.5, 1], n_rows, p=[0.6, 0.3, 0.1]),
+    })
+
+def calculate_per_group(time_metrics: TimeMetrics, df: pd.DataFrame) -> pd.DataFrame:
+    return df.groupby(GROUPING_COLS, observed=True).apply(time_metrics.calculate)
+
+@pytest.mark.parametrize("has_score", [True, False])
+def test_grouped_time_metrics_match_per_group(has_score):
+    df = create_attempts()
+    if not has_score:
+        df = df.drop(columns=[Cols.Score])
+    time_metrics = TimeMetrics(idle_gap=1000, break_gap=5000, is_data_already_time_sorted=False)
+
+    result = time_metrics.calculate_grouped(df, GROUPING_COLS)
+
+    expected = calculate_per_group(time_metrics, df)
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+def test_grouped_time_metrics_presorted():
+    df = create_attempts().sort_values(Cols.ClientTimestamp)
+    time_metrics = TimeMetrics(idle_gap=1000, break_gap=5000, is_data_already_time_sorted=True)
+
+    result = MetricCalculator(GROUPING_COLS, [time_metrics]).apply(df)
+
+    pd.testing.assert_frame_equal(result, calculate_per_group(time_metrics, df), check_dtype=False)
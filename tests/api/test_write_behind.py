@@ -0,0 +1,111 @@
+
+import sqlite3
+
+import pytest
+
+from api.config import WriteBehindConfig
+from api.write_behind import WriteBehindQueue
+from spec.codestate import BLANK_CODESTATE_ID, CodeStateEntry
+from spec.enums import MainTableColumns as Cols
+from ..database.conftest import create_temp_sqlite_factory
+from ..database.test_event_validator import create_valid_event
+
+def create_queue(tmp_path, config, **options) -> WriteBehindQueue:
+    factory = create_temp_sqlite_factory(tmp_path, config.spec, **options)
+    with factory.create_writer() as writer:
+        writer.initialize_database()
+
+    write_behind_config = WriteBehindConfig(enabled=True, flush_max_events=3)
+    return WriteBehindQueue(write_behind_config, factory)
+
+@pytest.fixture
+def queue(tmp_path, config):
+    queue = create_queue(tmp_path, config)
+    yield queue
+    queue._journal.close()
+
+def create_event(config, event_id: str) -> dict:
+    event = create_valid_event(config)
+    event[Cols.EventID] = event_id
+    event[Cols.CodeStateID] = BLANK_CODESTATE_ID
+    return event
+
+def count_events(queue: WriteBehindQueue) -> int:
+    with queue.factory.create_writer() as writer:
+        mt = writer.context.table_manager.main_table
+        return len(writer.conn.execute(mt.select()).fetchall())
+
+def test_append_and_flush(queue, config):
+    for i in range(4):
+        result = queue.append([create_event(config, f"batch_{i}_a"), create_event(config, f"batch_{i}_b")], {})
+        assert result.success
+
+    depth = queue.depth()
+    assert depth.batches == 4
+    assert depth.events == 8
+    assert count_events(queue) == 0, "Nothing should be written before a flush"
+
+    flush_result = queue.flush()
+
+    assert flush_result.batches_written == 4
+    assert flush_result.events_written == 8
+    assert queue.depth().batches == 0
+    assert count_events(queue) == 8
+
+def test_failed_batch_is_isolated(queue, config):
+    bad_event = create_event(config, "bad")
+    del bad_event[Cols.SubjectID]
+    queue.append([create_event(config, "good_1")], {})
+    queue.append([bad_event], {})
+    queue.append([create_event(config, "good_2")], {})
+
+    flush_result = queue.flush()
+
+    assert flush_result.batches_written == 2
+    assert flush_result.batches_failed == 1
+    depth = queue.depth()
+    assert depth.batches == 0
+    assert depth.failed_batches == 1
+    assert count_events(queue) == 2
+
+    assert queue.replay_failed_batches([12345]) == 0
+    assert queue.replay_failed_batches() == 1
+    depth = queue.depth()
+    assert depth.batches == 1 and depth.failed_batches == 0
+    assert queue.flush().batches_failed == 1, "The batch is still invalid"
+
+def test_locked_database_batches_are_retried(tmp_path, config):
+    # Fail immediately, rather than waiting for the lock
+    queue = create_queue(tmp_path, config, sqlite_pragmas={"busy_timeout": 0})
+    for i in range(2):
+        queue.append([create_event(config, f"locked_{i}")], {})
+
+    db_path = queue.factory.db_config.sqlalchemy_url.split(":///")[-1]
+    lock = sqlite3.connect(db_path)
+    lock.execute("BEGIN EXCLUSIVE")
+    flush_result = queue.flush()
+    lock.rollback()
+    lock.close()
+
+    assert flush_result.batches_deferred == 2
+    assert flush_result.batches_failed == 0
+    depth = queue.depth()
+    assert depth.batches == 2 and depth.failed_batches == 0
+
+    flush_result = queue.flush()
+    assert flush_result.batches_written == 2
+    assert count_events(queue) == 2
+    queue._journal.close()
+
+def test_merge_namespaces_temp_codestate_ids(queue, config):
+    for i in range(2):
+        event = create_event(config, f"merge_{i}")
+        event[Cols.CodeStateID] = "temp"
+        queue.append([event], {"temp": CodeStateEntry.from_code(f"code {i}")})
+
+    batches = queue._read_group(last_batch_id=2)
+    events, codestates = queue._merge_batches(batches)
+
+    assert len(codestates) == 2, "Temporary IDs from different batches should not collide"
+    for event in events:
+        assert event[Cols.CodeStateID] in codestates
@@ -34,6 +34,38 @@ def sqlite_writer_factory(ps2_spec, sqlite_config):
     return SQLIOFactory(ps2_spec, sqlite_config)
 
 
+def create_temp_sqlite_factory(directory: str, ps2_spec: ProgSnap2Spec, **options) -> SQLIOFactory:
+    """
+    Create a factory for a new SQLite database in the given directory, for tests
+    that need to count rows without seeing data from other tests.
+    """
+    data_config = PS2DataConfig(
+        root_path=str(directory),
+        sqlalchemy_url=f"sqlite:///{os.path.join(directory, 'TestDataset.db')}",
+        optimize_codestate_ids=True,
+        metadata={"Version": "1.0", "CodeStateRepresentation": "Table"},
+        **options,
+    )
+    data_config.validate_metadata(ps2_spec)
+    return SQLIOFactory(ps2_spec, data_config)
+
+def create_temp_csv_config(directory: str, ps2_spec: ProgSnap2Spec, **options) -> PS2DataConfig:
+    """
+    Create a config for a new CSV dataset in the given directory. Options override the
+    defaults; pass main_table_parquet_dir instead for a Parquet dataset.
+    """
+    if "main_table_parquet_dir" not in options:
+        options.setdefault("main_table_file", "MainTable.csv")
+    options.setdefault("optimize_codestate_ids", False)
+    data_config = PS2DataConfig(
+        root_path=str(directory),
+        metadata={"Version": "1.0", "CodeStateRepresentation": "Table"},
+        **options,
+    )
+    data_config.validate_metadata(ps2_spec)
+    return data_config
+
+
 TEMP_DIR = "test_data"
 
 def cleanup_temp_dir():
@@ -0,0 +1,90 @@
+
+import os
+import shutil
+
+from database.codestate.codestate_id_cache import CodeStateIDCache, shared_codestate_id_cache
+from database.codestate.directory_codestate_writer import DirectoryCodeStateWriter
+from spec.enums import MainTableColumns as Cols
+from .conftest import create_temp_sqlite_factory
+from .test_codestate_writers import CodestateGenerator
+from .test_event_validator import create_valid_event
+
+gen = CodestateGenerator()
+
+def test_cache_lru_eviction_and_stats():
+    cache = CodeStateIDCache(max_size=2)
+    cache.add("ns", "a")
+    cache.add("ns", "b")
+    assert cache.contains("ns", "a")
+    # "b" is now the least recently used, so it is evicted first
+    cache.add("ns", "c")
+
+    assert not cache.contains("ns", "b")
+    assert cache.contains("ns", "a")
+    assert cache.contains("ns", "c")
+    assert not cache.contains("other_ns", "a"), "Namespaces should be kept separate"
+
+    stats = cache.stats()
+    assert stats.hits == 3
+    assert stats.misses == 2
+    assert stats.size == 2
+
+def test_directory_writer_uses_cache(tmp_path):
+    writer = DirectoryCodeStateWriter(str(tmp_path))
+    writer.id_cache = CodeStateIDCache()
+
+    codestate_id = writer.add_codestate_and_get_id(gen.codestate1)
+    directory = os.path.join(tmp_path, gen.codestate1.grouping_id, codestate_id)
+    assert os.path.exists(directory)
+
+    # A cache hit should not touch storage, so the deleted directory is not recreated
+    shutil.rmtree(directory)
+    writer.add_codestate_and_get_id(gen.codestate1)
+    assert not os.path.exists(directory)
+    assert writer.id_cache.stats().hits == 1
+
+    # Once the cached IDs are cleared, storage is checked again
+    writer.forget_codestate_ids()
+    writer.add_codestate_and_get_id(gen.codestate1)
+    assert os.path.exists(directory)
+
+def test_sql_writer_only_caches_committed_codestates(tmp_path, ps2_spec, config):
+    factory = create_temp_sqlite_factory(tmp_path, ps2_spec)
+    with factory.create_writer() as writer:
+        writer.initialize_database()
+        cache = CodeStateIDCache()
+        writer.codestate_writer.id_cache = cache
+        namespace = writer.codestate_writer.get_cache_namespace()
+
+        # SubjectID is required, so this batch is rolled back
+        bad_event = create_valid_event(config)
+        bad_event[Cols.CodeStateID] = "temp"
+        del bad_event[Cols.SubjectID]
+        result = writer.add_events_with_codestates([bad_event], {"temp": gen.codestate1})
+        assert not result.success
+        assert cache.stats().size == 0, "Rolled back CodeStates should not be cached"
+
+        event = create_valid_event(config)
+        event[Cols.CodeStateID] = "temp"
+        result = writer.add_events_with_codestates([event], {"temp": gen.codestate1})
+        assert result.success
+        assert cache.contains(namespace, event[Cols.CodeStateID])
+
+def test_shared_cache_cleared_when_database_is_recreated(tmp_path, ps2_spec, config):
+    with create_temp_sqlite_factory(tmp_path / "default", ps2_spec).create_writer() as writer:
+        assert writer.codestate_writer.id_cache is None, "The shared cache should be opt-in"
+
+    factory = create_temp_sqlite_factory(tmp_path, ps2_spec, share_codestate_id_cache=True)
+    for i in range(2):
+        with factory.create_writer() as writer:
+            assert writer.codestate_writer.id_cache is shared_codestate_id_cache
+            writer.initialize_database()
+            event = create_valid_event(config)
+            event[Cols.CodeStateID] = "temp"
+            result = writer.add_events_with_codestates([event], {"temp": gen.codestate1})
+            assert result.success, result.errors
+            table = writer.context.table_manager.codestates_table
+            assert len(writer.conn.execute(table.select()).all()) > 0, "CodeStates should be written to the new database"
+        # Delete the database, so it is recreated on the next pass
+        factory.engine.dispose()
+        os.remove(factory.db_config.sqlalchemy_url.split(":///")[-1])
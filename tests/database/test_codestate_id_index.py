@@ -0,0 +1,91 @@
+
+import os
+
+import pytest
+
+from database.codestate.codestate_id_cache import CodeStateIDCache
+from database.codestate.codestate_id_index import CodeStateIDIndex
+from database.codestate.table_codestate_writer import CSVTableCodeStateWriter
+from database.config import PS2DataConfig
+from database.writer.db_writer_factory import CSVIOFactory
+from .conftest import create_temp_csv_config
+from .test_codestate_writers import CodestateGenerator
+
+gen = CodestateGenerator()
+
+@pytest.fixture
+def csv_data_config(tmp_path, ps2_spec) -> PS2DataConfig:
+    return create_temp_csv_config(tmp_path, ps2_spec, optimize_codestate_ids=True)
+
+def create_writer(data_config: PS2DataConfig) -> CSVTableCodeStateWriter:
+    writer = CSVTableCodeStateWriter(data_config)
+    # Use a private cache so lookups reach the index
+    writer.id_cache = CodeStateIDCache()
+    return writer
+
+def test_index_written_with_codestates(csv_data_config):
+    with create_writer(csv_data_config) as writer:
+        id_1 = writer.add_codestate_and_get_id(gen.codestate1)
+        id_2 = writer.add_codestate_and_get_id(gen.codestate2)
+
+    index = CodeStateIDIndex(csv_data_config.codestates_table_path)
+    assert os.path.exists(index.index_path)
+    assert index._read_index() == {id_1, id_2}
+
+    # A new writer should load IDs from the index without scanning the CSV
+    index._scan_csv = None
+    assert index.load() == {id_1, id_2}
+
+def test_index_catches_up_with_appended_rows(csv_data_config):
+    with create_writer(csv_data_config) as writer:
+        id_1 = writer.add_codestate_and_get_id(gen.codestate1)
+
+    # Append a row without going through the writer (or the index)
+    with open(csv_data_config.codestates_table_path, 'a', newline='') as csvfile:
+        csvfile.write("external_id,print('hi'),main.py\r\n")
+
+    new_writer = create_writer(csv_data_config)
+    assert new_writer.written_codestate_ids == {id_1, "external_id"}
+    assert "external_id" in CodeStateIDIndex(csv_data_config.codestates_table_path)._read_index()
+
+def test_index_rebuilt_when_csv_rewritten(csv_data_config):
+    with create_writer(csv_data_config) as writer:
+        writer.add_codestate_and_get_id(gen.codestate1)
+
+    # Rewrite the file so that it is larger than before, so it cannot be detected by size alone
+    long_code = "x" * os.path.getsize(csv_data_config.codestates_table_path)
+    with open(csv_data_config.codestates_table_path, 'w', newline='') as csvfile:
+        csvfile.write(f"CodeStateID,Code,CodeStateSection\r\nreplaced_id,{long_code},main.py\r\n")
+
+    new_writer = create_writer(csv_data_config)
+    assert new_writer.written_codestate_ids == {"replaced_id"}
+
+def write_codestates_csv(data_config: PS2DataConfig, codestate_ids: list[str]) -> None:
+    with open(data_config.codestates_table_path, 'w', newline='', encoding='utf-8') as csvfile:
+        csvfile.write("CodeStateID,Code,CodeStateSection\r\n")
+        for codestate_id in codestate_ids:
+            csvfile.write(f"{codestate_id},print('héllo'),main.py\r\n")
+
+def test_readers_do_not_write_index(csv_data_config, ps2_spec):
+    write_codestates_csv(csv_data_config, ["a", "b"])
+    with CSVIOFactory(ps2_spec, csv_data_config).create_reader() as reader:
+        assert reader.codestate_io.get_stored_codestate_ids() == {"a", "b"}
+
+    index = CodeStateIDIndex(csv_data_config.codestates_table_path)
+    assert not os.path.exists(index.index_path)
+    assert not os.path.exists(index.state_path)
+
+def test_index_falls_back_to_csv_when_not_writable(csv_data_config):
+    write_codestates_csv(csv_data_config, ["a", "b"])
+    index = CodeStateIDIndex(csv_data_config.codestates_table_path)
+    # Opening the index file fails, as it would in a read-only directory
+    os.makedirs(index.index_path)
+    assert index.load() == {"a", "b"}
+
+    os.rmdir(index.index_path)
+    with open(csv_data_config.codestates_table_path, 'a', newline='', encoding='utf-8') as csvfile:
+        csvfile.write("c,print(1),main.py\r\n")
+    # The index could not be written before, so it is rebuilt rather than appended to
+    index.append(["c"])
+    assert index._read_index() == {"a", "b", "c"}
+    assert CodeStateIDIndex(csv_data_config.codestates_table_path).load() == {"a", "b", "c"}
@@ -4,7 +4,7 @@ import copy
 from database.codestate.codestate_writer import CodeStateSectionEntry, ContextualCodeStateEntry
 from database.codestate.directory_codestate_writer import DirectoryCodeStateWriter
 from database.codestate.git_codestate_writer import GitCodeStateWriter
-from .conftest import TEMP_DIR, cleanup_temp_dir
+from .conftest import TEMP_DIR, cleanup_temp_dir, create_temp_sqlite_factory
 
 temp_dir = TEMP_DIR
 
@@ -33,7 +33,6 @@ class CodestateGenerator():
 gen = CodestateGenerator()
 gen_no_grouping = CodestateGenerator(False)
 
-# TODO: Test SQLTableCodeStateWriter!
 
 def test_directory_codestate_writer():
     # Initialize the DirectoryTableWriter
@@ -83,19 +82,19 @@ def test_csv_table_codestate_writer(csv_config):
     from database.sql_context import IOContext
 
     # Initialize the DirectoryTableWriter
-    writer = CSVTableCodeStateWriter(csv_config)
+    with CSVTableCodeStateWriter(csv_config) as writer:
 
-    # Add the codestate and get its ID
-    codestate_id_1 = writer.add_codestate_and_get_id(gen.codestate1)
+        # Add the codestate and get its ID
+        codestate_id_1 = writer.add_codestate_and_get_id(gen.codestate1)
 
-    # Check if the CSV file was created
-    assert os.path.exists(csv_config.codestates_table_path)
+        codestate_id_1_again = writer.add_codestate_and_get_id(gen.codestate1)
+        assert codestate_id_1_again == codestate_id_1, "Duplicate codestate should return the same ID"
 
-    codestate_id_1_again = writer.add_codestate_and_get_id(gen.codestate1)
-    assert codestate_id_1_again == codestate_id_1, "Duplicate codestate should return the same ID"
+        codestate_id_2 = writer.add_codestate_and_get_id(gen.codestate2)
+        assert codestate_id_2 != codestate_id_1, "Different codestates should return different IDs"
 
-    codestate_id_2 = writer.add_codestate_and_get_id(gen.codestate2)
-    assert codestate_id_2 != codestate_id_1, "Different codestates should return different IDs"
+    # Check if the CSV file was created when the writer was closed
+    assert os.path.exists(csv_config.codestates_table_path)
 
     # The CSV file should have 4 non-header lines (2 sections * 2 codestates)
     # The CodeState columns should match the expected values
@@ -116,3 +115,63 @@ def test_csv_table_codestate_writer(csv_config):
     assert rows[2]['CodeStateID'] == codestate_id_2
     assert rows[2]['Code'] == gen.codestate2.sections[0].Code
     assert rows[2]['CodeStateSection'] == gen.codestate2.sections[0].CodeStateSection
+
+
+def test_sql_table_codestate_writer_bulk(tmp_path, ps2_spec):
+    factory = create_temp_sqlite_factory(tmp_path, ps2_spec)
+    with factory.create_writer() as writer:
+        writer.initialize_database()
+        codestate_writer = writer.codestate_writer
+        table = codestate_writer.table
+
+        def count_rows(codestate_ids):
+            statement = table.select().where(table.c.CodeStateID.in_(codestate_ids))
+            return len(writer.conn.execute(statement).fetchall())
+
+        ids = codestate_writer.add_codestates_and_get_ids({
+            "a": gen.codestate1,
+            "b": gen.codestate2,
+            "c": gen.codestate1,
+        })
+        assert ids["a"] == ids["c"], "Identical codestates should get the same ID"
+        assert ids["a"] != ids["b"], "Different codestates should get different IDs"
+        # 2 codestates * 2 sections
+        assert count_rows(list(ids.values())) == 4
+        writer.conn.commit()
+
+        # Existing codestates should not be inserted again
+        codestate_writer.add_codestates_bulk({ids["a"]: gen.codestate1})
+        assert count_rows([ids["a"]]) == 2
+
+        # Codestates are written in the caller's transaction
+        id_3 = codestate_writer.add_codestate_and_get_id(gen.codestate3)
+        assert count_rows([id_3]) == 2
+        writer.conn.rollback()
+        assert count_rows([id_3]) == 0, "Rolled back codestates should not be stored"
+
+
+def test_csv_table_codestate_writer_buffering(csv_config, tmp_path):
+    from database.codestate.table_codestate_writer import CSVTableCodeStateWriter
+
+    config = csv_config.model_copy(update={"root_path": str(tmp_path), "codestates_buffer_rows": 3})
+    writer = CSVTableCodeStateWriter(config)
+
+    # 2 sections, so still buffered
+    writer.add_codestate_and_get_id(gen.codestate1)
+    assert not os.path.exists(config.codestates_table_path), "Rows should be buffered"
+
+    # 4 sections now, which exceeds the buffer size
+    writer.add_codestate_and_get_id(gen.codestate2)
+    assert os.path.exists(config.codestates_table_path)
+
+    # Rolled back rows are never written, and can be added again
+    codestate_id_3 = writer.add_codestate_and_get_id(gen.codestate3)
+    writer.on_rollback()
+    assert codestate_id_3 not in writer.written_codestate_ids
+    writer.add_codestate_and_get_id(gen.codestate3)
+    writer.close()
+
+    import csv
+    with open(config.codestates_table_path, 'r', newline='') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    assert len(rows) == 6, "CSV file should have 6 rows (3 codestates * 2 sections)"
@@ -0,0 +1,81 @@
+import json
+
+import pandas as pd
+import pytest
+import yaml
+
+from database.config import PS2DataConfig
+from database.dataset_validator import main, validate_dataset
+from spec.codestate import BLANK_CODESTATE_ID
+from spec.enums import CodeStatesTableColumns as CodeCols, MainTableColumns as Cols, EventType
+from .conftest import create_temp_csv_config
+
+N_EVENTS = 20
+
+@pytest.fixture
+def invalid_dataset_config(tmp_path, ps2_spec) -> PS2DataConfig:
+    data_config = create_temp_csv_config(tmp_path, ps2_spec)
+
+    main_table = pd.DataFrame({
+        Cols.EventID: [f"e{i}" for i in range(N_EVENTS)],
+        Cols.SubjectID: ["s1"] * N_EVENTS,
+        Cols.ToolInstances: ["tool"] * N_EVENTS,
+        Cols.EventType: [str(EventType.FileSave)] * N_EVENTS,
+        Cols.CodeStateSection: ["main.py"] * N_EVENTS,
+        Cols.CodeStateID: ["c1" if i % 2 == 0 else BLANK_CODESTATE_ID for i in range(N_EVENTS)],
+        Cols.ServerTimestamp: ["2024-01-01T00:00:00+00:00"] * N_EVENTS,
+        Cols.EventInitiator: ["UserDirectAction"] * N_EVENTS,
+    })
+    main_table.loc[3, [Cols.EventType, Cols.CodeStateSection, Cols.EventInitiator]] = ["NotAnEventType", None, None]
+    main_table.loc[5, Cols.ServerTimestamp] = "2024-01-01T00:00:00"
+    # Matches the timestamp format, but the month, day and hour are out of range
+    main_table.loc[15, Cols.ServerTimestamp] = "2024-13-45T99:00:00Z"
+    main_table.loc[7, Cols.EventInitiator] = "NotAnInitiator"
+    main_table.loc[8, Cols.EventInitiator] = "X-CustomInitiator"
+    main_table.loc[[10, 12, 14], Cols.CodeStateID] = "missing"
+    main_table.loc[11, Cols.SubjectID] = None
+    main_table.to_csv(data_config.main_table_path, index=False)
+    pd.DataFrame({CodeCols.CodeStateID: ["c1"], CodeCols.Code: ["print(1)"]}).to_csv(data_config.codestates_table_path, index=False)
+    return data_config
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_validate_dataset_reports_errors(invalid_dataset_config, ps2_spec, processes):
+    report = validate_dataset(invalid_dataset_config, ps2_spec, chunksize=6, processes=processes, max_examples=2)
+
+    assert report.n_rows == N_EVENTS
+    assert not report.is_valid
+    errors = {message: (summary.count, summary.example_rows) for message, summary in report.errors.items()}
+    assert errors == {
+        "Invalid event type: NotAnEventType": (1, [3]),
+        "Invalid value for datatype: ServerTimestamp": (2, [5, 15]),
+        "Invalid enum value: EventInitiator": (1, [7]),
+        "CodeStateID not found in CodeStates: CodeStateID": (3, [10, 12]),
+        "Missing required column: SubjectID": (1, [11]),
+    }
+
+def test_validate_dataset_valid(tmp_path, ps2_spec):
+    data_config = create_temp_csv_config(tmp_path, ps2_spec)
+    pd.DataFrame({
+        Cols.EventID: ["e1"],
+        Cols.SubjectID: ["s1"],
+        Cols.ToolInstances: ["tool"],
+        Cols.SessionID: ["session"],
+        Cols.EventType: [str(EventType.SessionStart)],
+        Cols.CodeStateID: [BLANK_CODESTATE_ID],
+    }).to_csv(data_config.main_table_path, index=False)
+
+    report = validate_dataset(data_config, ps2_spec)
+    assert report.is_valid
+    assert report.n_rows == 1
+
+def test_validate_cli(invalid_dataset_config, tmp_path, capsys):
+    config_path = tmp_path / "config.yaml"
+    with open(config_path, "w") as file:
+        yaml.safe_dump(invalid_dataset_config.model_dump(mode="json", exclude_unset=True), file)
+
+    exit_code = main([str(config_path), "--processes", "1", "--json"])
+
+    assert exit_code == 1
+    output = json.loads(capsys.readouterr().out)
+    assert output["n_rows"] == N_EVENTS
+    assert output["errors"]["Invalid enum value: EventInitiator"] == {"count": 1, "example_rows": [7]}
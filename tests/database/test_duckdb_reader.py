@@ -0,0 +1,65 @@
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+from database.reader.filters import ColumnFilter
+from database.reader.ps2_reader import concat_chunks
+from database.writer.db_writer_factory import DuckDBIOFactory, IOFactory
+from spec.enums import CodeStatesTableColumns as CodeCols, MainTableColumns as Cols
+from .conftest import create_temp_csv_config
+from .test_readers import create_main_table
+
+pytest.importorskip("duckdb")
+
+@pytest.fixture
+def duckdb_factory(tmp_path, ps2_spec) -> DuckDBIOFactory:
+    data_config = create_temp_csv_config(tmp_path, ps2_spec, use_duckdb=True, duckdb_threads=2)
+    main_table = create_main_table(10)
+    main_table[Cols.Score] = [i / 10 for i in range(10)]
+    main_table.to_csv(data_config.main_table_path, index=False)
+    pd.DataFrame({CodeCols.CodeStateID: ["c1"], CodeCols.Code: ["print(1)"]}).to_csv(data_config.codestates_table_path, index=False)
+    os.makedirs(os.path.join(tmp_path, "LinkTables"))
+    pd.DataFrame({Cols.SubjectID: ["s0"], "X-Major": ["CS"]}).to_csv(os.path.join(tmp_path, "LinkTables", "LinkSubject.csv"), index=False)
+    factory = IOFactory.create_factory(data_config, ps2_spec)
+    assert isinstance(factory, DuckDBIOFactory)
+    return factory
+
+def test_duckdb_reader_tables(duckdb_factory):
+    with duckdb_factory.create_reader() as reader:
+        main_table = reader.get_main_table()
+        assert list(main_table[Cols.EventID]) == [f"e{i}" for i in range(10)]
+        assert main_table[Cols.Score].dtype == "float64"
+        assert reader.get_link_table_names() == ["LinkSubject"]
+        assert list(reader.get_link_table("LinkSubject")["X-Major"]) == ["CS"]
+        assert reader.codestate_io.get_stored_codestate_ids() == {"c1"}
+
+        counts = reader.sql(f"SELECT {Cols.SubjectID}, COUNT(*) AS n FROM MainTable GROUP BY 1 ORDER BY 1")
+        assert list(counts["n"]) == [4, 3, 3]
+
+def test_duckdb_iter_main_table(duckdb_factory):
+    filters = [
+        ColumnFilter.equals(Cols.SubjectID, ["s0", "s1"]),
+        *ColumnFilter.between(Cols.ClientTimestamp, datetime(2024, 1, 1, 0, 2), datetime(2024, 1, 1, 0, 8, tzinfo=timezone.utc)),
+    ]
+    with duckdb_factory.create_reader() as reader:
+        chunks = list(reader.iter_main_table(chunksize=3, columns=[Cols.EventID], filters=filters))
+        untyped = concat_chunks(list(reader.iter_main_table(chunksize=4, typed=False)))
+
+    assert all(len(chunk) <= 3 for chunk in chunks)
+    result = pd.concat(chunks)
+    assert list(result.columns) == [Cols.EventID]
+    assert list(result[Cols.EventID]) == ["e3", "e4", "e6", "e7"]
+    assert untyped[Cols.Score].iloc[1] == "0.1"
+
+def test_duckdb_reader_compressed_main_table(tmp_path, ps2_spec):
+    data_config = create_temp_csv_config(tmp_path, ps2_spec, use_duckdb=True, main_table_file="MainTable.csv.gz")
+    main_table = create_main_table(5)
+    main_table[Cols.Score] = ["1", "2", "3", "4", "5.5"]
+    main_table.to_csv(data_config.main_table_path, index=False, compression="gzip")
+
+    with IOFactory.create_factory(data_config, ps2_spec).create_reader() as reader:
+        main_table = reader.get_main_table()
+    assert list(main_table[Cols.EventID]) == [f"e{i}" for i in range(5)]
+    assert main_table[Cols.Score].dtype == "float64"
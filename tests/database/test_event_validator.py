@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 
+import pandas as pd
 import pytest
 from spec.event_validator import ErrorType, EventValidator
 from api.events import DataModelGenerator
@@ -70,3 +71,32 @@ def test_unexpected_column(config):
 
     type_errors = [error for error in errors if error.type == ErrorType.UnexpectedColumn]
     assert len(type_errors) == 1, f"Expected one UnexpectedColumn error, got: {type_errors}"
+
+def test_validate_batch_matches_validate_event(config):
+    event_validator = EventValidator(config.spec)
+
+    valid_event = create_valid_event(config)
+    invalid_type = create_valid_event(config)
+    invalid_type[Cols.EventType] = "InvalidEventType"
+    missing_column = create_valid_event(config)
+    del missing_column[Cols.SessionID]
+    bad_values = create_valid_event(config)
+    bad_values[Cols.ClientTimestamp] = "2024-01-01T00:00:00"  # No timezone
+    bad_values[Cols.Order] = "first"
+    bad_values[Cols.EditType] = "test"
+    events = [valid_event, invalid_type, missing_column, bad_values]
+
+    expected = {i: event_validator.validate_event(event) for i, event in enumerate(events)}
+    expected = {i: errors for i, errors in expected.items() if errors}
+    assert list(expected.keys()) == [1, 2, 3]
+
+    assert event_validator.validate_batch(events) == expected
+    assert event_validator.validate_batch(pd.DataFrame(events)) == expected
+
+def test_unknown_column_is_unexpected(config):
+    event_validator = EventValidator(config.spec)
+    event = create_valid_event(config)
+    event["NotAColumn"] = "value"
+
+    errors = event_validator.validate_event(event)
+    assert [error.type for error in errors] == [ErrorType.UnexpectedColumn]
@@ -0,0 +1,57 @@
+
+import gzip
+import os
+
+import pandas as pd
+import pytest
+
+from database.exporter import export_sql_to_csv
+from database.importer import import_csv_to_sql
+from database.writer.db_writer_factory import CSVIOFactory
+from spec.enums import CoreTables, MainTableColumns as Cols
+from .conftest import create_temp_csv_config, create_temp_sqlite_factory
+from .test_importer import create_csv_dataset
+
+def test_export_sql_to_csv_round_trip(tmp_path, ps2_spec):
+    source_config = create_csv_dataset(tmp_path / "source", ps2_spec, n_events=25)
+    sql_factory = create_temp_sqlite_factory(tmp_path, ps2_spec)
+    import_csv_to_sql(source_config, sql_factory.db_config, ps2_spec)
+
+    target_config = create_temp_csv_config(tmp_path / "export", ps2_spec)
+    report = export_sql_to_csv(sql_factory.db_config, target_config, ps2_spec, chunksize=10, max_workers=2)
+
+    assert report.tables[CoreTables.MainTable].rows == 25
+    assert report.tables["LinkSubject"].rows == 2
+    assert os.path.exists(tmp_path / "export" / "Metadata.csv")
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path / "export"))
+    for file in ("MainTable.csv", "CodeStates.csv", os.path.join("LinkTables", "LinkSubject.csv")):
+        expected = pd.read_csv(tmp_path / "source" / file)
+        exported = pd.read_csv(tmp_path / "export" / file)[expected.columns]
+        pd.testing.assert_frame_equal(exported, expected, check_dtype=False)
+
+def test_export_sql_to_csv_gzip(tmp_path, ps2_spec):
+    source_config = create_csv_dataset(tmp_path / "source", ps2_spec, n_events=5)
+    sql_factory = create_temp_sqlite_factory(tmp_path, ps2_spec)
+    import_csv_to_sql(source_config, sql_factory.db_config, ps2_spec)
+
+    target_config = create_temp_csv_config(
+        tmp_path / "export", ps2_spec,
+        main_table_file="MainTable.csv.gz",
+        codestates_table_relative_path="CodeStates.csv.gz",
+    )
+    export_sql_to_csv(sql_factory.db_config, target_config, ps2_spec, compression="gzip")
+
+    with gzip.open(tmp_path / "export" / "MainTable.csv.gz", "rt") as file:
+        assert file.readline().startswith(Cols.EventType)
+    # The exported dataset can be read with the same config
+    with CSVIOFactory(ps2_spec, target_config).create_reader() as reader:
+        assert len(reader.get_main_table()) == 5
+        assert len(reader.get_metadata_table()) > 0
+        assert reader.get_link_table_names() == ["LinkSubject"]
+        assert len(reader.get_link_table("LinkSubject")) == 2
+    assert len(pd.read_csv(target_config.codestates_table_path)) == 2
+
+    with pytest.raises(ValueError):
+        export_sql_to_csv(sql_factory.db_config, target_config, ps2_spec, compression="bz2")
+    with pytest.raises(ValueError, match="main_table_file"):
+        export_sql_to_csv(sql_factory.db_config, create_temp_csv_config(tmp_path / "other", ps2_spec), ps2_spec, compression="gzip")
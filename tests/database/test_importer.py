@@ -0,0 +1,104 @@
+
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from database.config import PS2DataConfig
+from database.importer import import_csv_to_sql
+from spec.enums import CodeStatesTableColumns as CodeCols, CoreTables, MainTableColumns as Cols
+from .conftest import create_temp_csv_config, create_temp_sqlite_factory
+from .test_sql_writer import get_main_table_index_names
+
+def create_csv_dataset(directory, ps2_spec, n_events: int) -> PS2DataConfig:
+    os.makedirs(os.path.join(directory, "LinkTables"))
+    data_config = create_temp_csv_config(directory, ps2_spec)
+    pd.DataFrame({
+        Cols.EventID: [f"e{i}" for i in range(n_events)],
+        Cols.SubjectID: [f"s{i % 3}" for i in range(n_events)],
+        Cols.EventType: ["Run.Program"] * n_events,
+        Cols.CodeStateID: [f"c{i % 2}" for i in range(n_events)],
+        Cols.ToolInstances: ["Python 3.11"] * n_events,
+        Cols.ServerTimestamp: [f"2024-01-01T00:00:{i:02d}+02:00" for i in range(n_events)],
+        Cols.Order: range(n_events),
+        Cols.Score: [0.5 if i % 2 else None for i in range(n_events)],
+        Cols.ProblemIsGraded: [i % 2 == 0 for i in range(n_events)],
+    }).to_csv(data_config.main_table_path, index=False)
+    pd.DataFrame({
+        CodeCols.CodeStateID: ["c0", "c1"],
+        CodeCols.CodeStateSection: ["main.py", "main.py"],
+        CodeCols.Code: ["print('hi')", ""],
+    }).to_csv(data_config.codestates_table_path, index=False)
+    pd.DataFrame({
+        Cols.SubjectID: ["s0", "s1"],
+        "MidtermExamScore": [90.5, None],
+    }).to_csv(os.path.join(directory, "LinkTables", "LinkSubject.csv"), index=False)
+    return data_config
+
+def read_table(factory, table_name: str) -> pd.DataFrame:
+    db_path = factory.db_config.sqlalchemy_url.split(":///")[-1]
+    with sqlite3.connect(db_path) as conn:
+        return pd.read_sql_query(f'SELECT * FROM "{table_name}"', conn)
+
+def test_import_csv_to_sqlite(tmp_path, ps2_spec):
+    source_config = create_csv_dataset(tmp_path / "csv", ps2_spec, n_events=25)
+    target_factory = create_temp_sqlite_factory(tmp_path, ps2_spec)
+
+    report = import_csv_to_sql(source_config, target_factory.db_config, ps2_spec, chunksize=10)
+
+    assert report.tables[CoreTables.MainTable].rows == 25
+    assert report.tables["LinkSubject"].rows == 2
+    assert report.tables[CoreTables.CodeStates].rows == 2
+    main_table = read_table(target_factory, CoreTables.MainTable)
+    assert list(main_table[Cols.EventID]) == [f"e{i}" for i in range(25)]
+    assert list(main_table[Cols.Order]) == list(range(25))
+    assert main_table.loc[1, Cols.Score] == 0.5 and pd.isna(main_table.loc[0, Cols.Score])
+    assert main_table.loc[3, Cols.ServerTimestamp] == "2024-01-01T00:00:03+02:00"
+    codestates = read_table(target_factory, CoreTables.CodeStates)
+    assert list(codestates[CodeCols.Code]) == ["print('hi')", ""]
+    assert pd.isna(read_table(target_factory, "LinkSubject").loc[1, "MidtermExamScore"])
+    assert "ux_MainTable_EventID" in get_main_table_index_names(target_factory)
+
+    with pytest.raises(ValueError):
+        import_csv_to_sql(source_config, target_factory.db_config, ps2_spec)
+    import_csv_to_sql(source_config, target_factory.db_config, ps2_spec, replace=True, create_indexes=False)
+    assert len(read_table(target_factory, CoreTables.MainTable)) == 25
+    assert get_main_table_index_names(target_factory) == set()
+
+def test_failed_import_keeps_existing_data(tmp_path, ps2_spec):
+    source_config = create_csv_dataset(tmp_path / "csv", ps2_spec, n_events=10)
+    target_factory = create_temp_sqlite_factory(tmp_path, ps2_spec)
+    import_csv_to_sql(source_config, target_factory.db_config, ps2_spec)
+    index_names = get_main_table_index_names(target_factory)
+
+    main_table = pd.read_csv(source_config.main_table_path)
+    main_table.loc[5, Cols.EventType] = None
+    main_table.to_csv(source_config.main_table_path, index=False)
+    with pytest.raises(IntegrityError):
+        import_csv_to_sql(source_config, target_factory.db_config, ps2_spec, replace=True)
+
+    assert len(read_table(target_factory, CoreTables.MainTable)) == 10
+    assert len(read_table(target_factory, CoreTables.CodeStates)) == 2
+    assert get_main_table_index_names(target_factory) == index_names
+
+def test_import_into_database_with_codestates(tmp_path, ps2_spec):
+    source_config = create_csv_dataset(tmp_path / "csv", ps2_spec, n_events=25)
+    target_factory = create_temp_sqlite_factory(tmp_path, ps2_spec)
+    # The main table is empty, but a CodeState has already been written
+    with target_factory.create_writer() as writer:
+        writer.initialize_database()
+        codestates_table = writer.context.table_manager.codestates_table
+        writer.conn.execute(codestates_table.insert(), [{CodeCols.CodeStateID: "existing", CodeCols.Code: "", CodeCols.CodeStateSection: "main.py"}])
+        writer.conn.commit()
+
+    with pytest.raises(ValueError, match=CoreTables.CodeStates):
+        import_csv_to_sql(source_config, target_factory.db_config, ps2_spec)
+    assert list(read_table(target_factory, CoreTables.CodeStates)[CodeCols.CodeStateID]) == ["existing"]
+
+    progress = []
+    import_csv_to_sql(source_config, target_factory.db_config, ps2_spec, chunksize=10, replace=True,
+                      progress=lambda table_name, stats: progress.append((table_name, stats.rows)))
+    assert progress[:3] == [(CoreTables.MainTable, 10), (CoreTables.MainTable, 20), (CoreTables.MainTable, 25)]
+    assert list(read_table(target_factory, CoreTables.CodeStates)[CodeCols.CodeStateID]) == ["c0", "c1"]
@@ -0,0 +1,90 @@
+
+import os
+
+import pytest
+
+from database.writer.db_writer_factory import IOFactory, ParquetIOFactory
+from spec.enums import MainTableColumns as Cols, EventType
+from .conftest import create_temp_csv_config
+from .test_codestate_writers import CodestateGenerator
+from .test_event_validator import create_valid_event
+
+pytest.importorskip("pyarrow")
+
+@pytest.fixture
+def parquet_factory(tmp_path, ps2_spec) -> ParquetIOFactory:
+    data_config = create_temp_csv_config(
+        tmp_path, ps2_spec,
+        main_table_parquet_dir="MainTable",
+        parquet_partition_cols=[Cols.ProblemID],
+        optimize_codestate_ids=True,
+    )
+    factory = IOFactory.create_factory(data_config, ps2_spec)
+    assert isinstance(factory, ParquetIOFactory)
+    return factory
+
+def create_events(config, n_events: int) -> list[dict]:
+    events = []
+    for i in range(n_events):
+        event = create_valid_event(config)
+        event[Cols.EventID] = f"e{i}"
+        event[Cols.ProblemID] = f"p{i % 2}"
+        event[Cols.EventType] = str(EventType.RunProgram if i % 2 == 0 else EventType.SessionStart)
+        event[Cols.CodeStateID] = "temp"
+        events.append(event)
+    return events
+
+def test_parquet_write_and_read(parquet_factory, config):
+    gen = CodestateGenerator()
+    with parquet_factory.create_writer() as writer:
+        writer.initialize_database()
+        result = writer.add_events_with_codestates(create_events(config, 6), {"temp": gen.codestate1})
+        assert result.success, result.errors
+
+    main_table_path = parquet_factory.db_config.main_table_parquet_path
+    assert sorted(os.listdir(main_table_path)) == ["ProblemID=p0", "ProblemID=p1"]
+
+    with parquet_factory.create_reader() as reader:
+        main_table = reader.get_main_table()
+        assert len(main_table) == 6
+        assert main_table[Cols.EventType].dtype == "category"
+        codestate_ids = set(main_table[Cols.CodeStateID])
+        assert len(codestate_ids) == 1 and "temp" not in codestate_ids
+        assert codestate_ids <= reader.codestate_io.written_codestate_ids
+
+        chunks = list(reader.iter_main_table(
+            chunksize=2,
+            columns=[Cols.EventID],
+            filters={Cols.ProblemID: "p0", Cols.EventType: str(EventType.RunProgram)},
+        ))
+        assert sorted(event_id for chunk in chunks for event_id in chunk[Cols.EventID]) == ["e0", "e2", "e4"]
+
+        metadata = reader.get_metadata_table()
+        assert "CodeStateRepresentation" in set(metadata["Property"])
+
+def test_parquet_failed_batch_not_written(parquet_factory, config):
+    events = create_events(config, 3)
+    events[1][Cols.Order] = "not a number"
+    with parquet_factory.create_writer() as writer:
+        writer.initialize_database()
+        result = writer.add_events_with_codestates(events, {"temp": CodestateGenerator().codestate1})
+
+    assert not result.success
+    assert "event 1 (EventID=e1)" in result.errors[0]
+    with parquet_factory.create_reader() as reader:
+        assert len(reader.get_main_table()) == 0
+
+def test_parquet_failed_commit(parquet_factory, config, monkeypatch):
+    def fail_write(table):
+        raise OSError("No space left on device")
+
+    with parquet_factory.create_writer() as writer:
+        writer.initialize_database()
+        monkeypatch.setattr(writer, "_write_main_table", fail_write)
+        result = writer.add_events_with_codestates(create_events(config, 2), {"temp": CodestateGenerator().codestate1})
+
+    assert not result.success
+    assert not result.retryable
+    assert "No space left on device" in result.errors[0]
+    # The batch's CodeStates are dropped along with its events
+    assert not os.path.exists(parquet_factory.db_config.codestates_table_path)
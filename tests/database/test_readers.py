@@ -0,0 +1,107 @@
+
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+from sqlalchemy import event as sql_event
+
+from database.reader.filters import ColumnFilter
+from database.reader.ps2_reader import concat_chunks
+from database.writer.db_writer_factory import CSVIOFactory
+from spec.codestate import BLANK_CODESTATE_ID
+from spec.enums import MainTableColumns as Cols, EventType
+from .conftest import create_temp_csv_config, create_temp_sqlite_factory
+from .test_event_validator import create_valid_event
+
+def create_main_table(n_events: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        Cols.EventID: [f"e{i}" for i in range(n_events)],
+        Cols.SubjectID: [f"s{i % 3}" for i in range(n_events)],
+        Cols.EventType: [str(EventType.RunProgram) if i % 2 == 0 else str(EventType.SessionStart) for i in range(n_events)],
+        Cols.ClientTimestamp: [f"2024-01-01T00:{i:02d}:00" for i in range(n_events)],
+        Cols.CodeStateID: [BLANK_CODESTATE_ID] * n_events,
+    })
+
+@pytest.fixture
+def csv_factory(tmp_path, ps2_spec) -> CSVIOFactory:
+    data_config = create_temp_csv_config(tmp_path, ps2_spec)
+    create_main_table(10).to_csv(data_config.main_table_path, index=False)
+    return CSVIOFactory(ps2_spec, data_config)
+
+def test_csv_iter_main_table_chunks(csv_factory):
+    with csv_factory.create_reader() as reader:
+        chunks = list(reader.iter_main_table(chunksize=4))
+        full_table = reader.get_main_table()
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    pd.testing.assert_frame_equal(concat_chunks(chunks), full_table)
+
+def test_csv_iter_main_table_projection_and_filters(csv_factory):
+    filters = [
+        ColumnFilter.equals(Cols.SubjectID, ["s0", "s1"]),
+        *ColumnFilter.between(Cols.ClientTimestamp, datetime(2024, 1, 1, 0, 2), datetime(2024, 1, 1, 0, 8, tzinfo=timezone.utc)),
+    ]
+    with csv_factory.create_reader() as reader:
+        chunks = list(reader.iter_main_table(chunksize=3, columns=[Cols.EventID], filters=filters))
+
+    result = pd.concat(chunks)
+    assert list(result.columns) == [Cols.EventID]
+    assert list(result[Cols.EventID]) == ["e3", "e4", "e6", "e7"]
+
+def test_sql_iter_main_table_pushdown(tmp_path, ps2_spec, config):
+    factory = create_temp_sqlite_factory(tmp_path, ps2_spec)
+    events = []
+    for row in create_main_table(10).to_dict(orient="records"):
+        event = create_valid_event(config)
+        event.update(row)
+        events.append(event)
+
+    with factory.create_writer() as writer:
+        writer.initialize_database()
+        assert writer.add_events_with_codestates(events, {}).success
+
+    stream_options = []
+    def record_options(conn, cursor, statement, parameters, context, executemany):
+        stream_options.append(context.execution_options.get("stream_results"))
+    sql_event.listen(factory.engine, "before_cursor_execute", record_options)
+
+    with factory.create_reader() as reader:
+        chunks = list(reader.iter_main_table(
+            chunksize=2,
+            columns=[Cols.EventID, Cols.SubjectID],
+            filters={Cols.EventType: str(EventType.RunProgram), Cols.SubjectID: ["s0", "s1"]},
+        ))
+        time_chunks = list(reader.iter_main_table(
+            chunksize=100,
+            filters=ColumnFilter.between(Cols.ClientTimestamp, end=datetime(2024, 1, 1, 0, 3)),
+        ))
+
+    result = pd.concat(chunks)
+    assert list(result.columns) == [Cols.EventID, Cols.SubjectID]
+    assert sorted(result[Cols.EventID]) == ["e0", "e4", "e6"]
+    assert all(len(chunk) <= 2 for chunk in chunks)
+    assert sorted(pd.concat(time_chunks)[Cols.EventID]) == ["e0", "e1", "e2"]
+    assert stream_options == [True, True], "Chunked reads should use a server-side cursor"
+
+def test_csv_main_table_dtypes(csv_factory):
+    csv_factory.db_config.csv_parse_timestamps = True
+    main_table = create_main_table(4)
+    main_table[Cols.Order] = [1, 2, None, 4]
+    main_table.to_csv(csv_factory.db_config.main_table_path, index=False)
+
+    engines = [None]
+    try:
+        import pyarrow
+        engines.append("pyarrow")
+    except ImportError:
+        pass
+    for engine in engines:
+        csv_factory.db_config.csv_engine = engine
+        with csv_factory.create_reader() as reader:
+            main_table = reader.get_main_table()
+
+        assert main_table[Cols.EventType].dtype == "category"
+        assert main_table[Cols.SubjectID].dtype == "category"
+        assert main_table[Cols.Order].dtype == "Int64"
+        assert main_table[Cols.Order].isna().sum() == 1
+        assert str(main_table[Cols.ClientTimestamp].dt.tz) == "UTC"
@@ -2,16 +2,18 @@
 import os
 import pytest
 import sqlite3
+from sqlalchemy.exc import OperationalError
 
 from database.codestate.git_codestate_writer import GitCodeStateWriter
+from database.config import IndexConfig
 from database.writer.db_writer import LogResult
 from database.writer.db_writer_factory import SQLIOFactory
 from database.writer.sql_writer import SQLWriter
-from spec.codestate import CodeStateEntry
-from .conftest import cleanup_temp_dir
+from spec.codestate import BLANK_CODESTATE_ID, CodeStateEntry
+from .conftest import cleanup_temp_dir, create_temp_sqlite_factory
 from .test_codestate_writers import CodestateGenerator
 from .test_event_validator import create_valid_event
-from spec.enums import MainTableColumns as MTC, EventType
+from spec.enums import CoreTables, MainTableColumns as MTC, EventType
 
 def test_sqlite_writer_init(sqlite_writer_factory, sqlite_config):
     with sqlite_writer_factory.create_writer() as writer:
@@ -98,4 +100,145 @@ def do_warning_test(sqlite_writer_factory, config, with_git):
 
     assert result.success, "Contextualization should succeed"
     expected_warnings = 1 if with_git else 0
-    assert len(result.warnings) == expected_warnings, f"There should be {expected_warnings} warning"
\ No newline at end of file
+    assert len(result.warnings) == expected_warnings, f"There should be {expected_warnings} warning"
+
+def _count_events_with_ids(writer: SQLWriter, event_ids: list[str]) -> int:
+    mt = writer.context.table_manager.main_table
+    statement = mt.select().where(mt.c.EventID.in_(event_ids))
+    return len(writer.conn.execute(statement).fetchall())
+
+def test_sqlite_writer_add_events_batched(sqlite_writer_factory, config):
+    with sqlite_writer_factory.create_writer() as writer:
+        writer.initialize_database()
+
+        events = []
+        for i in range(10):
+            event = create_valid_event(config)
+            event[MTC.EventID] = f"batched_{i}"
+            event[MTC.CodeStateID] = BLANK_CODESTATE_ID
+            # Alternate column sets so that multiple groups are inserted
+            if i % 2 == 0:
+                event[MTC.Order] = i
+            events.append(event)
+
+        groups = writer._group_events_by_columns(events)
+        assert len(groups) == 2, f"Expected 2 column groups, got {len(groups)}"
+
+        result = writer.add_events_with_codestates(events, {})
+
+        assert result.success, f"Batch insert should succeed: {result.errors}"
+        event_ids = [event[MTC.EventID] for event in events]
+        assert _count_events_with_ids(writer, event_ids) == len(events)
+
+def test_sqlite_writer_add_events_error_attribution(sqlite_writer_factory, config):
+    with sqlite_writer_factory.create_writer() as writer:
+        writer.initialize_database()
+
+        events = []
+        for i in range(3):
+            event = create_valid_event(config)
+            event[MTC.EventID] = f"attribution_{i}"
+            event[MTC.CodeStateID] = BLANK_CODESTATE_ID
+            events.append(event)
+        # SubjectID is required, so the database should reject this row
+        del events[1][MTC.SubjectID]
+
+        result = writer.add_events_with_codestates(events, {})
+
+        assert not result.success, "Batch with an invalid row should fail"
+        assert len(result.errors) == 1, f"Expected one error, got: {result.errors}"
+        assert "attribution_1" in result.errors[0], "Error should identify the failing event"
+
+        # The whole batch should be rolled back
+        event_ids = [event[MTC.EventID] for event in events]
+        assert _count_events_with_ids(writer, event_ids) == 0
+
+def test_sqlite_writer_reuse_and_pragmas(tmp_path, ps2_spec):
+    factory = create_temp_sqlite_factory(
+        tmp_path, ps2_spec,
+        reuse_io_objects=True,
+        sqlite_pragmas={"journal_mode": "WAL", "busy_timeout": 1234},
+    )
+
+    with factory.create_writer() as writer:
+        first_writer = writer
+        first_conn = writer.conn
+        assert writer.conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert writer.conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 1234
+
+    with factory.create_writer() as writer:
+        assert writer is first_writer, "Writer objects should be reused"
+        assert writer.conn is not first_conn, "Reused writers should get a new connection"
+        assert writer.codestate_writer.conn is writer.conn
+
+def test_reused_writer_after_failed_request(tmp_path, ps2_spec):
+    factory = create_temp_sqlite_factory(tmp_path, ps2_spec, reuse_io_objects=True)
+    codestate = CodestateGenerator().codestate1
+    with factory.create_writer() as writer:
+        writer.initialize_database()
+        first_writer = writer
+
+    # The request ends without committing, so its CodeState is never stored
+    with factory.create_writer() as writer:
+        writer.codestate_writer.add_codestates_bulk({"c1": codestate})
+
+    with factory.create_writer() as writer:
+        assert writer is first_writer, "Writer objects should be reused"
+        writer.codestate_writer.add_codestates_bulk({"c1": codestate})
+        writer._commit()
+        table = writer.context.table_manager.codestates_table
+        assert len(writer.conn.execute(table.select()).all()) > 0, "CodeState from the abandoned request should be written again"
+
+    with pytest.raises(RuntimeError):
+        with factory.create_writer() as writer:
+            failed_writer = writer
+            raise RuntimeError("Request failed")
+    with factory.create_writer() as writer:
+        assert writer is not failed_writer, "Writers from failed requests should not be reused"
+
+def test_sqlite_writer_locked_at_commit(tmp_path, ps2_spec, config, monkeypatch):
+    factory = create_temp_sqlite_factory(tmp_path, ps2_spec)
+    with factory.create_writer() as writer:
+        writer.initialize_database()
+
+        def locked_commit():
+            raise OperationalError("COMMIT", {}, sqlite3.OperationalError("database is locked"))
+        monkeypatch.setattr(writer.conn, "commit", locked_commit)
+        event = create_valid_event(config)
+        result = writer.add_events_with_codestates([event], {})
+        monkeypatch.undo()
+
+        assert not result.success
+        assert result.retryable, "A locked database should be retried later"
+        assert "database is locked" in result.errors[0]
+        assert _count_events_with_ids(writer, [event[MTC.EventID]]) == 0
+
+def get_main_table_index_names(factory) -> set[str]:
+    db_path = factory.db_config.sqlalchemy_url.split(":///")[-1]
+    with sqlite3.connect(db_path) as conn:
+        return {row[1] for row in conn.execute(f"PRAGMA index_list('{CoreTables.MainTable}')")}
+
+def test_main_table_default_indexes(tmp_path, ps2_spec):
+    factory = create_temp_sqlite_factory(tmp_path, ps2_spec)
+    with factory.create_writer() as writer:
+        writer.initialize_database()
+
+    assert get_main_table_index_names(factory) == {
+        "ux_MainTable_EventID",
+        "ix_MainTable_SubjectID_ProblemID_ServerTimestamp",
+        "ix_MainTable_CodeStateID",
+        "ix_MainTable_EventType",
+    }
+
+def test_main_table_deferred_indexes(tmp_path, ps2_spec):
+    factory = create_temp_sqlite_factory(
+        tmp_path, ps2_spec,
+        main_table_indexes=[IndexConfig(columns=[MTC.AssignmentID, MTC.ProblemID])],
+        defer_main_table_indexes=True,
+    )
+    with factory.create_writer() as writer:
+        writer.initialize_database()
+        assert get_main_table_index_names(factory) == set()
+        writer.create_indexes()
+
+    assert get_main_table_index_names(factory) == {"ix_MainTable_AssignmentID_ProblemID"}
@@ -0,0 +1,30 @@
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from spec.datatypes import parse_timestamp, parse_timestamp_details, timestamp_has_timezone
+
+def test_parse_timestamp_details():
+    details = parse_timestamp_details("2024-03-01T12:30:05.25-05:00")
+    assert details.value == datetime(2024, 3, 1, 12, 30, 5, 250000, tzinfo=timezone(timedelta(hours=-5)))
+    assert details.has_timezone and details.has_fraction
+
+    details = parse_timestamp_details("2024-03-01T12:30:05")
+    assert details.value == datetime(2024, 3, 1, 12, 30, 5)
+    assert not details.has_timezone and not details.has_fraction
+
+    assert parse_timestamp("2024-03-01T12:30:05Z").tzinfo == timezone.utc
+    assert parse_timestamp("2024-03-01T12:30:05+0530").utcoffset() == timedelta(hours=5, minutes=30)
+
+@pytest.mark.parametrize("timestamp", [
+    "2024-03-01 12:30:05",
+    "2024-13-01T12:30:05",
+    "2024-03-01T12:30:05.1234567",
+    "2024-03-01T12:30:05+05",
+    "not a timestamp",
+])
+def test_invalid_timestamps(timestamp):
+    with pytest.raises(ValueError):
+        parse_timestamp(timestamp)
+    assert not timestamp_has_timezone(timestamp)